@@ -0,0 +1,266 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Alignment of two sequences (patience anchors + Myers diff).
+
+The sequences are lists of hashable keys. The result is the list
+of opcodes in the form used by difflib.SequenceMatcher.get_opcodes():
+(tag, i1, i2, j1, j2) where the tag is 'equal', 'replace', 'delete',
+or 'insert'.
+
+The keys that occur exactly once in both sequences are used as anchors
+(patience diff). The longest increasing sequence of the anchors splits
+the sequences into gaps that are aligned by the Myers O((N+M)D) algorithm
+in its linear-space form. This way, the alignment is fast when the
+sequences are similar. When they diverge heavily, the search for the middle
+snake is cut off after too many edits (as GNU diff does), and the furthest
+reaching point is used as the split -- the result may not be minimal then,
+but the time stays reasonable.
+
+The keys may be ambiguous (say the element types). An inserted or deleted
+run in the middle of the equal keys can be placed at more positions
+with the same cost; the optional score of the pairs (see opcodes())
+decides where.
+'''
+
+
+def _costLimit(n, m):
+    '''Number of edits after which the middle-snake search is cut off.'''
+    return max(64, int((n + m) ** 0.5))
+
+
+def _middleSnake(a, a0, n, b, b0, m):
+    '''Finds the middle snake of the shortest edit script.
+
+       Returns (x, y, u, v) -- the snake goes from (x, y) to (u, v)
+       in the coordinates relative to a0, b0.'''
+    delta = n - m
+    odd = delta & 1
+    offset = n + m + 1
+    vf = [0] * (2 * offset + 1)     # forward: furthest x on the diagonal k
+    vb = [0] * (2 * offset + 1)     # backward: furthest x from the end
+    limit = _costLimit(n, m)
+    for d in range((n + m + 1) // 2 + 1):
+        # Forward search.
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vf[offset + k - 1] < vf[offset + k + 1]):
+                x = vf[offset + k + 1]          # down
+            else:
+                x = vf[offset + k - 1] + 1      # right
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            vf[offset + k] = x
+            if odd and delta - (d - 1) <= k <= delta + (d - 1):
+                if x + vb[offset + delta - k] >= n:
+                    return x0, y0, x, y
+
+        # Backward search (on the reversed sequences).
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vb[offset + k - 1] < vb[offset + k + 1]):
+                x = vb[offset + k + 1]
+            else:
+                x = vb[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a0 + n - 1 - x] == b[b0 + m - 1 - y]:
+                x += 1
+                y += 1
+            vb[offset + k] = x
+            if not odd and -d <= delta - k <= d:
+                if x + vf[offset + delta - k] >= n:
+                    return n - x, m - y, n - x0, m - y0
+
+        # Too expensive -- split at the furthest reaching point (forward
+        # or backward; x + y is the progress) without a snake. The point
+        # is strictly inside as the paths did not meet yet.
+        if d >= limit:
+            best = None
+            for k in range(-d, d + 1, 2):
+                x = vf[offset + k]
+                if 0 <= x - k <= m and x <= n:
+                    if best is None or 2 * x - k > best[0]:
+                        best = (2 * x - k, x, x - k)
+                x = vb[offset + k]
+                if 0 <= x - k <= m and x <= n:
+                    if best is None or 2 * x - k > best[0]:
+                        best = (2 * x - k, n - x, m - (x - k))
+            if best is not None and 0 < best[0] < n + m:
+                progress, x, y = best
+                return x, y, x, y
+
+    raise AssertionError('middle snake not found')
+
+
+def _myers(a, a0, a1, b, b0, b1, pairs):
+    '''Appends the matching (i, j) pairs of the a[a0:a1], b[b0:b1] to pairs.'''
+
+    # Common prefix.
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        pairs.append((a0, b0))
+        a0 += 1
+        b0 += 1
+
+    # Common suffix (appended later to keep the order of the pairs).
+    suffix = 0
+    while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+        a1 -= 1
+        b1 -= 1
+        suffix += 1
+
+    if a0 < a1 and b0 < b1:
+        x, y, u, v = _middleSnake(a, a0, a1 - a0, b, b0, b1 - b0)
+        _myers(a, a0, a0 + x, b, b0, b0 + y, pairs)
+        for i in range(u - x):
+            pairs.append((a0 + x + i, b0 + y + i))
+        _myers(a, a0 + u, a1, b, b0 + v, b1, pairs)
+
+    for i in range(suffix):
+        pairs.append((a1 + i, b1 + i))
+
+
+def _uniqueAnchors(a, a0, a1, b, b0, b1):
+    '''Returns the (i, j) pairs of the keys unique in both ranges.
+
+       Only the pairs that form the longest increasing sequence
+       (i.e. that do not cross) are returned.'''
+    count_a = {}
+    for i in range(a0, a1):
+        count_a[a[i]] = count_a.get(a[i], 0) + 1
+    index_b = {}
+    for j in range(b0, b1):
+        key = b[j]
+        if count_a.get(key) == 1:
+            index_b[key] = -1 if key in index_b else j   # -1 -- not unique in b
+    candidates = [(i, index_b[a[i]]) for i in range(a0, a1)
+                  if count_a[a[i]] == 1 and index_b.get(a[i], -1) >= 0]
+
+    # Longest increasing subsequence by j (patience sorting).
+    tails = []          # tails[k] -- index to candidates ending the LIS of length k+1
+    prev = [None] * len(candidates)
+    for c, (i, j) in enumerate(candidates):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if candidates[tails[mid]][1] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            prev[c] = tails[lo - 1]
+        if lo == len(tails):
+            tails.append(c)
+        else:
+            tails[lo] = c
+
+    result = []
+    c = tails[-1] if tails else None
+    while c is not None:
+        result.append(candidates[c])
+        c = prev[c]
+    result.reverse()
+    return result
+
+
+def _patience(a, a0, a1, b, b0, b1, pairs):
+    '''Appends the matching pairs -- anchored recursively, Myers in the gaps.'''
+    anchors = _uniqueAnchors(a, a0, a1, b, b0, b1)
+    if not anchors:
+        _myers(a, a0, a1, b, b0, b1, pairs)
+        return
+
+    for i, j in anchors:
+        _patience(a, a0, i, b, b0, j, pairs)
+        pairs.append((i, j))
+        a0, b0 = i + 1, j + 1
+    _patience(a, a0, a1, b, b0, b1, pairs)
+
+
+def matchingPairs(a, b):
+    '''Returns the list of (i, j) pairs where a[i] == b[j] in the alignment.'''
+    pairs = []
+    _patience(a, 0, len(a), b, 0, len(b), pairs)
+    return pairs
+
+
+def _slide(ops, n, a, b, score):
+    '''Moves the inserted or deleted gap ops[n] to the best scored position.
+
+       The gap between two equal blocks can be shifted while the key leaving
+       one end of the gap equals the key entering the other end. Only the
+       pairs at the shifted ends change; the position with the highest sum
+       of their scores wins (the original one on a tie). The equal blocks
+       never disappear, so the neighbouring gaps are not touched.'''
+    tag, i1, i2, j1, j2 = ops[n]
+    prev, next = ops[n - 1], ops[n + 1]
+    if tag == 'delete':
+        keys, g1, g2, p, p0, p1 = a, i1, i2, j1, prev[3], next[4]
+        pairScore = score
+    else:
+        keys, g1, g2, p, p0, p1 = b, j1, j2, i1, prev[1], next[2]
+        pairScore = lambda i, j: score(j, i)
+
+    # The range of the shifts.
+    up = 0
+    while p - up - 1 > p0 and keys[g1 - up - 1] == keys[g2 - up - 1]:
+        up += 1
+    down = 0
+    while p + down + 1 < p1 and keys[g1 + down] == keys[g2 + down]:
+        down += 1
+    if not up and not down:
+        return
+
+    # Shifting the gap down by one moves the pair of p from the end
+    # behind the gap to its start.
+    value = best_value = 0
+    best = 0
+    for s in range(-1, -up - 1, -1):
+        value += pairScore(g2 + s, p + s) - pairScore(g1 + s, p + s)
+        if value > best_value:
+            best_value, best = value, s
+    value = 0
+    for s in range(1, down + 1):
+        value += pairScore(g1 + s - 1, p + s - 1) - pairScore(g2 + s - 1, p + s - 1)
+        if value > best_value:
+            best_value, best = value, s
+    if best:
+        ops[n - 1] = prev[:2] + (prev[2] + best,) + prev[3:4] + (prev[4] + best,)
+        ops[n] = (tag, i1 + best, i2 + best, j1 + best, j2 + best)
+        ops[n + 1] = (next[0], next[1] + best) + next[2:3] + (next[3] + best,) + next[4:]
+
+
+def opcodes(a, b, score=None):
+    '''Returns the list of (tag, i1, i2, j1, j2) describing the alignment.
+
+       The optional score(i, j) tells how much the a[i] and b[j] with the same
+       key look like counterparts (the more, the better). It places
+       the inserted or deleted runs among the ambiguous keys.'''
+    result = []
+    i = j = 0
+    for ai, bj in matchingPairs(a, b) + [(len(a), len(b))]:
+        # The gap before the matching pair.
+        if i < ai and j < bj:
+            result.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            result.append(('delete', i, ai, j, j))
+        elif j < bj:
+            result.append(('insert', i, i, j, bj))
+
+        # The matching pair (the sentinel is not a pair) -- join with
+        # the previous equal block if possible.
+        if ai < len(a) and bj < len(b):
+            if result and result[-1][0] == 'equal' and result[-1][2] == ai \
+               and result[-1][4] == bj:
+                tag, i1, i2, j1, j2 = result[-1]
+                result[-1] = ('equal', i1, ai + 1, j1, bj + 1)
+            else:
+                result.append(('equal', ai, ai + 1, bj, bj + 1))
+        i, j = ai + 1, bj + 1
+
+    if score is not None:
+        for n in range(1, len(result) - 1):
+            if result[n][0] in ('delete', 'insert'):
+                _slide(result, n, a, b, score)
+    return result
@@ -0,0 +1,162 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Checks run in the process -- the results are returned as objects.
+
+The csSync.py and similar scripts write the reports to the aux directories
+and print the log. When the checker is embedded in another program (say
+a service), check() runs pass1 and pass2 and returns the Result. The sources
+of each language are given as the mapping of the source-file names
+(like '01-introduction/01-chapter1.markdown') to their content (text
+or UTF-8 bytes), or as the directory with the chapter subdirectories.
+The reports are kept in memory; nothing is written to the disk (except
+the missing definition files that are created empty as by the scripts).
+
+Example:
+
+    result = api.check('cs', {'01-intro/01-chapter1.markdown': en_text},
+                             {'01-intro/01-chapter1.markdown': cs_text})
+    if not result.sync:
+        for finding in result.structDiffs():
+            print(finding.fields['kind'], finding.en, finding.xx)
+    for finding in result.byCheck('backticks'):
+        print(finding.xx[0].lineno(), finding.xx[0].value())
+'''
+
+import contentsha
+import doc
+import gen
+import os
+import pass1
+import pass2
+import report
+
+
+class SourceParser(pass1.Parser):
+    '''Pass1 parser of the sources given by the mappings (or directories).
+
+       The reports are written to memory (see report.MemoryReports),
+       the findings are collected as report.Finding objects, and the new
+       last known content records are collected to the content_records.
+       The aux directories are not created; their names only identify
+       the reports.'''
+
+    def __init__(self, lang, en_sources, xx_sources, root_definitions_dir=None,
+                 disabled_reports=()):
+        super().__init__(lang, '', '', False, disabled_reports, root_definitions_dir)
+
+        # The mapping, or the directory with the sources -- by the text_dir.
+        self.sources = {}
+        for attr, sources in (('en_src_dir', en_sources), ('xx_src_dir', xx_sources)):
+            if isinstance(sources, str):
+                setattr(self, attr, os.path.realpath(sources))
+            self.sources[getattr(self, attr)] = sources
+
+        self.reports = report.MemoryReports(disabled_reports)
+        self.stats.reports = self.reports
+        self.collected_findings = []
+        self.content_records = []   # (en_ch_lineno, xx_ch_lineno, en_digest, xx_digest)
+
+
+    def makeDirs(self):
+        '''Only the definitions directory is created (if it does not exist).'''
+        if not os.path.isdir(self.lang_definitions_dir):
+            os.makedirs(self.lang_definitions_dir)
+
+
+    def sourceBytes(self, text_dir):
+        '''Returns the total size of the sources in bytes.'''
+        sources = self.sources[text_dir]
+        if isinstance(sources, str):
+            return super().sourceBytes(text_dir)
+        return sum(len(content if isinstance(content, bytes)
+                       else content.encode('utf-8'))
+                   for content in sources.values())
+
+
+    def doclines(self, text_dir, parse_cache):
+        '''Generator of doc.Line objects -- from the mapping if given.'''
+        sources = self.sources[text_dir]
+        if isinstance(sources, str):
+            return super().doclines(text_dir, parse_cache)
+        return (doc.Line(relname, lineno, line)
+                for relname, lineno, line in gen.mappingLines(sources))
+
+
+    def contentShaWriter(self, fname):
+        '''Returns the writer collecting the records to the content_records.'''
+        return contentsha.ListWriter(self.content_records)
+
+
+class Result:
+    '''Result of the checks of the translation against the original.
+
+       The en_elements and xx_elements are the aligned doc.Element lists
+       (the translated snippets are excluded, see pairs()). The findings
+       are the report.Finding objects of all checks in the order they were
+       found: 'struct_diff' and 'content_change' from pass1, then the pass2
+       checks ('img_diff', 'backticks', 'dquotes', 'em_strong'). The sync
+       is True when the structures of the documents are the same.
+
+       The content_records are the new last known content (see contentsha.py)
+       -- the records that would be written to the aux content_sha file.
+       The reports map the names relative to the aux root (like
+       'cs_aux/pass2backticks.txt') to the texts of the report files.'''
+
+    def __init__(self, parser1, parser2):
+        self.lang = parser1.lang
+        self.en_elements = parser1.en_elements
+        self.xx_elements = parser1.xx_elements
+        self.findings = parser1.collected_findings
+        self.sync = not self.structDiffs()
+        self.content_records = parser1.content_records
+        self.stats = {'pass1': parser1.stats.asDict(),
+                      'pass2': parser2.stats.asDict()}
+        self.log_info = parser1.log_info + parser2.log_info
+        self.reports = {os.path.relpath(fname, parser1.root_aux_dir): text
+                        for fname, text in parser1.reports.texts().items()}
+
+
+    def pairs(self):
+        '''Returns the list of the aligned (en element, xx element) couples.
+
+           The couples are meaningful only when the structure is in sync.'''
+        return list(zip(self.en_elements, self.xx_elements))
+
+
+    def byCheck(self, check_id):
+        '''Returns the list of the findings of the check.'''
+        return [finding for finding in self.findings if finding.check == check_id]
+
+
+    def structDiffs(self):
+        '''Returns the findings of the structure differences.
+
+           The fields['kind'] is 'missing', 'extra', or 'different'.'''
+        return self.byCheck('struct_diff')
+
+
+    def contentChanges(self):
+        '''Returns the findings of the content changed since last checked.
+
+           The fields['en_state'] and fields['xx_state'] are 'unchecked',
+           'changed', or 'same'.'''
+        return self.byCheck('content_change')
+
+
+def check(lang, en_sources, xx_sources, root_definitions_dir=None,
+          disabled_reports=report.DEBUG_REPORTS):
+    '''Runs pass1 and pass2 for the sources. Returns the Result.
+
+       The en_sources and xx_sources are the mappings relname -> content,
+       or the directories (see the module doc). The definitions are read
+       from root_definitions_dir/lang (the `definitions` next to the scripts
+       by default). The disabled_reports are not even formatted (the debugging
+       reports by default). The pass2 checks run serially -- the findings
+       are collected in the process.'''
+    parser1 = SourceParser(lang, en_sources, xx_sources, root_definitions_dir,
+                           disabled_reports)
+    parser1.run()
+    parser2 = pass2.Parser(parser1)
+    parser2.run()
+    return Result(parser1, parser2)
@@ -0,0 +1,114 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Checks more translations at once -- the English original is parsed only once.
+
+Usage: batch.py [-j N] root_src_dir root_aux_dir lang [lang ...]
+
+Example (the same locations as in the csSync.py and similar scripts):
+
+    batch.py ../../progit/ ../ cs fr ja ru
+'''
+
+import argparse
+import concurrent.futures
+import contentsha
+import os
+import pass1
+import pass2
+import report
+
+
+# The English elements shared by the worker processes -- the dict
+# digest_name -> (elements, sha_to_elem). It is set by the pool initializer
+# so that it is transferred to each worker only once (or not at all when
+# the workers are forked).
+_en_shared = None
+
+
+def _initWorker(en_shared):
+    '''Pool initializer -- stores the shared English elements.'''
+    global _en_shared
+    _en_shared = en_shared
+
+
+def _checkLanguage(lang, root_src_dir, root_aux_dir, use_cache, disabled_reports,
+                   root_definitions_dir):
+    '''Runs pass1 and pass2 for the lang. Returns the log messages.
+
+       The English elements with the digests of the lang are always shared
+       -- the worker never reads the original nor writes to en_aux.'''
+    parser1 = pass1.Parser(lang, root_src_dir, root_aux_dir, use_cache,
+                           disabled_reports, root_definitions_dir)
+    en_elements, en_sha_to_elem = _en_shared[parser1.digest_name]
+    parser1.shareEnglish(en_elements, en_sha_to_elem, parser1.digest_name)
+    msg1 = parser1.run()
+
+    parser2 = pass2.Parser(parser1)
+    msg2 = parser2.run()
+    return msg1, msg2
+
+
+def run(langs, root_src_dir, root_aux_dir, max_workers=None, use_cache=True,
+        disabled_reports=(), root_definitions_dir=None):
+    '''Checks the translations to the langs against the English original.
+
+       The English original is parsed once (the elements are only digested
+       again for the langs using another content digest), then the pass1
+       and pass2 for each language run in the pool of processes. Generator
+       of (lang, English or pass1 message, pass2 message) in the order
+       of langs. The first item is ('en', message, ''). The root_definitions_dir
+       is as for the pass1.Parser.'''
+
+    # The English part. The parser object is used only to load the original
+    # (the lang is needed only to derive the directories).
+    en_parser = pass1.Parser(langs[0], root_src_dir, root_aux_dir, use_cache,
+                             disabled_reports, root_definitions_dir)
+    en_parser.loadEnglish()
+    yield 'en', '\n\t'.join(en_parser.log_info), ''
+
+    # The elements for each distinct digest of the langs.
+    en_shared = {en_parser.digest_name: (en_parser.en_elements,
+                                         en_parser.en_sha_to_elem)}
+    for lang in langs:
+        digest_name = contentsha.digestName(
+                          os.path.join(en_parser.root_definitions_dir, lang))
+        if digest_name not in en_shared:
+            en_shared[digest_name] = en_parser.redigestedEnglish(digest_name)
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_initWorker,
+            initargs=(en_shared,)) as executor:
+        futures = [executor.submit(_checkLanguage, lang, root_src_dir,
+                                   root_aux_dir, use_cache, disabled_reports,
+                                   root_definitions_dir)
+                   for lang in langs]
+        for lang, future in zip(langs, futures):
+            msg1, msg2 = future.result()
+            yield lang, msg1, msg2
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('root_src_dir', help='root of the source documents (progit/)')
+    ap.add_argument('root_aux_dir', help='root of the auxiliary directories with reports')
+    ap.add_argument('langs', nargs='+', help='target languages (cs, fr, ...)')
+    ap.add_argument('-j', '--jobs', type=int, default=None,
+                    help='number of worker processes (default: number of CPUs)')
+    ap.add_argument('--no-cache', action='store_true',
+                    help='parse all source files (do not use pass1cache.pickle)')
+    ap.add_argument('--no-debug-reports', action='store_true',
+                    help='do not write the debugging reports (pass1.txt, pass1doclines.txt)')
+    args = ap.parse_args()
+
+    disabled_reports = report.DEBUG_REPORTS if args.no_debug_reports else ()
+    for lang, msg1, msg2 in run(args.langs, args.root_src_dir, args.root_aux_dir,
+                                args.jobs, not args.no_cache, disabled_reports):
+        if lang == 'en':
+            print('en:')
+            print('\t' + msg1)
+        else:
+            print('{} pass 1:'.format(lang))
+            print('\t' + msg1)
+            print('{} pass 2:'.format(lang))
+            print('\t' + msg2)
@@ -0,0 +1,506 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Benchmarks of the parser parts.
+
+Usage: bench.py classify [-n REPEAT] text_dir [text_dir ...]
+       bench.py memory root_src_dir lang [lang ...]
+       bench.py corpus [corpus options] root_dir
+       bench.py pipeline [-n REPEAT] [-j JOBS] [--cache] [--json FILE]
+                         [corpus options | --src root_src_dir lang]
+       bench.py compare old.json new.json
+
+The text_dir is the directory with the sources of one language
+(say ../../progit/en), or a single source file. The root_src_dir
+is the directory with the language subdirectories (say ../../progit).
+
+The corpus command generates a synthetic book shaped like Pro Git:
+root_dir/en and root_dir/xx with the chapter subdirectories, and
+root_dir/definitions/xx with the extra lines and the translated snippets
+found in the translation. The pipeline command runs pass1 and pass2
+on such a corpus (generated to a temporary directory, or the --src one)
+and reports the time of the phases, the throughput, and the memory.
+The --json file can be compared with another one by the compare command.
+'''
+
+import argparse
+import doc
+import gen
+import json
+import os
+import pass1
+import pass2
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+
+class SequentialLine(doc.Line):
+    '''Reference classifier -- tries the doc.Line regexes one by one.
+
+       This is how doc.Line used to classify the lines before the first
+       character dispatch.'''
+
+    __slots__ = ()
+
+    def __init__(self, fname, lineno, line):
+        self.fname = fname
+        self.lineno = lineno
+        self.line = line
+        self.type, self._attrib = self.classify(line)
+
+
+    def classify(self, line):
+        '''Returns the (type, attrib) couple.'''
+        if line.isspace():
+            return 'empty', ''
+        m = self.rexTitle.match(line)
+        if m:
+            return 'title', (len(m.group('level')), m.group('title'))
+        m = self.rexBullet.match(line)
+        if m:
+            return 'uli', m.group('uli')
+        m = self.rexLi.match(line)
+        if m:
+            return 'li', (m.group('num'), m.group('text'))
+        m = self.rexInsImg.match(line)
+        if m:
+            return 'img', m.group('img')
+        m = self.rexImgCaption.match(line)
+        if m:
+            return 'imgcaption', (m.group('num'), m.group('text'))
+        m = self.rexCode.match(line)
+        if m:
+            return 'code', m.group('code')
+        if line == '':
+            return 'EOF', None
+        return 'text', line.rstrip()
+
+
+def bestOf(repeat, func, *args):
+    '''Returns the shortest wall time of the repeated func(*args) call.'''
+    best = None
+    for i in range(repeat):
+        t = time.perf_counter()
+        func(*args)
+        t = time.perf_counter() - t
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def benchClassify(text_dirs, repeat):
+    '''Compares doc.Line construction with the sequential classifier.'''
+
+    # Read all lines in advance -- only the classification is measured.
+    lines = []
+    for text_dir in text_dirs:
+        lines.extend(gen.sourceFileLines(text_dir))
+
+    # Both classifiers must give the same results.
+    for relname, lineno, line in lines:
+        docline = doc.Line(relname, lineno, line)
+        expected = SequentialLine(relname, lineno, line)
+        assert (docline.type, docline.attrib) == \
+               (expected.type, expected.attrib), repr(expected)
+
+    def dispatched():
+        for relname, lineno, line in lines:
+            doc.Line(relname, lineno, line)
+
+    def sequential():
+        for relname, lineno, line in lines:
+            SequentialLine(relname, lineno, line)
+
+    t_seq = bestOf(repeat, sequential)
+    t_disp = bestOf(repeat, dispatched)
+
+    print('lines:                {}'.format(len(lines)))
+    print('sequential regexes:   {:.3f} s ({:.0f} lines/s)'.format(
+          t_seq, len(lines) / t_seq))
+    print('doc.Line (dispatch):  {:.3f} s ({:.0f} lines/s)'.format(
+          t_disp, len(lines) / t_disp))
+    print('speedup:              {:.2f}x'.format(t_seq / t_disp))
+
+
+def benchMemory(root_src_dir, langs):
+    '''Measures memory used by the doc.Line and doc.Element objects.
+
+       The pass1 parsers load the lists of lines and elements for all langs
+       (the English original is parsed only once and shared). The memory
+       allocated by the retained lists and the peak are reported.'''
+
+    with tempfile.TemporaryDirectory() as aux_dir:
+        tracemalloc.start()
+        t = time.perf_counter()
+
+        parsers = []
+        for lang in langs:
+            parser = pass1.Parser(lang, root_src_dir, aux_dir, use_cache=False)
+            if parsers:
+                parser.shareEnglish(parsers[0].en_elements,
+                                    parsers[0].en_sha_to_elem,
+                                    parsers[0].digest_name)
+            parser.loadDoclineLists()
+            parser.convertDoclinesToElements()
+            parsers.append(parser)
+
+        t = time.perf_counter() - t
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    lines = len(parsers[0].en_doclines) + sum(len(p.xx_doclines) for p in parsers)
+    elements = len(parsers[0].en_elements) + sum(len(p.xx_elements) for p in parsers)
+    print('lines:     {}'.format(lines))
+    print('elements:  {}'.format(elements))
+    print('retained:  {:.1f} MiB'.format(current / 2**20))
+    print('peak:      {:.1f} MiB'.format(peak / 2**20))
+    print('time:      {:.3f} s (including tracemalloc overhead)'.format(t))
+
+
+# Vocabulary of the synthetic book. The translation replaces each word
+# by the reversed one; the backticked terms are kept.
+_words = '''git the a of to and is file repository branch commit merge remote
+    you can that this with for it your are on be as change project history
+    version control server working directory staging area snapshot tree
+    data system command line tool history log status when which new all
+    use run see first some more other also only then into what have'''.split()
+_terms = ['git commit', 'HEAD', '.gitignore', 'git add', 'master', 'origin',
+          'git log', 'git status', 'git push', 'README', 'git diff', '--amend']
+
+
+def _sentence(rng):
+    '''Returns the list of words of one English sentence.'''
+    words = [rng.choice(_words) for i in range(rng.randint(6, 24))]
+    for i in range(rng.choice((0, 0, 1, 1, 2, 3))):
+        words.insert(rng.randrange(len(words)), '`{}`'.format(rng.choice(_terms)))
+    if rng.random() < 0.15:
+        words.insert(rng.randrange(len(words)), '*{}*'.format(rng.choice(_words)))
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), '“{}”'.format(rng.choice(_words)))
+    words[0] = words[0].capitalize()
+    return words
+
+
+def _translate(words, rng):
+    '''Returns the translated words (the markup is kept).'''
+    result = []
+    for w in words:
+        if w.startswith('`'):
+            # The translator sometimes forgets the backticks.
+            result.append(w.strip('`') if rng.random() < 0.03 else w)
+        elif w.startswith('“'):
+            result.append('„{}“'.format(w[1:-1][::-1]))
+        elif w.startswith('*'):
+            result.append('*{}*'.format(w[1:-1][::-1]))
+        else:
+            result.append(w[::-1])
+    return result
+
+
+def _paragraph(rng):
+    '''Returns the couple of the English and translated paragraph lines.'''
+    en = []
+    xx = []
+    for i in range(rng.randint(1, 5)):
+        words = _sentence(rng)
+        en.append(' '.join(words) + '.')
+        xx.append(' '.join(_translate(words, rng)) + '.')
+    en_lines = [' '.join(en) + '\n']
+    if len(xx) > 1 and rng.random() < 0.3:
+        # The translated paragraph split to more lines.
+        half = len(xx) // 2
+        xx_lines = [' '.join(xx[:half]) + '\n', ' '.join(xx[half:]) + '\n']
+    else:
+        xx_lines = [' '.join(xx) + '\n']
+    return en_lines, xx_lines
+
+
+def _code(rng, no):
+    '''Returns the lines of the code snippet (the same in both languages).'''
+    lines = ['\t$ git {} {}\n'.format(rng.choice(('commit -m', 'log', 'add', 'diff')),
+                                       no)]
+    for i in range(rng.randint(1, 5)):
+        lines.append('\t{}\n'.format(' '.join(rng.choice(_words)
+                                             for j in range(rng.randint(1, 8)))))
+    return lines
+
+
+def generateCorpus(root_dir, lang='xx', chapters=9, sections=40, seed=1,
+                   mix=(60, 15, 10, 15), divergence=0.02, extras=20,
+                   snippets=20):
+    '''Generates the synthetic book to the root_dir.
+
+       The chapters have the sections with 2 to 6 blocks; the mix gives
+       the weights of paragraphs, code snippets, lists, and images.
+       The divergence is the probability that the section of the translation
+       misses a paragraph or has an extra one. The extras is the number
+       of the translator notes (defined in the extra_lines.txt), the snippets
+       is the number of the code snippets with translated comments (defined
+       in the translated_snippets.txt). Returns the dict with the summary.'''
+    rng = random.Random(seed)
+    defs_dir = os.path.join(root_dir, 'definitions', lang)
+    for d in (os.path.join(root_dir, 'en'), os.path.join(root_dir, lang), defs_dir):
+        if os.path.isdir(d):
+            shutil.rmtree(d)
+        os.makedirs(d)
+
+    summary = {'chapters': chapters, 'sections': sections, 'seed': seed,
+               'mix': list(mix), 'divergence': divergence, 'extras': 0,
+               'snippets': 0, 'divergences': 0, 'en_lines': 0, 'xx_lines': 0,
+               'bytes': 0}
+    extra_defs = []
+    snippet_defs = []
+    total_sections = chapters * sections
+    extra_at = set(rng.sample(range(total_sections), min(extras, total_sections)))
+    snippet_at = set(rng.sample(range(total_sections), min(snippets, total_sections)))
+    section_no = 0
+    for ch in range(1, chapters + 1):
+        en = ['## Chapter {} ##\n'.format(ch), '\n']
+        xx = ['## Kapitola {} ##\n'.format(ch), '\n']
+        for sec in range(1, sections + 1):
+            section_no += 1
+            en += ['### Section {}.{} ###\n'.format(ch, sec), '\n']
+            xx += ['### Oddíl {}.{} ###\n'.format(ch, sec), '\n']
+
+            if section_no in extra_at:
+                # The translator note (skipped by pass1).
+                note = ['Translator note {}: {}\n'.format(
+                        section_no, ' '.join(_translate(_sentence(rng), rng))), '\n']
+                xx += note
+                extra_defs.append(''.join(note) + '=====\n')
+                summary['extras'] += 1
+
+            if section_no in snippet_at:
+                # The code snippet with the translated comment.
+                code = _code(rng, section_no)
+                comment = ['\t# {} {}\n'.format(section_no, ' '.join(_sentence(rng)))]
+                en += comment + code + ['\n']
+                xx_comment = ['\t# {} {}\n'.format(
+                              section_no, ' '.join(_translate(_sentence(rng), rng)))]
+                xx += xx_comment + code + ['\n']
+                snippet_defs.append(''.join(comment) + '-----\n' +
+                                    ''.join(xx_comment) + '=====\n')
+                summary['snippets'] += 1
+
+            diverge = rng.random() < divergence
+            if diverge:
+                summary['divergences'] += 1
+            for block in range(rng.randint(2, 6)):
+                kind = rng.choices(('para', 'code', 'list', 'img'), mix)[0]
+                if kind == 'para':
+                    en_lines, xx_lines = _paragraph(rng)
+                elif kind == 'code':
+                    en_lines = xx_lines = _code(rng, block)
+                elif kind == 'list':
+                    en_lines = []
+                    xx_lines = []
+                    for i in range(rng.randint(2, 5)):
+                        words = _sentence(rng)
+                        en_lines.append('* {}\n'.format(' '.join(words)))
+                        xx_lines.append('* {}\n'.format(' '.join(_translate(words, rng))))
+                else:
+                    img = '18333fig{:02d}{:02d}.png'.format(ch, block)
+                    words = _sentence(rng)
+                    en_lines = ['Insert {}\n'.format(img), '\n',
+                                'Figure {}-{}. {}.\n'.format(ch, block, ' '.join(words))]
+                    xx_lines = ['Insert {}\n'.format(img), '\n',
+                                'Obrázek {}-{}. {}.\n'.format(
+                                    ch, block, ' '.join(_translate(words, rng)))]
+                if diverge and block == 0:
+                    if rng.random() < 0.5:
+                        xx_lines = []                       # missing
+                    else:
+                        xx_lines = xx_lines + ['\n'] + _paragraph(rng)[1]  # extra
+                en += en_lines + ['\n']
+                if xx_lines:
+                    xx += xx_lines + ['\n']
+
+        subdir = '{:02d}-chapter{}'.format(ch, ch)
+        name = '01-chapter{}.markdown'.format(ch)
+        for text_dir, lines in ((os.path.join(root_dir, 'en'), en),
+                                (os.path.join(root_dir, lang), xx)):
+            os.makedirs(os.path.join(text_dir, subdir))
+            with open(os.path.join(text_dir, subdir, name), 'w',
+                      encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        summary['en_lines'] += len(en)
+        summary['xx_lines'] += len(xx)
+        summary['bytes'] += sum(len(line.encode('utf-8')) for line in en + xx)
+
+    for name, defs in (('extra_lines.txt', extra_defs),
+                       ('translated_snippets.txt', snippet_defs),
+                       ('backtick_exceptions.txt', [])):
+        with open(os.path.join(defs_dir, name), 'w', encoding='utf-8',
+                  newline='') as f:
+            f.writelines(defs)
+    return summary
+
+
+def runPipeline(root_src_dir, lang, root_definitions_dir, aux_dir, use_cache, jobs):
+    '''Runs pass1 and pass2. Returns the couple of the stats dicts.'''
+    parser1 = pass1.Parser(lang, root_src_dir, aux_dir, use_cache,
+                           root_definitions_dir=root_definitions_dir, jobs=jobs)
+    parser1.run()
+    parser2 = pass2.Parser(parser1, jobs)
+    parser2.run()
+    return parser1.stats.asDict(), parser2.stats.asDict()
+
+
+def benchPipeline(args):
+    '''Runs pass1 and pass2 end-to-end and reports the phases.
+
+       The best of the repeated runs (by the total wall time) is reported.
+       The memory is measured by one more run under tracemalloc (it slows
+       the run down, so it is not timed).'''
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if args.src is not None:
+            root_src_dir, lang = args.src
+            root_definitions_dir = None
+            corpus = {'src': os.path.abspath(root_src_dir), 'lang': lang}
+        else:
+            root_src_dir = os.path.join(tmp_dir, 'src')
+            lang = 'xx'
+            corpus = corpusFromArgs(root_src_dir, args)
+            root_definitions_dir = os.path.join(root_src_dir, 'definitions')
+
+        aux_dir = os.path.join(tmp_dir, 'aux')
+        if args.cache:
+            # Populate the parse caches; the measured runs are warm.
+            runPipeline(root_src_dir, lang, root_definitions_dir, aux_dir,
+                        True, args.jobs)
+
+        best = None
+        for i in range(args.repeat):
+            t = time.perf_counter()
+            stats1, stats2 = runPipeline(root_src_dir, lang, root_definitions_dir,
+                                         aux_dir, args.cache, args.jobs)
+            t = time.perf_counter() - t
+            if best is None or t < best[0]:
+                best = (t, stats1, stats2)
+
+        tracemalloc.start()
+        runPipeline(root_src_dir, lang, root_definitions_dir, aux_dir,
+                    args.cache, args.jobs)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    wall, stats1, stats2 = best
+    phases = []
+    for prefix, st in (('pass1', stats1), ('pass2', stats2)):
+        for record in st['phases']:
+            record = dict(record)
+            record['phase'] = '{}.{}'.format(prefix, record['phase'])
+            phases.append(record)
+    result = {'corpus': corpus, 'cache': args.cache, 'jobs': args.jobs,
+              'wall': wall, 'lines': stats1['total'].get('lines', 0),
+              'tracemalloc_peak': peak, 'phases': phases}
+
+    print('{:36} {:>9} {:>9} {:>12}'.format('phase', 'wall [s]', 'cpu [s]', 'items/s'))
+    for record in phases:
+        items = record.get('lines', record.get('elements', 0))
+        print('{:36} {:9.3f} {:9.3f} {:12.0f}'.format(
+              record['phase'], record['wall'], record['cpu'],
+              items / record['wall'] if record['wall'] else 0))
+    print('end-to-end:  {:.3f} s ({:.0f} source lines/s)'.format(
+          wall, result['lines'] / wall))
+    print('peak traced memory:  {:.1f} MiB'.format(peak / 2**20))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+def benchCompare(old_fname, new_fname):
+    '''Compares the wall times of the phases of two pipeline results.'''
+    with open(old_fname, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_fname, encoding='utf-8') as f:
+        new = json.load(f)
+    if old['corpus'] != new['corpus']:
+        print('warning: the results are for different corpora')
+
+    old_phases = {record['phase']: record for record in old['phases']}
+    print('{:36} {:>9} {:>9} {:>8}'.format('phase', 'old [s]', 'new [s]', 'speedup'))
+    rows = [(record['phase'], old_phases[record['phase']]['wall'], record['wall'])
+            for record in new['phases'] if record['phase'] in old_phases]
+    rows.append(('end-to-end', old['wall'], new['wall']))
+    for name, t_old, t_new in rows:
+        print('{:36} {:9.3f} {:9.3f} {:7.2f}x'.format(
+              name, t_old, t_new, t_old / t_new if t_new else 0))
+    print('peak traced memory:  {:.1f} -> {:.1f} MiB'.format(
+          old['tracemalloc_peak'] / 2**20, new['tracemalloc_peak'] / 2**20))
+
+
+def addCorpusArguments(p):
+    '''Adds the options of the synthetic corpus to the argument parser.'''
+    p.add_argument('--chapters', type=int, default=9, help='number of chapters')
+    p.add_argument('--sections', type=int, default=40,
+                   help='number of sections in the chapter')
+    p.add_argument('--seed', type=int, default=1, help='random seed')
+    p.add_argument('--mix', default='60,15,10,15',
+                   help='weights of paragraphs, code snippets, lists, images')
+    p.add_argument('--divergence', type=float, default=0.02,
+                   help='probability of a structure difference in a section')
+    p.add_argument('--extras', type=int, default=20,
+                   help='number of translator notes (extra lines)')
+    p.add_argument('--snippets', type=int, default=20,
+                   help='number of code snippets with translated comments')
+
+
+def corpusFromArgs(root_dir, args):
+    '''Generates the corpus by the options. Returns the summary.'''
+    return generateCorpus(root_dir, 'xx', args.chapters, args.sections, args.seed,
+                          [int(w) for w in args.mix.split(',')], args.divergence,
+                          args.extras, args.snippets)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('classify', help='line classification (doc.Line)')
+    p.add_argument('text_dirs', nargs='+', help='source directories or files')
+    p.add_argument('-n', '--repeat', type=int, default=5,
+                   help='number of repetitions, the best time is taken')
+
+    p = sub.add_parser('memory', help='memory used by doc.Line and doc.Element')
+    p.add_argument('root_src_dir', help='root of the source documents (progit/)')
+    p.add_argument('langs', nargs='+', help='target languages (cs, fr, ...)')
+
+    p = sub.add_parser('corpus', help='generate the synthetic book')
+    p.add_argument('root_dir', help='target directory (en/, xx/, definitions/)')
+    addCorpusArguments(p)
+
+    p = sub.add_parser('pipeline', help='pass1 and pass2 end-to-end')
+    addCorpusArguments(p)
+    p.add_argument('--src', nargs=2, metavar=('ROOT_SRC_DIR', 'LANG'),
+                   help='existing sources instead of the synthetic corpus')
+    p.add_argument('-n', '--repeat', type=int, default=3,
+                   help='number of repetitions, the best time is taken')
+    p.add_argument('-j', '--jobs', type=int, default=1,
+                   help='worker processes of pass1 and pass2 (default: 1, serial)')
+    p.add_argument('--cache', action='store_true',
+                   help='measure the runs with the warm parse cache')
+    p.add_argument('--json', help='write the result to the JSON file')
+
+    p = sub.add_parser('compare', help='compare two pipeline --json results')
+    p.add_argument('old', help='the JSON file of the older run')
+    p.add_argument('new', help='the JSON file of the newer run')
+
+    args = ap.parse_args()
+    if args.command == 'classify':
+        benchClassify(args.text_dirs, args.repeat)
+    elif args.command == 'memory':
+        benchMemory(args.root_src_dir, args.langs)
+    elif args.command == 'corpus':
+        print(json.dumps(corpusFromArgs(args.root_dir, args), indent=2))
+    elif args.command == 'pipeline':
+        benchPipeline(args)
+    elif args.command == 'compare':
+        benchCompare(args.old, args.new)
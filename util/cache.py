@@ -0,0 +1,197 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Persistent cache of the parsed source files.'''
+
+import concurrent.futures
+import doc
+import gen
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+class ParseCache:
+    '''Cache of doc.Line lists of the source files stored in the aux directory.
+
+       The record for each source file (the absolute path is the key)
+       remembers the size, the modification time, and the SHA-1 digest
+       of the file content, and the list of doc.Line objects parsed
+       from the file. When the size and the mtime are the same, the file
+       is not even read. When they differ, the file is read and the digest
+       decides whether the lines must be parsed again. This way only
+       the touched chapters are re-parsed.'''
+
+    # Increase the version when the representation of the doc.Line
+    # objects changes. The older cache file is then ignored.
+    version = 2
+
+    def __init__(self, aux_dir):
+        self.fname = os.path.join(aux_dir, 'pass1cache.pickle')
+        self.records = {}   # abs. fname -> (size, mtime_ns, digest, doclines)
+        self.loaded = False # the cache file is loaded lazily, when first used
+        self.hits = 0       # number of files taken from the cache
+        self.misses = 0     # number of parsed files
+        self.bytes_read = 0 # number of bytes read from the source files
+        self.regex_calls = 0    # number of regex calls when parsing the lines
+
+
+    def load(self):
+        '''Loads the records from the cache file (if it exists and is valid).'''
+        self.loaded = True
+        if not os.path.isfile(self.fname):
+            return
+
+        try:
+            with open(self.fname, 'rb') as f:
+                version, records = pickle.load(f)
+        except Exception:
+            # Broken or incompatible cache is not an error. It will
+            # be rebuilt from the sources.
+            return
+
+        if version == self.version:
+            self.records = records
+
+
+    def save(self):
+        '''Writes the records to the cache file.
+
+           Records of the source files that do not exist any more
+           are dropped. The file is replaced atomically.'''
+        records = {fname: rec for fname, rec in self.records.items()
+                   if os.path.isfile(fname)}
+        # The temporary file has a unique name -- more processes may save
+        # the same cache (the last one wins).
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.fname),
+                                         suffix='.tmp', delete=False) as f:
+            pickle.dump((self.version, records), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, self.fname)
+
+
+    def fileDoclines(self, fname):
+        '''Returns the list of doc.Line objects for the source file.'''
+
+        if not self.loaded:
+            self.load()
+
+        st = os.stat(fname)
+        rec = self.records.get(fname)
+        if rec is not None and rec[0] == st.st_size \
+           and rec[1] == st.st_mtime_ns:
+            self.hits += 1
+            return rec[3]
+
+        # The file was touched (or it is not known yet). Map the content
+        # to memory and compare the digests. The digest is computed
+        # from the mapped pages; the content is decoded only when
+        # the lines must be parsed again.
+        data = gen.mappedContent(fname)
+        try:
+            self.bytes_read += len(data)
+            digest = hashlib.sha1(data).digest()
+
+            if rec is not None and rec[2] == digest:
+                # Touched, but not changed. Refresh the stat info.
+                self.hits += 1
+                doclines = rec[3]
+            else:
+                self.misses += 1
+                relname = gen.relName(fname)
+                regex_calls = doc.Line.regex_calls
+                doclines = [doc.Line(relname, lineno, line)
+                            for lineno, line in enumerate(gen.bufferLines(data), 1)]
+                self.regex_calls += doc.Line.regex_calls - regex_calls
+        finally:
+            if not isinstance(data, bytes):
+                data.close()
+
+        self.records[fname] = (st.st_size, st.st_mtime_ns, digest, doclines)
+        return doclines
+
+
+    def parseFiles(self, fnames, jobs):
+        '''Parses the files not taken from the cache in the worker processes.
+
+           Returns the dict fname -> list of doc.Line objects for the files
+           whose size or mtime differ from the record. The records and
+           the counters are updated as by fileDoclines().'''
+        if not self.loaded:
+            self.load()
+
+        stale = []
+        for fname in fnames:
+            st = os.stat(fname)
+            rec = self.records.get(fname)
+            if rec is None or rec[0] != st.st_size or rec[1] != st.st_mtime_ns:
+                stale.append(fname)
+        if len(stale) < 2:
+            return {}       # not worth the workers (see fileDoclines())
+
+        result = {}
+        known_digests = [self.records[fname][2] if fname in self.records else None
+                         for fname in stale]
+        for fname, (size, mtime_ns, digest, compact, regex_calls) in zip(
+                stale, parseFiles(stale, known_digests, jobs)):
+            self.bytes_read += size
+            if compact is None:
+                # Touched, but not changed.
+                self.hits += 1
+                doclines = self.records[fname][3]
+            else:
+                self.misses += 1
+                doclines = doc.expandLines(gen.relName(fname), compact)
+                self.regex_calls += regex_calls
+            self.records[fname] = (size, mtime_ns, digest, doclines)
+            result[fname] = doclines
+        return result
+
+
+    def doclines(self, text_dir, jobs=1):
+        '''Generator of doc.Line objects for the whole text_dir.
+
+           The sequence is the same as when constructing the doc.Line
+           objects from the gen.sourceFileLines(text_dir) tuples. Unless
+           the jobs is 1, the changed files are parsed in the worker
+           processes (None -- number of CPUs).'''
+        fnames = list(gen.sourceFiles(text_dir))
+        parsed = self.parseFiles(fnames, jobs) if jobs != 1 else {}
+        for fname in fnames:
+            doclines = parsed.get(fname)
+            if doclines is None:
+                doclines = self.fileDoclines(fname)
+            for docline in doclines:
+                yield docline
+            yield doc.Line(gen.relName(fname), 0, '\n')  # separator
+
+
+def parseFile(fname, known_digest=None):
+    '''Reads and parses the source file -- in the worker process.
+
+       Returns (size, mtime_ns, digest, compact, regex_calls). The compact
+       is None when the content has the known_digest (the file was only
+       touched). Otherwise, it is the compact form of the doc.Line objects
+       (see doc.compactLines()).'''
+    st = os.stat(fname)
+    data = gen.mappedContent(fname)
+    try:
+        digest = hashlib.sha1(data).digest()
+        if digest == known_digest:
+            return st.st_size, st.st_mtime_ns, digest, None, 0
+        lines = gen.bufferLines(data)
+    finally:
+        if not isinstance(data, bytes):
+            data.close()
+    relname = gen.relName(fname)
+    regex_calls = doc.Line.regex_calls
+    doclines = [doc.Line(relname, lineno, line)
+                for lineno, line in enumerate(lines, 1)]
+    return (st.st_size, st.st_mtime_ns, digest, doc.compactLines(doclines),
+            doc.Line.regex_calls - regex_calls)
+
+
+def parseFiles(fnames, known_digests, jobs):
+    '''Returns the list of parseFile() results computed by the worker processes.'''
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(parseFile, fnames, known_digests))
@@ -0,0 +1,410 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Last known content of the elements (content_sha.txt or content_sha.bin).
+
+Usage: contentsha.py tobin content_sha.txt content_sha.bin
+       contentsha.py totext content_sha.bin content_sha.txt
+       contentsha.py migrate lang root_src_dir root_aux_dir digest
+
+The record captures the position of the English element and of its
+translation (like '01/123' or '01/123-125' -- chapter/lines), and
+the digests of both contents. The text format has one record per line
+with the digests in hex:
+
+    01/5 01/5 eb2aaa2b...01938b100cc 043815e0...d780827316
+
+The binary format stores the same records in a fixed-width form
+(big-endian, so that the packed positions compare as bytes):
+
+    header   magic b'CSHA', version (H), digest size (B), pad, count (I)
+    records  count x (en position, xx position, en digest, xx digest)
+             where the position is chapter (2s), first line (I), last line (I)
+    index    count x record number (I) sorted by the en position
+    index    count x record number (I) sorted by the en digest
+
+The records keep the order of the text file, so the conversion is lossless
+in both directions. The binary file is memory-mapped when loaded; the
+records are looked up by binary search through the indexes, so nothing
+is parsed in advance.
+
+The digest algorithm is given by `definitions/xx/content_digest.txt`
+(one line like 'blake2b-8' -- BLAKE2b with 8-byte digests). When the file
+does not exist (or is empty), SHA-1 is used. The records of the definitions
+can be converted to another digest by the migrate command -- see
+pass1.Parser.migrateContentSha().
+'''
+
+import bisect
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+
+_header = struct.Struct('>4sHBxI')
+_magic = b'CSHA'
+_version = 1
+_position = struct.Struct('>2sII')
+_recno = struct.Struct('>I')
+
+
+def packPosition(ch_lineno):
+    '''Converts the '01/123' or '01/123-125' position to the packed form.'''
+    ch, lineno = ch_lineno.split('/')
+    first, sep, last = lineno.partition('-')
+    chb = ch.encode('utf-8')
+    if len(chb) != 2:
+        raise ValueError('chapter must have two ASCII characters: {!r}'
+                         .format(ch_lineno))
+    return _position.pack(chb, int(first), int(last or first))
+
+
+def unpackPosition(data):
+    '''Converts the packed position back to the '01/123' form.'''
+    chb, first, last = _position.unpack(data)
+    if first == last:
+        return '{}/{}'.format(chb.decode('utf-8'), first)
+    return '{}/{}-{}'.format(chb.decode('utf-8'), first, last)
+
+
+def digestConstructor(name):
+    '''Returns the hashlib constructor for the digest name.
+
+       The name is 'sha1', or 'blake2b-N' where N is the digest size
+       in bytes (1 to 64). The constructor takes the initial data.'''
+    if name == 'sha1':
+        return hashlib.sha1
+    algorithm, sep, size = name.partition('-')
+    if algorithm == 'blake2b' and size.isdigit() and 1 <= int(size) <= 64:
+        return functools.partial(hashlib.blake2b, digest_size=int(size))
+    raise ValueError('unknown content digest: {!r}'.format(name))
+
+
+def digestName(lang_definitions_dir):
+    '''Returns the name of the content digest used for the language.'''
+    fname = os.path.join(lang_definitions_dir, 'content_digest.txt')
+    if os.path.isfile(fname):
+        with open(fname, encoding='utf-8') as f:
+            name = f.read().strip()
+        if name:
+            digestConstructor(name)     # unknown name raises the exception
+            return name
+    return 'sha1'
+
+
+class TextContentSha:
+    '''Records loaded from the text file into the lookup dictionaries.'''
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.records = []               # (en_ch_lineno, xx_ch_lineno, en_digest, xx_digest)
+        self.en_chl_to_digests = {}     # en position -> (en_digest, xx_digest)
+        self.en_digest_to_xx = {}       # en digest -> set of xx digests
+        self.digest_size = None         # unknown for the empty file
+        with open(fname, encoding='utf-8') as f:
+            for lineno, line in enumerate(f, 1):
+                try:
+                    en_ch_lineno, xx_ch_lineno, en_sha, xx_sha = line.split()
+                    en_digest = bytes.fromhex(en_sha)
+                    xx_digest = bytes.fromhex(xx_sha)
+                except ValueError:
+                    raise ValueError('{}:{}: expected "en_ch/lineno xx_ch/lineno'
+                                     ' en_digest xx_digest"'.format(fname, lineno)) from None
+                if len(en_digest) != len(xx_digest) or \
+                   (self.records and len(en_digest) != len(self.records[0][2])):
+                    raise ValueError('{}:{}: the digests of different sizes'
+                                     .format(fname, lineno))
+                self.records.append((en_ch_lineno, xx_ch_lineno,
+                                     en_digest, xx_digest))
+                self.en_chl_to_digests[en_ch_lineno] = (en_digest, xx_digest)
+                self.en_digest_to_xx.setdefault(en_digest, set()).add(xx_digest)
+        if self.records:
+            self.digest_size = len(self.records[0][2])
+
+
+    def lookup(self, en_ch_lineno):
+        '''Returns (en_digest, xx_digest) for the English position, or None.'''
+        return self.en_chl_to_digests.get(en_ch_lineno)
+
+
+    def xxDigests(self, en_digest):
+        '''Returns the set of translation digests known for the en_digest.'''
+        return self.en_digest_to_xx.get(en_digest, ())
+
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+    def close(self):
+        pass
+
+
+class NotBinaryError(ValueError):
+    '''The file is not in the binary format at all (see load()).'''
+
+
+class BinaryContentSha:
+    '''Records of the memory-mapped binary file.'''
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _header.size:
+                raise NotBinaryError('{}: {} bytes -- shorter than the header '
+                                     'of the binary content_sha ({} bytes)'
+                                     .format(fname, size, _header.size))
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.digest_size, self.count = \
+            _header.unpack_from(self.mm, 0)
+        if self.count == 0:
+            self.digest_size = None     # as for the empty text file
+        if magic != _magic:
+            self.mm.close()
+            raise NotBinaryError('{}: not a binary content_sha file (no {!r} magic)'
+                                 .format(fname, _magic))
+        if version != _version:
+            self.mm.close()
+            raise ValueError('{}: binary content_sha of version {}, expected {}'
+                             .format(fname, version, _version))
+
+        psize = _position.size
+        self.record_size = 2 * psize + 2 * (self.digest_size or 0)
+        self.records_offset = _header.size
+        self.position_index = self.records_offset + self.count * self.record_size
+        self.digest_index = self.position_index + self.count * _recno.size
+        expected = self.digest_index + self.count * _recno.size
+        if len(self.mm) != expected:
+            size = len(self.mm)
+            self.mm.close()
+            raise ValueError('{}: {} bytes, {} expected for {} records -- '
+                             'truncated or corrupted'
+                             .format(fname, size, expected, self.count))
+
+
+    def _recordOffset(self, recno):
+        return self.records_offset + recno * self.record_size
+
+
+    def _indexed(self, index_offset, i):
+        '''Returns the record number from the i-th item of the index.'''
+        return _recno.unpack_from(self.mm, index_offset + i * _recno.size)[0]
+
+
+    def _enPosition(self, recno):
+        off = self._recordOffset(recno)
+        return self.mm[off:off + _position.size]
+
+
+    def _enDigest(self, recno):
+        off = self._recordOffset(recno) + 2 * _position.size
+        return self.mm[off:off + self.digest_size]
+
+
+    def _xxDigest(self, recno):
+        off = self._recordOffset(recno) + 2 * _position.size + self.digest_size
+        return self.mm[off:off + self.digest_size]
+
+
+    def _search(self, index_offset, keyfunc, key):
+        '''Returns the range of the index items with the key.'''
+        keys = _IndexKeys(self, index_offset, keyfunc)
+        return bisect.bisect_left(keys, key), bisect.bisect_right(keys, key)
+
+
+    def lookup(self, en_ch_lineno):
+        '''Returns (en_digest, xx_digest) for the English position, or None.
+
+           When the position is repeated, the last record wins (as when
+           the text file is loaded into a dictionary).'''
+        try:
+            key = packPosition(en_ch_lineno)
+        except ValueError:
+            return None
+        lo, hi = self._search(self.position_index, self._enPosition, key)
+        if lo == hi:
+            return None
+        recno = self._indexed(self.position_index, hi - 1)
+        return self._enDigest(recno), self._xxDigest(recno)
+
+
+    def xxDigests(self, en_digest):
+        '''Returns the set of translation digests known for the en_digest.'''
+        lo, hi = self._search(self.digest_index, self._enDigest, en_digest)
+        return {self._xxDigest(self._indexed(self.digest_index, i))
+                for i in range(lo, hi)}
+
+
+    def __iter__(self):
+        psize = _position.size
+        for recno in range(self.count):
+            off = self._recordOffset(recno)
+            yield (unpackPosition(self.mm[off:off + psize]),
+                   unpackPosition(self.mm[off + psize:off + 2 * psize]),
+                   self._enDigest(recno), self._xxDigest(recno))
+
+
+    def close(self):
+        self.mm.close()
+
+
+class _IndexKeys:
+    '''Sequence view of the sorted index for the bisect functions.'''
+
+    def __init__(self, store, index_offset, keyfunc):
+        self.store = store
+        self.index_offset = index_offset
+        self.keyfunc = keyfunc
+
+    def __len__(self):
+        return self.store.count
+
+    def __getitem__(self, i):
+        return self.keyfunc(self.store._indexed(self.index_offset, i))
+
+
+class TextWriter:
+    '''Writes the records in the text format.'''
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.f = open(fname, 'w', encoding='utf-8')
+
+    def write(self, en_ch_lineno, xx_ch_lineno, en_digest, xx_digest):
+        self.f.write('{} {} {} {}\n'.format(en_ch_lineno, xx_ch_lineno,
+                                            en_digest.hex(), xx_digest.hex()))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ListWriter:
+    '''Collects the records to the list (instead of writing a file).'''
+
+    def __init__(self, records):
+        self.records = records
+
+    def write(self, en_ch_lineno, xx_ch_lineno, en_digest, xx_digest):
+        self.records.append((en_ch_lineno, xx_ch_lineno, en_digest, xx_digest))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class BinaryWriter:
+    '''Writes the records in the binary format (with the indexes).
+
+       The indexes can be built only when all records are known;
+       this way, the records are collected and written by close().'''
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.records = []       # (en position, xx position, en digest, xx digest) packed
+
+    def write(self, en_ch_lineno, xx_ch_lineno, en_digest, xx_digest):
+        self.records.append((packPosition(en_ch_lineno),
+                             packPosition(xx_ch_lineno), en_digest, xx_digest))
+
+    def close(self):
+        digest_size = len(self.records[0][2]) if self.records else 20
+        for rec in self.records:
+            if len(rec[2]) != digest_size or len(rec[3]) != digest_size:
+                raise ValueError('digests of different sizes')
+
+        # The sort is stable; the repeated keys keep the file order.
+        recnos = range(len(self.records))
+        by_position = sorted(recnos, key=lambda i: self.records[i][0])
+        by_digest = sorted(recnos, key=lambda i: self.records[i][2])
+
+        with open(self.fname, 'wb') as f:
+            f.write(_header.pack(_magic, _version, digest_size,
+                                 len(self.records)))
+            f.write(b''.join(b''.join(rec) for rec in self.records))
+            f.write(b''.join(_recno.pack(i) for i in by_position))
+            f.write(b''.join(_recno.pack(i) for i in by_digest))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def load(fname):
+    '''Loads the records from the text or binary file (by the extension).
+
+       The .bin file that is not in the binary format at all (say empty,
+       or the text records saved under the name) is read as the text.
+       The other errors of the binary file are raised.'''
+    if fname.endswith('.bin'):
+        try:
+            return BinaryContentSha(fname)
+        except NotBinaryError:
+            pass
+    return TextContentSha(fname)
+
+
+def writer(fname):
+    '''Returns the writer of the format given by the extension.'''
+    if fname.endswith('.bin'):
+        return BinaryWriter(fname)
+    return TextWriter(fname)
+
+
+def definitionsFile(lang_definitions_dir):
+    '''Returns the name of the last known content file in the definitions.
+
+       The binary content_sha.bin is used when it exists. Otherwise,
+       the content_sha.txt is used (the empty one is created if it does
+       not exist).'''
+    fname = os.path.join(lang_definitions_dir, 'content_sha.bin')
+    if os.path.isfile(fname):
+        return fname
+
+    fname = os.path.join(lang_definitions_dir, 'content_sha.txt')
+    if not os.path.isfile(fname):
+        f = open(fname, 'w', encoding='utf-8')
+        f.close()
+    return fname
+
+
+def convert(src_fname, dst_fname):
+    '''Converts the records between the formats (given by the extensions).'''
+    src = load(src_fname)
+    try:
+        with writer(dst_fname) as w:
+            for rec in src:
+                w.write(*rec)
+    finally:
+        src.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == 'migrate':
+        import pass1
+        lang, root_src_dir, root_aux_dir, digest = sys.argv[2:]
+        print(pass1.Parser(lang, root_src_dir, root_aux_dir).migrateContentSha(digest))
+        sys.exit(0)
+    if len(sys.argv) != 4 or sys.argv[1] not in ('tobin', 'totext') \
+       or sys.argv[3].endswith('.bin') != (sys.argv[1] == 'tobin'):
+        print(__doc__.split('\n\n')[1])
+        sys.exit(2)
+    convert(sys.argv[2], sys.argv[3])
@@ -8,6 +8,11 @@ import re
 class Line:
     '''One Line object is constructed from one markdown source line.'''
 
+    # There are hundreds of thousands of the objects for the whole book
+    # in more languages. No per-instance dictionary saves memory and makes
+    # the construction faster.
+    __slots__ = ('fname', 'lineno', 'line', 'type', '_attrib')
+
     # The following regular expressions are used for recognition
     # of the used markdown-syntax lines.
 
@@ -29,73 +34,96 @@ class Line:
     # Numbered list item.
     rexLi = re.compile(r'^(?P<num>\d+\.)\s+(?P<text>.+?)\s*$')
 
+    # Each of the above regular expressions requires a different first
+    # character of the line. The dispatch table maps the first character
+    # to the only candidate: (regex, line type, function extracting
+    # the attributes from the match object). This way, each line is
+    # classified with at most one regex call, and the plain text lines
+    # (the majority) usually with none.
+    _dispatch = dict.fromkeys('0123456789',
+                              (rexLi, 'li',
+                               lambda m: (m.group('num'), m.group('text'))))
+    _dispatch.update({
+        '#':  (rexTitle, 'title',
+               lambda m: (len(m.group('level')), m.group('title'))),
+        '*':  (rexBullet, 'uli', lambda m: m.group('uli')),
+        'I':  (rexInsImg, 'img', lambda m: m.group('img')),
+        'F':  (rexImgCaption, 'imgcaption',
+               lambda m: (m.group('num'), m.group('text'))),
+        'O':  (rexImgCaption, 'imgcaption',
+               lambda m: (m.group('num'), m.group('text'))),
+        ' ':  (rexCode, 'code', lambda m: m.group('code')),
+        '\t': (rexCode, 'code', lambda m: m.group('code')),
+        })
+
+    # Number of the regex calls made by the constructor in the process
+    # (the callers count the difference, see stats.py).
+    regex_calls = 0
+
     def __init__(self, fname, lineno, line):
         self.fname = fname      # the source file name
         self.lineno = lineno    # line number in the source file
         self.line = line        # the line from the source file
 
         self.type = None        # line type
-        self.attrib = None      # init -- line attributes (the type dependent)
+        self._attrib = None     # init -- line attributes (the type dependent)
 
         # The line that contains only whitespaces is considered empty (separator).
         if self.line.isspace():
             self.type = 'empty'
-            self.attrib = ''   # represented as empty string
-            return
-
-        # Line with the title.
-        m = self.rexTitle.match(line)
-        if m:
-            self.type = 'title'
-            self.attrib = (len(m.group('level')), m.group('title'))
-            return
-
-        # Unnumbered list item.
-        m = self.rexBullet.match(line)
-        if m:
-            self.type = 'uli'
-            self.attrib = m.group('uli')
-            return
-
-        # Numbered list item.
-        m = self.rexLi.match(line)
-        if m:
-            self.type = 'li'
-            self.attrib = (m.group('num'), m.group('text'))
-            return
-
-        # Image insertion.
-        m = self.rexInsImg.match(line)
-        if m:
-            self.type = 'img'
-            self.attrib = m.group('img')
+            self._attrib = ''   # represented as empty string
             return
 
-        # Image caption.
-        m = self.rexImgCaption.match(line)
-        if m:
-            self.type = 'imgcaption'
-            self.attrib = (m.group('num'), m.group('text'))
-            return
-
-        # Code-snippet line.
-        m = self.rexCode.match(line)
-        if m:
-            self.type = 'code'
-            self.attrib = m.group('code')
-            return
+        # Title, list items, image insertion, image caption, or code-snippet
+        # line. The candidate is selected by the first character.
+        candidate = self._dispatch.get(line[:1])
+        if candidate is not None:
+            rex, linetype, attrib = candidate
+            Line.regex_calls += 1
+            m = rex.match(line)
+            if m:
+                self.type = linetype
+                self._attrib = attrib(m)
+                return
 
         # The empty line should not happen, but it means that
         # there the content in the file was exhausted.
         # From the solved-problem point of view it is not a separator.
         if self.line == '':
             self.type = 'EOF'
-            self.attrib = None
+            self._attrib = None
             return
 
-        # The other cases are considered text lines.
+        # The other cases are considered text lines. The attribute
+        # is the rstripped line; it is not stored (see the attrib property).
         self.type = 'text'
-        self.attrib = line.rstrip()
+
+
+    @classmethod
+    def classified(cls, fname, lineno, line, linetype, attrib):
+        '''Returns the Line object of the line classified earlier.
+
+           No regex is called -- the type and the attributes were found
+           by the constructor in another process (see compactLines()).'''
+        self = cls.__new__(cls)
+        self.fname = fname
+        self.lineno = lineno
+        self.line = line
+        self.type = linetype
+        self._attrib = attrib
+        return self
+
+
+    @property
+    def attrib(self):
+        '''Line attributes (the type dependent).
+
+           The text lines are the majority of the book. Their attribute
+           is derived from the line when needed so that the copy
+           of the line is not kept in memory.'''
+        if self.type == 'text':
+            return self.line.rstrip()
+        return self._attrib
 
 
     def __repr__(self):
@@ -116,11 +144,17 @@ class Element:
     than in the original. (The original typically contains paragraphs
     as one very long line.'''
 
+    # See the note at the Line class. The sha is set by the pass1 parser.
+    # The joined values are computed when first needed (see value()).
+    __slots__ = ('fname', 'doclines', 'type', 'sha', '_value', '_raw_value')
+
     def __init__(self, docline):
         self.fname = docline.fname  # the source file name
-        self.doclines = [docline]   # list of lines object
+        self.doclines = [docline]   # list of lines objects (most elements have one)
         self.type = docline.type    # element type
-        self.attrib = docline.attrib # init -- element attributes (the type dependent)
+        self.sha = None             # init -- digest of the content (bytes)
+        self._value = None          # init -- cached value() of rstripped lines
+        self._raw_value = None      # init -- cached value(False)
 
         # Initial implementation just wraps the doc.Line objects
         # as one-line lists. Then it corrects the 'text' type to 'para'.
@@ -128,13 +162,20 @@ class Element:
             self.type = 'para'
 
 
+    @property
+    def attrib(self):
+        '''Element attributes (the type dependent) -- of the first line.'''
+        return self.doclines[0].attrib
+
     def append(self, docline):
         '''Appends the docline to the list.'''
         self.doclines.append(docline)
+        self._value = self._raw_value = None    # joined values changed
 
     def extend_lines_from(self, element):
         '''Extends the doclines list by items from the element.'''
         self.doclines.extend(element.doclines)
+        self._value = self._raw_value = None    # joined values changed
 
     def _line(self):
         '''Probably legacy -- to be replaced by something better.'''
@@ -142,11 +183,19 @@ class Element:
 
 
     def value(self, rstrip_lines=True):
-        '''Returns the lines of the element as one string.'''
+        '''Returns the lines of the element as one string.
+
+           The checks ask for the value of the same element many times.
+           The joined string is built only once and remembered (until
+           the lines are appended).'''
         if rstrip_lines:
-            return ' '.join(dl.line.rstrip() for dl in self.doclines)
+            if self._value is None:
+                self._value = ' '.join(dl.line.rstrip() for dl in self.doclines)
+            return self._value
         else:
-            return ''.join(dl.line for dl in self.doclines)
+            if self._raw_value is None:
+                self._raw_value = ''.join(dl.line for dl in self.doclines)
+            return self._raw_value
 
 
     def lineno(self):
@@ -160,9 +209,27 @@ class Element:
 
 
     def __repr__(self):
-        return repr((self.fname, self.no, self.type,
+        return repr((self.fname, self.lineno(), self.type,
                      self.attrib, self.doclines))
 
 
     def __str__(self):
-        return ''.join.self.lines
+        return self.value(False)
+
+
+def compactLines(doclines):
+    '''Returns the compact form of the Line objects of one source file.
+
+       The lists of the lines, of the types, and of the attributes are
+       transferred between processes much faster than the objects. The line
+       numbers are 1, 2, ... (see expandLines()).'''
+    return ([dl.line for dl in doclines], [dl.type for dl in doclines],
+            [dl._attrib for dl in doclines])
+
+
+def expandLines(fname, compact):
+    '''Returns the list of Line objects from the compactLines() result.'''
+    lines, types, attribs = compact
+    return [Line.classified(fname, lineno, line, linetype, attrib)
+            for lineno, (line, linetype, attrib)
+            in enumerate(zip(lines, types, attribs), 1)]
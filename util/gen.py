@@ -4,6 +4,8 @@
 '''Generators for gluing the source files into a stream of lines...
 '''
 
+import io
+import mmap
 import os
 import re
 
@@ -29,6 +31,61 @@ def sourceFiles(text_dir):
                 yield fname
 
 
+def relName(fname):
+    '''Returns the name of the source file relative to its text_dir.
+
+       We know there is one subdir level and then the files inside.
+       The result has the form subdir/source_file.markdown.'''
+    path, name = os.path.split(fname)
+    subdir = os.path.basename(path)
+    return '/'.join((subdir, name))
+
+
+def mappedContent(fname):
+    '''Returns the content of the file mapped to memory (read-only mmap).
+
+       The pages of the file are read when accessed, without copying
+       them to a bytes object -- the parse cache digests them directly.
+       The lines are not backed by the map (see bufferLines()). The empty
+       file cannot be mapped -- the empty bytes are returned instead.
+       Close the mmap when done.'''
+    with open(fname, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def bufferLines(data):
+    '''Returns the list of lines of the UTF-8 encoded content.
+
+       The data is any buffer (bytes, mmap). It is decoded at once, and
+       the text is split to the lines -- each line is its own str, so
+       the buffer can be closed afterwards (the decoding is not deferred
+       as every line is classified right after reading). The lines are
+       the same as when iterating over the file opened in the text mode
+       -- the universal newlines translate the carriage returns, and
+       the other line boundaries of str.splitlines() (rare) do not split
+       the line.'''
+    text = str(data, 'utf-8')
+    if '\r' not in text:
+        # The str.splitlines() takes also other characters than '\n'
+        # as line boundaries (like '\f'). Then there are more lines.
+        lines = text.splitlines(True)
+        if len(lines) == text.count('\n') + (not text.endswith('\n') and bool(text)):
+            return lines
+    return list(io.StringIO(text, newline=None))
+
+
+def fileLines(fname):
+    '''Returns the list of lines of the UTF-8 encoded file (see bufferLines()).'''
+    data = mappedContent(fname)
+    try:
+        return bufferLines(data)
+    finally:
+        if not isinstance(data, bytes):
+            data.close()
+
+
 def sourceFileLines(name):
     '''Generator of source-file lines as they should appear in the book.
 
@@ -51,21 +108,33 @@ def sourceFileLines(name):
         # Loop through the source files in the order, open them,
         # and yield their lines.
         for fname in sourceFiles(text_dir):
-            # Build the relname relative to the text_dir. We know there is one
-            # subdir level and then the files inside.
-            path, name = os.path.split(fname)
-            subdir = os.path.basename(path)
-            relname = '/'.join((subdir, name))  # subdir/souce_file.markdown
-            with open(fname, encoding='utf-8') as f:
-                for lineno, line in enumerate(f, 1):
-                    yield relname, lineno, line
+            # Build the relname relative to the text_dir.
+            relname = relName(fname)
+            for lineno, line in enumerate(fileLines(fname), 1):
+                yield relname, lineno, line
             yield relname, 0, '\n'    # to be sure the last line of the previous is separated
     else:
         # It should be a file name.
         assert os.path.isfile(name)
-        with open(name, encoding='utf-8') as f:
-            for lineno, line in enumerate(f, 1):
-                yield name, lineno, line
+        for lineno, line in enumerate(fileLines(name), 1):
+            yield name, lineno, line
+
+
+def mappingLines(sources):
+    '''Generator of source lines from the mapping relname -> content.
+
+       The relname has the form subdir/source_file.markdown, the content
+       is the text or the UTF-8 encoded bytes. The tuples are the same
+       as from the sourceFileLines() for the directory with such files.'''
+    for relname in sorted(sources, key=lambda relname: relname.split('/')):
+        content = sources[relname]
+        if isinstance(content, bytes):
+            lines = bufferLines(content)
+        else:
+            lines = io.StringIO(content, newline=None)
+        for lineno, line in enumerate(lines, 1):
+            yield relname, lineno, line
+        yield relname, 0, '\n'    # to be sure the last line of the previous is separated
 
 
 def toc(text_dir, max_level=4):
@@ -0,0 +1,236 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Language-dependent definitions (the files in definitions/xx).
+
+The files are maintained by hand (mostly copy/pasted from the reports):
+
+    extra_lines.txt           sequences of translation lines skipped by pass1
+    translated_snippets.txt   code snippets with translated comments
+    backtick_exceptions.txt   intentional differences of the backtick markup
+    content_sha.txt (.bin)    last known content (see contentsha.py)
+    content_digest.txt        digest of the content (see contentsha.py)
+
+The load() function reads all of them at once, validates them, and builds
+the lookup indexes. The errors are reported by DefinitionError with the file
+name and the line number. The incomplete definition at the end of the file
+(the separator is missing) is not an error -- it is ignored as before,
+and the warning is collected.
+
+The loaded definitions can be pickled to the snapshot file (in the aux
+directory). The next load() takes the snapshot when none of the definition
+files changed (the sizes and the modification times are compared).
+'''
+
+import contentsha
+import multimatch
+import os
+import pickle
+
+
+class DefinitionError(ValueError):
+    '''Error in the definition file -- the message starts with fname:lineno.'''
+
+    def __init__(self, fname, lineno, msg):
+        super().__init__('{}:{}: {}'.format(fname, lineno, msg))
+        self.fname = fname
+        self.lineno = lineno
+
+
+class Definitions:
+    '''All definitions of the language with the lookup indexes.'''
+
+    # Increase the version when the attributes change. The older
+    # snapshot is then ignored.
+    version = 2
+
+    def __init__(self, lang_definitions_dir):
+        self.lang_definitions_dir = lang_definitions_dir
+        self.warnings = []      # 'fname:lineno: message' of the ignored parts
+
+        # The key is the first line of the extra sequence, the value is
+        # the list of lines of the sequence (the first line included).
+        # The matcher finds the sequences in the translated lines.
+        self.extras_fname = self.fname('extra_lines.txt')
+        self.extras = self.loadExtras(self.extras_fname)
+        self.extras_matcher = multimatch.Matcher(self.extras.items())
+
+        # The key is the first line of the original snippet, the value
+        # is the couple of the lists of lines (original, translation).
+        # The matchers find the complete definitions in the lines
+        # of the elements -- one for each side (0 original, 1 translation).
+        # The order tells the key defined earlier (it wins when more
+        # snippets start at the same element).
+        self.snippets_fname = self.fname('translated_snippets.txt')
+        self.translated_snippets = self.loadSnippets(self.snippets_fname)
+        complete = [(key, lists) for key, lists in self.translated_snippets.items()
+                    if lists[0] and lists[1]]
+        self.snippets_matchers = tuple(
+            multimatch.Matcher((key, lists[side]) for key, lists in complete)
+            for side in (0, 1))
+        self.snippets_order = {key: n for n, (key, lists) in enumerate(complete)}
+
+        # The original line -> the translated line.
+        self.exceptions_fname = self.fname('backtick_exceptions.txt')
+        self.backtick_exceptions = self.loadExceptions(self.exceptions_fname)
+
+        # The records of the text file are kept loaded (the binary file
+        # is memory-mapped when asked for, see lastKnown()).
+        self.content_fname = contentsha.definitionsFile(lang_definitions_dir)
+        self.content = None
+        if not self.content_fname.endswith('.bin'):
+            self.content = contentsha.load(self.content_fname)
+
+
+    def fname(self, name):
+        '''Returns the name of the definition file (created empty if missing).'''
+        fname = os.path.join(self.lang_definitions_dir, name)
+        if not os.path.isfile(fname):
+            f = open(fname, 'w')
+            f.close()
+        return fname
+
+
+    def loadExtras(self, fname):
+        '''Loads the extra sequences separated by ===== lines.'''
+        extras = {}
+        first = {}          # key -> line number (for the error message)
+        lst = None
+        with open(fname, encoding='utf-8') as f:
+            for lineno, line in enumerate(f, 1):
+                if lst is None:
+                    # First line is the key, the list is the value.
+                    if line in extras:
+                        raise DefinitionError(fname, lineno,
+                            'the first line of the sequence is already used '
+                            'at line {} (split the sequences)'.format(first[line]))
+                    lst = extras[line] = [line]     # first line repeated in the list
+                    first[line] = lineno
+                elif line.startswith('====='):      # 5 at minimum
+                    lst = None
+                else:
+                    lst.append(line)                # next of the sequence
+        if lst is not None:
+            self.warnings.append('{}:{}: the sequence is not terminated by ====='
+                                 .format(fname, first[lst[0]]))
+        return extras
+
+
+    def loadSnippets(self, fname):
+        '''Loads the translated snippets (original ----- translation =====).'''
+        snippets = {}
+        first = {}          # key -> line number (for the error message)
+        status = 0
+        en_lines = None
+        xx_lines = None
+        key = None
+        with open(fname, encoding='utf-8') as f:
+            for lineno, line in enumerate(f, 1):
+                if status == 0:
+                    # First line is the key.
+                    if line in snippets:
+                        raise DefinitionError(fname, lineno,
+                            'the first line of the snippet is already used '
+                            'at line {} (split the definitions)'.format(first[line]))
+                    key = line
+                    first[key] = lineno
+                    en_lines, xx_lines = snippets[key] = ([line], [])
+                    status = 1
+
+                elif status == 1:
+                    # Lines of the original until the separator.
+                    if line.startswith('-----'):    # at least 5 from beginning
+                        status = 2
+                    else:
+                        en_lines.append(line)
+
+                else:
+                    # Lines of the translated sources until the separator.
+                    if line.startswith('====='):    # at least 5 from first pos
+                        status = 0
+                    else:
+                        xx_lines.append(line)
+        if status != 0:
+            self.warnings.append('{}:{}: the snippet is not terminated by {}'
+                                 .format(fname, first[key],
+                                         '-----' if status == 1 else '====='))
+        return snippets
+
+
+    def loadExceptions(self, fname):
+        '''Loads the backtick exceptions (original ----- translation =====).'''
+        exceptions = {}
+        status = 0
+        original = None
+        with open(fname, encoding='utf-8') as f:
+            for lineno, line in enumerate(f, 1):
+                if status == 0:
+                    original = line     # will be the key later
+                    status = 1
+
+                elif status == 1:
+                    if not line.startswith('-----'):
+                        raise DefinitionError(fname, lineno,
+                            'the ----- separator expected after the original line')
+                    status = 2
+
+                elif status == 2:
+                    exceptions[original] = line    # translation
+                    status = 3
+
+                else:
+                    if not line.startswith('====='):
+                        raise DefinitionError(fname, lineno,
+                            'the ===== separator expected after the translated line')
+                    status = 0
+        if status in (1, 2):
+            self.warnings.append('{}:{}: the exception is incomplete'
+                                 .format(fname, lineno))
+        return exceptions
+
+
+    def lastKnown(self):
+        '''Returns the last known content records (see contentsha.load()).
+
+           The binary file is memory-mapped again for each call; the caller
+           closes it (closing the text records does nothing).'''
+        if self.content is not None:
+            return self.content
+        return contentsha.load(self.content_fname)
+
+
+def stamps(lang_definitions_dir):
+    '''Returns the dict name -> (size, mtime) of the definition files.'''
+    result = {}
+    for name in sorted(os.listdir(lang_definitions_dir)):
+        st = os.stat(os.path.join(lang_definitions_dir, name))
+        result[name] = (st.st_size, st.st_mtime_ns)
+    return result
+
+
+def load(lang_definitions_dir, snapshot_fname=None):
+    '''Returns the Definitions of the language.
+
+       When the snapshot_fname is given, the snapshot is used if valid,
+       or it is written for the next time.'''
+    if snapshot_fname is not None and os.path.isfile(snapshot_fname):
+        try:
+            with open(snapshot_fname, 'rb') as f:
+                version, snapshot_stamps, definitions = pickle.load(f)
+        except Exception:
+            # Broken or incompatible snapshot is not an error. It will
+            # be rebuilt from the definitions.
+            version = None
+        if version == Definitions.version \
+           and snapshot_stamps == stamps(lang_definitions_dir):
+            return definitions
+
+    definitions = Definitions(lang_definitions_dir)
+    if snapshot_fname is not None:
+        # The stamps are taken after the missing files were created.
+        tmpname = snapshot_fname + '.tmp'
+        with open(tmpname, 'wb') as f:
+            pickle.dump((Definitions.version, stamps(lang_definitions_dir),
+                         definitions), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, snapshot_fname)
+    return definitions
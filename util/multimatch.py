@@ -0,0 +1,67 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Multi-pattern matching over sequences (Aho-Corasick automaton).'''
+
+import collections
+
+
+class Matcher:
+    '''Finds occurrences of more patterns in one pass through the sequence.
+
+       The patterns are sequences of hashable items (say lines of the source
+       files). The automaton is built once; then the search time is linear
+       in the length of the searched sequence plus the number of found
+       occurrences -- regardless of how many patterns are defined.'''
+
+    def __init__(self, patterns):
+        '''The patterns is an iterable of (key, sequence) couples.'''
+        self.goto = [{}]    # state -> {item: next_state}
+        self.fail = [0]     # state -> failure state
+        self.out = [[]]     # state -> list of (key, pattern length)
+
+        # Build the trie of the patterns.
+        for key, seq in patterns:
+            assert len(seq) > 0     # empty pattern would match everywhere
+            state = 0
+            for item in seq:
+                nxt = self.goto[state].get(item)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][item] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append((key, len(seq)))
+
+        # Breadth-first construction of the failure links (the states
+        # just below the root fail to the root). The outputs of the failure
+        # state are inherited (the shorter patterns that end at the same
+        # position).
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for item, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and item not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(item, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+
+    def finditer(self, seq):
+        '''Generator of (start index, key) for all occurrences in the seq.
+
+           The occurrences are yielded in the order of their end index.'''
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        state = 0
+        for i, item in enumerate(seq):
+            while state and item not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(item, 0)
+            for key, length in out[state]:
+                yield i - length + 1, key
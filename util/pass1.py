@@ -1,10 +1,17 @@
 #!python3
 # -*- coding: utf-8 -*-
 
+import align
+import cache
+import concurrent.futures
+import contentsha
 import doc
 import gen
-import hashlib
+import langdefs
 import os
+import re
+import report
+import stats
 
 
 class Parser:
@@ -14,7 +21,8 @@ class Parser:
        the target language abbreviation), and reports if there is any difference
        in the structure of the documents.'''
 
-    def __init__(self, lang, root_src_dir, root_aux_dir):
+    def __init__(self, lang, root_src_dir, root_aux_dir, use_cache=True,
+                 disabled_reports=(), root_definitions_dir=None, jobs=1):
         self.lang = lang    # the language abbrev. like 'cs', 'fr', 'ru', etc.
         self.root_src_dir = os.path.realpath(root_src_dir)
         self.root_aux_dir = os.path.realpath(root_aux_dir)
@@ -31,23 +39,18 @@ class Parser:
         # Derive the auxiliary directory for the target language.
         self.xx_aux_dir = os.path.join(self.root_aux_dir, lang + '_aux')
 
-        # Root directory for the language-dependent definition files.
-        path, scriptname = os.path.split(__file__)
-        self.root_definitions_dir = os.path.abspath(os.path.join(path, 'definitions'))
+        # Root directory for the language-dependent definition files
+        # (the `definitions` next to this script unless given).
+        if root_definitions_dir is None:
+            path, scriptname = os.path.split(__file__)
+            root_definitions_dir = os.path.join(path, 'definitions')
+        self.root_definitions_dir = os.path.abspath(root_definitions_dir)
 
         # Directory with the language dependent definitions.
         self.lang_definitions_dir = os.path.join(self.root_definitions_dir, self.lang)
 
         # Create the directories if they does not exist.
-        if not os.path.isdir(self.en_aux_dir):
-            os.makedirs(self.en_aux_dir)
-
-        if not os.path.isdir(self.xx_aux_dir):
-            os.makedirs(self.xx_aux_dir)
-
-        if not os.path.isdir(self.lang_definitions_dir):
-            os.makedirs(self.lang_definitions_dir)
-
+        self.makeDirs()
 
         self.en_doclines = None  # list of Line objects from the English original
         self.xx_doclines = None  # ... and from the target language
@@ -58,9 +61,53 @@ class Parser:
         self.en_sha_to_elem = {} # reverse lookup table
         self.xx_sha_to_elem = {} # reverse lookup table
 
+        # Digest of the element content (see contentsha.py). It is selected
+        # by the definitions of the language; SHA-1 by default.
+        self.digest_name = contentsha.digestName(self.lang_definitions_dir)
+
+        # The definitions of the language (see langdefs.py), loaded when
+        # first needed by loadDefinitions(). The compiled snapshot is kept
+        # in the aux directory together with the parse caches.
+        self.definitions = None
+        self.definitions_snapshot = os.path.join(self.xx_aux_dir,
+            'definitions.pickle') if use_cache else None
+
+        # Persistent caches of the parsed source files (see cache.py).
+        # When disabled, all source files are parsed in each run.
+        self.use_cache = use_cache
+        self.en_cache = cache.ParseCache(self.en_aux_dir) if use_cache else None
+        self.xx_cache = cache.ParseCache(self.xx_aux_dir) if use_cache else None
+
+        # Number of worker processes parsing the source files and building
+        # the elements of the chapters in parallel (None -- number of CPUs,
+        # 1 -- no workers, parsed serially).
+        self.jobs = jobs
+
+        # Report files (some can be turned off, like report.DEBUG_REPORTS).
+        self.reports = report.Reports(disabled_reports)
+
+        # The findings for the tools (JSON Lines, see report.Findings).
+        self.findings_fname = os.path.join(self.xx_aux_dir, 'pass1findings.jsonl')
+        self.findings_opened = False
+
+        # Time and counters of the phases (see stats.py), dumped by run().
+        self.stats = stats.Stats(self.reports)
+        self.stats_fname = os.path.join(self.xx_aux_dir, 'pass1stats.json')
+
+        # The list collecting the report.Finding objects (see api.py);
+        # None -- the findings are only written to the file.
+        self.collected_findings = None
+
         self.log_info = []       # lines for displaying or logging
 
 
+    def makeDirs(self):
+        '''Creates the aux and definitions directories if they do not exist.'''
+        for d in (self.en_aux_dir, self.xx_aux_dir, self.lang_definitions_dir):
+            if not os.path.isdir(d):
+                os.makedirs(d)
+
+
     def short_name(self, fname):
         '''Returns tail of the fname -- for log info.'''
         lst = fname.split(os.sep)
@@ -70,318 +117,632 @@ class Parser:
             return '/'.join(lst[-2:])
 
 
-    def writePass1txtFiles(self):
-        # Copy the target language sources into the `single.markdown`.
-        # This can be useful when converting the whole book using the PanDoc utility.
-        fnameout = os.path.join(self.xx_aux_dir, 'single.markdown')
-        with open(fnameout, 'w', encoding='utf-8', newline='\n') as fout:
-            for fname, lineno, line in gen.sourceFileLines(self.xx_src_dir):
-                fout.write(line)
+    def logReport(self, fname):
+        '''Captures the report file to the log (unless turned off).'''
+        if self.reports.enabled(fname):
+            self.log_info.append(self.short_name(fname))
 
-        # Capture the info about the generated file.
-        self.log_info.append(self.short_name(fnameout))
 
-        # Copy the target language sources with chapter/line info into a single
-        # file -- mostly for debugging, not consumed later.
-        fnameout = os.path.join(self.xx_aux_dir, 'pass1.txt')
-        with open(fnameout, 'w', encoding='utf-8', newline='\n') as fout:
-            for fname, lineno, line in gen.sourceFileLines(self.xx_src_dir):
-                fout.write('{}/{}:\t{}'.format(fname[:2], lineno, line))
+    def openFindings(self):
+        '''Opens the findings -- the file is truncated when opened first.'''
+        f = self.reports.open(self.findings_fname, newline='\n',
+                              append=self.findings_opened)
+        self.findings_opened = True
+        return report.Findings(f, self.lang, self.collected_findings)
+
+
+    def readSources(self, text_dir, aux_dir, parse_cache, doclines_fname=None):
+        '''Reads the sources once and returns the list of doc.Line objects.
+
+           The lines are fanned out to all consumers during the single pass:
+           the `single.markdown` and `pass1.txt` files are written to the aux_dir,
+           and the doclines_fname report (if given) gets the representation
+           of the doc.Line objects.'''
+
+        # The `single.markdown` contains the sources glued together. This can
+        # be useful when converting the whole book using the PanDoc utility.
+        # The `pass1.txt` contains the sources with chapter/line info
+        # -- mostly for debugging, not consumed later.
+        # (The English `pass1.txt` keeps the platform newlines as it always did.)
+        single_fname = os.path.join(aux_dir, 'single.markdown')
+        pass1_fname = os.path.join(aux_dir, 'pass1.txt')
+        pass1_newline = None if aux_dir == self.en_aux_dir else '\n'
+
+        # The reports that are turned off are not even formatted.
+        # The format templates are bound once, outside of the loop.
+        pass1_line = None
+        if self.reports.enabled(pass1_fname):
+            pass1_line = '{}/{}:\t{}'.format
+        doclines_line = None
+        if doclines_fname is not None and self.reports.enabled(doclines_fname):
+            doclines_line = '{}/{} {}: {!r}\n'.format
+        if parse_cache is not None:
+            bytes_read = parse_cache.bytes_read
+            regex_calls = parse_cache.regex_calls
+        else:
+            regex_calls = doc.Line.regex_calls
+        doclines = []
+        with self.reports.open(single_fname, newline='\n') as fsingle, \
+             self.reports.open(pass1_fname, newline=pass1_newline) as fpass1, \
+             (self.reports.open(doclines_fname) if doclines_fname is not None
+              else report.NullReport()) as fdl:
+            for docline in self.doclines(text_dir, parse_cache):
+                doclines.append(docline)
+                fsingle.write(docline.line)
+                if pass1_line is not None:
+                    fpass1.write(pass1_line(docline.fname[:2], docline.lineno,
+                                            docline.line))
+                if doclines_line is not None:
+                    fdl.write(doclines_line(docline.fname[:2], docline.lineno,
+                                            docline.type, docline.attrib))
+
+        # Count the work. Only the parsed files (not taken from the cache)
+        # were read and their lines classified. The regex calls of the lines
+        # constructed in this process are counted by doc.Line (the workers
+        # return their counts, see parsedDoclines()).
+        self.stats.count('lines', len(doclines))
+        if parse_cache is not None:
+            self.stats.count('bytes_read', parse_cache.bytes_read - bytes_read)
+            self.stats.count('regex_calls', parse_cache.regex_calls - regex_calls)
+        else:
+            self.stats.count('bytes_read', self.sourceBytes(text_dir))
+            self.stats.count('regex_calls', doc.Line.regex_calls - regex_calls)
 
-        # Capture the info about the generated file for logging.
-        self.log_info.append(self.short_name(fnameout))
+        # Capture the info about the generated files.
+        self.logReport(single_fname)
+        self.logReport(pass1_fname)
+        return doclines
 
-        # Do the same with the English original -- the `single.markdown`.
-        # This can be useful when converting the whole book using the PanDoc utility.
-        fnameout = os.path.join(self.en_aux_dir, 'single.markdown')
-        with open(fnameout, 'w', encoding='utf-8', newline='\n') as fout:
-            for fname, lineno, line in gen.sourceFileLines(self.en_src_dir):
-                fout.write(line)
-        self.log_info.append(self.short_name(fnameout))
 
-        # ... and `pass1.txt` with chapter/line info.
-        fnameout = os.path.join(self.en_aux_dir, 'pass1.txt')
-        with open(fnameout, 'w', encoding='utf-8') as fout:
-            for fname, lineno, line in gen.sourceFileLines(self.en_src_dir):
-                fout.write('{}/{}:\t{}'.format(fname[:2], lineno, line))
-        self.log_info.append(self.short_name(fnameout))
+    def sourceBytes(self, text_dir):
+        '''Returns the total size of the source files in bytes.'''
+        return sum(os.path.getsize(fname) for fname in gen.sourceFiles(text_dir))
+
+
+    def doclines(self, text_dir, parse_cache):
+        '''Generator of doc.Line objects -- from the cache if enabled.'''
+        if parse_cache is not None:
+            return parse_cache.doclines(text_dir, self.jobs)
+        elif self.jobs != 1:
+            return self.parsedDoclines(text_dir)
+        else:
+            return (doc.Line(relname, lineno, line)
+                    for relname, lineno, line in gen.sourceFileLines(text_dir))
+
+
+    def parsedDoclines(self, text_dir):
+        '''Generator of doc.Line objects of the files parsed by the workers.'''
+        fnames = list(gen.sourceFiles(text_dir))
+        results = cache.parseFiles(fnames, [None] * len(fnames), self.jobs)
+        for fname, (size, mtime_ns, digest, compact, regex_calls) in zip(fnames, results):
+            self.stats.count('regex_calls', regex_calls)
+            relname = gen.relName(fname)
+            for docline in doc.expandLines(relname, compact):
+                yield docline
+            yield doc.Line(relname, 0, '\n')     # separator
+
+
+    def saveCaches(self):
+        '''Writes the parse caches and captures the info to the log.'''
+        for parse_cache in (self.xx_cache, self.en_cache):
+            if parse_cache is not None and parse_cache.loaded:
+                parse_cache.save()
+                self.log_info.append('{} (parsed {}, cached {})'.format(
+                    self.short_name(parse_cache.fname),
+                    parse_cache.misses, parse_cache.hits))
+
+
+    def loadDefinitions(self):
+        '''Returns the definitions of the language (loaded only once).
+
+           The problems ignored in the definition files are logged.'''
+        if self.definitions is None:
+            self.definitions = langdefs.load(self.lang_definitions_dir,
+                                             self.definitions_snapshot)
+            self.log_info.extend(self.definitions.warnings)
+        return self.definitions
+
+
+    def loadEnglish(self):
+        '''Loads the English original only.
+
+           The elements can be shared by the parsers for other languages
+           (see shareEnglish()) so that the original is parsed only once.'''
+        with self.stats.phase('loadEnglish'):
+            en_doclines_fname = os.path.join(self.en_aux_dir, 'pass1doclines.txt')
+            self.en_doclines = self.readSources(self.en_src_dir, self.en_aux_dir,
+                                                self.en_cache, en_doclines_fname)
+            self.logReport(en_doclines_fname)
+            self.saveCaches()
+
+            self.en_elements, self.en_sha_to_elem = self.convertToElements(
+                                                        self.en_aux_dir,
+                                                        self.en_doclines)
+
+
+    def shareEnglish(self, en_elements, en_sha_to_elem, digest_name='sha1'):
+        '''Uses the English elements loaded by another parser.
+
+           Neither the list nor the elements are modified (checkStructDiffs()
+           builds a new list without the translated snippets). The elements
+           are not shared when their digests were computed by another
+           algorithm than the one used for the language.
+           Returns True if shared.'''
+        if digest_name != self.digest_name:
+            return False
+        self.en_elements = en_elements
+        self.en_sha_to_elem = en_sha_to_elem
+        return True
+
+
+    def redigestedEnglish(self, digest_name):
+        '''Returns the English elements and the reverse table for another digest.
+
+           The elements are built again from the loaded English doclines
+           (see loadEnglish()), and their digests are computed by the other
+           algorithm. Nothing is read or reported -- the result is meant
+           for shareEnglish() of the parsers for the languages using
+           the digest_name.'''
+        elements = self.buildElements(self.en_doclines)
+        sha_to_elem = {}
+        for e, digest in zip(elements, self.elementDigests(elements, digest_name)):
+            e.sha = digest
+            sha_to_elem[digest] = e
+        return elements, sha_to_elem
 
 
     def loadDoclineLists(self):
         '''Loads document line objects of the source documents to the lists.
 
+           The sources of both languages are read only once (see readSources()).
            As a side effect, the representations of the lines
            is saved into pass1doclines.txt (mostly for debugging purpose).'''
 
+        # Loop through the lines and build the lists of Line objects
+        # from the original and from the translation. The structure of the
+        # English original is reported during the same pass.
+        # The English part is skipped when the elements were shared from
+        # another parser (see shareEnglish()).
+        self.xx_doclines = self.readSources(self.xx_src_dir, self.xx_aux_dir,
+                                            self.xx_cache)
+        en_doclines_fname = os.path.join(self.en_aux_dir, 'pass1doclines.txt')
+        if self.en_elements is None:
+            self.en_doclines = self.readSources(self.en_src_dir, self.en_aux_dir,
+                                                self.en_cache, en_doclines_fname)
+
         # The target-language sources may contain some extra parts used
         # as translator notes or some other explanations of the English
         # original. When compared with the original, the parts must be
         # skipped. The `definitions/xx/extra_lines.txt` stores the definitions
         # of the skipped parts in the form that can be cut/pasted from
-        # other logs (UTF-8). If the extra_lines.txt file does not exist,
-        # the empty one is created.
-        #
-        # The definitions are loaded to the dictionary where the key
-        # is the first line of the extra sequence, and the value is
-        # the list of lines of the sequence.
+        # other logs (UTF-8). The definitions are indexed by the first line
+        # of the extra sequence (see langdefs.py).
         #
         # Note: If it happens and there are two or more sequences
         # with the same line (say some title of the included sequence),
         # just split the extra sequences to one extra sequence for
         # the first line, and the two or more sequences of the rest lines
         # (without that first line).
-        extras_fname = os.path.join(self.lang_definitions_dir,
-                                    'extra_lines.txt')
-
-        # Create the empty file if it does not exist.
-        if not os.path.isfile(extras_fname):
-            f = open(extras_fname, 'w')
-            f.close()
-
-        # Load the content to the `extras` dictionary.
-        extras = {}
-        status = 0
-        lst = None
-        with open(extras_fname, encoding='utf-8') as f:
-            for line in f:
-                if status == 0:
-                    # First line is the key, the list is the value.
-                    lst = extras.setdefault(line, [])
-                    assert len(lst) == 0    # duplicity raises the exception
-                    lst.append(line)        # first line repeated in the list
-                    status = 1
-
-                elif status == 1:
-                    # The sequence until the separator.
-                    if line.startswith('====='):    # 5 at minimum
-                        lst = None
-                        status = 0
-                    else:
-                        lst.append(line)    # next of the sequence
-
-                else:
-                    raise NotImplementedError('status = {}\n'.format(status))
+        definitions = self.loadDefinitions()
+        extras = definitions.extras
 
         # Capture the info about the input file with the definitions.
-        self.log_info.append(self.short_name(extras_fname))
+        self.log_info.append(self.short_name(definitions.extras_fname))
 
-        # Loop through the lines and build the lists of Line objects
-        # from the original and from the translation. The extra sequences
-        # from the target languages are reported and skipped. They will be
-        # deleted from the list.
-        self.xx_doclines = []
-        for relname, lineno, line in gen.sourceFileLines(self.xx_src_dir):
-            docline = doc.Line(relname, lineno, line)
-            self.xx_doclines.append(docline)
-
-        # Delete and report the extra lines.
+        # Find all occurrences of the extra sequences in one pass through
+        # the target-language lines. The first line of the sequence is
+        # unique; this way, at most one sequence can start at the index.
+        extra_starts = {}       # index of the first line -> extra_lines
+        for index, key in definitions.extras_matcher.finditer(dl.line for dl in self.xx_doclines):
+            extra_starts[index] = extras[key]
+
+        # The extra sequences from the target languages are reported
+        # and skipped. The kept lines are collected into the new list.
         xx_extra_fname = os.path.join(self.xx_aux_dir, 'pass1extra_lines.txt')
-        with open(xx_extra_fname, 'w', encoding='utf-8') as fout:
+        with self.reports.open(xx_extra_fname) as fout:
+            kept = []
             index = 0                       # index the processed element
-            while index < len(self.xx_doclines): # do not optimize, the length can change
-                docline = self.xx_doclines[index]# current element
-                if docline.line in extras:  # is current line recognized as extra?
-                    # I could be the extra sequence. Compare the other lines
-                    # in the length of the sequence. Firstly, extract the following
-                    # lines in the length of the extras list.
-                    extra_lines = extras[docline.line]
-                    src_lines = [e.line for e in self.xx_doclines[index:index+len(extra_lines)]]
-
-                    # If the list have the same content, delete the source elements.
-                    if src_lines == extra_lines:
-                        # Report the skipped lines.
-                        fout.write('{}/{}:\n'.format(docline.fname, docline.lineno))
-                        fout.write(''.join(src_lines))
-                        fout.write('====================\n\n')
-
-                        # Delete the lines via deleting their elements.
-                        del self.xx_doclines[index:index+len(extra_lines)]
-
-                        # Decrement the index -- i.e. correction as
-                        # it will be incremented later.
-                        index -= 1
-
-                # Jump to the next checked element.
-                index += 1
+            while index < len(self.xx_doclines):
+                docline = self.xx_doclines[index]   # current element
+                extra_lines = extra_starts.get(index)
+                if extra_lines is not None:
+                    # Report the skipped lines and jump behind them.
+                    fout.write('{}/{}:\n'.format(docline.fname, docline.lineno))
+                    fout.write(''.join(extra_lines))
+                    fout.write('====================\n\n')
+                    index += len(extra_lines)
+                else:
+                    kept.append(docline)
+                    index += 1
+            self.xx_doclines = kept
 
         # Capture the info about the report file.
-        self.log_info.append(self.short_name(xx_extra_fname))
+        self.logReport(xx_extra_fname)
 
         # Report the remaining target-language elements.
         xx_doclines_fname = os.path.join(self.xx_aux_dir, 'pass1doclines.txt')
-        with open(xx_doclines_fname, 'w', encoding='utf-8') as fout:
-            for docline in self.xx_doclines:
-                fout.write('{}/{} {}: {!r}\n'.format(
-                           docline.fname[:2], docline.lineno,
-                           docline.type, docline.attrib))
+        with self.reports.open(xx_doclines_fname) as fout:
+            if self.reports.enabled(xx_doclines_fname):
+                line = '{}/{} {}: {!r}\n'.format
+                for docline in self.xx_doclines:
+                    fout.write(line(docline.fname[:2], docline.lineno,
+                                    docline.type, docline.attrib))
 
         # Capture the info about the report file.
-        self.log_info.append(self.short_name(xx_doclines_fname))
-
-        # Report the structure of the English original.
-        self.en_doclines = []
-        en_doclines_fname = os.path.join(self.en_aux_dir, 'pass1doclines.txt')
-        with open(en_doclines_fname, 'w', encoding='utf-8') as fout:
-            for relname, lineno, line in gen.sourceFileLines(self.en_src_dir):
-                docline = doc.Line(relname, lineno, line)
-                self.en_doclines.append(docline)
-                fout.write('{}/{} {}: {!r}\n'.format(
-                           docline.fname[:2], docline.lineno,
-                           docline.type, docline.attrib))
+        self.logReport(xx_doclines_fname)
 
+        # The structure of the English original was reported when reading.
         # Capture the info about the report file.
-        self.log_info.append(self.short_name(en_doclines_fname))
+        if self.en_elements is None:
+            self.logReport(en_doclines_fname)
 
+        # Remember the parsed source files for the next run.
+        self.saveCaches()
 
-    def convertDoclinesToElements(self):
-        '''Some elements glue more doclines together.'''
 
-        def aux_convert(self, aux_dir, doclines):
-            '''Returns the list of elements and the reverse table.
+    def convertToElements(self, aux_dir, doclines):
+        '''Returns the list of elements and the reverse table.
 
-            The reverse table uses the element SHA digest as a key,
-            and the reference to the element object as the value.
-            The core used for both English and the target language.'''
+           The reverse table uses the element SHA digest as a key,
+           and the reference to the element object as the value.
+           The core used for both English and the target language.'''
 
-            fname = os.path.join(aux_dir, 'pass1elements.txt')
+        fname = os.path.join(aux_dir, 'pass1elements.txt')
 
-            # As some elements contain more doclines, the list
-            # must be constructed first and only then it can
-            # be written to the fname file.
-            elements = []       # init -- empty list of elements
-            sha_to_elem = {}    # init -- empty reverse table
-            status = 0          # finite automaton
-            for docline in doclines:
-                if status == 0:     # no expectations
-                    docelem = doc.Element(docline)  # new one
-                    elements.append(docelem)        # appended
-                    if docelem.type in ('para', 'uli', 'li'):
-                        status = 1
-                    elif docelem.type == 'code':
-                        status = 2
-                    elif docelem.type == 'empty':
-                        status = 3
-
-                elif status == 1:   # accumulate 'text'
-                    if docline.type == 'text':
-                        docelem.append(docline)     # append to the last one
-                    else:
-                        docelem = doc.Element(docline)  # new one
-                        elements.append(docelem)        # appended
-                        if docelem.type in ('para', 'uli', 'li'):
-                            status = 1  # i.e. stay here
-                        elif docelem.type == 'code':
-                            status = 2
-                        else:
-                            status = 0
-
-                elif status == 2:   # after 'code'
+        # As some elements contain more doclines, the list
+        # must be constructed first and only then it can
+        # be written to the fname file. The digests are computed
+        # in one batch. The workers build the elements, compute
+        # the digests, and format the report lines.
+        report_lines = None
+        if self.jobs == 1:
+            elements = self.buildElements(doclines)
+            digests = self.elementDigests(elements, self.digest_name)
+        else:
+            elements, digests, report_lines = self.buildElementsParallel(doclines)
+        sha_to_elem = {}    # init -- empty reverse table
+
+        # The lines were counted when read (see readSources()).
+        self.stats.count('elements', len(elements))
+
+        # Add the digests to the elements, fill the reverse lookup table,
+        # and report their content.
+        with self.reports.open(fname) as f:
+            for e, digest in zip(elements, digests):
+                e.sha = digest
+
+                # Insert the record to the reverse lookup table.
+                # There may be repeated items: empty elements are
+                # all the same elsewhere, the code elements, may
+                # often repeat as the same lines may appear easily
+                # in more snippets, the titles like "Summary" also
+                # repeat. Ignore the cases. The last known repeated
+                # element with the same value will be captured
+                # in the reverse lookup table.
+                sha_to_elem[e.sha] = e
+
+                # Report the content of the element.
+                if report_lines is None:
+                    f.write(self.elementLine(e))
+            if report_lines is not None:
+                f.write(''.join(report_lines))
+        self.logReport(fname)
+
+        # Return the collected result list, and the reverse table.
+        return elements, sha_to_elem
+
+
+    @staticmethod
+    def elementLine(e):
+        '''Returns the line of the pass1elements.txt report for the element.'''
+        return '{}/{} {} {}: {!r}\n'.format(e.fname[:2], e.lineno(),
+                                           e.sha[:3].hex(), e.type, e.value())
+
+
+    @staticmethod
+    def buildElements(doclines):
+        '''Returns the list of elements built from the doclines.
+
+           The text lines are glued to the paragraphs (and list items),
+           the empty lines inside the code snippets are recognized.'''
+        elements = []       # init -- empty list of elements
+        status = 0          # finite automaton
+        for docline in doclines:
+            if status == 0:     # no expectations
+                docelem = doc.Element(docline)  # new one
+                elements.append(docelem)        # appended
+                if docelem.type in ('para', 'uli', 'li'):
+                    status = 1
+                elif docelem.type == 'code':
+                    status = 2
+                elif docelem.type == 'empty':
+                    status = 3
+
+            elif status == 1:   # accumulate 'text'
+                if docline.type == 'text':
+                    docelem.append(docline)     # append to the last one
+                else:
                     docelem = doc.Element(docline)  # new one
                     elements.append(docelem)        # appended
                     if docelem.type in ('para', 'uli', 'li'):
-                        status = 1
+                        status = 1  # i.e. stay here
                     elif docelem.type == 'code':
-                        status = 2      # i.e. stay here
-                    elif docelem.type == 'empty':
-                        status = 3
-                    else:
-                        status = 0
-
-                elif status == 3:   # was 'empty' after 'code'
-                    # The earlier 'empty' may actually be part
-                    # of the code snippet.
-                    docelem = doc.Element(docline)  # new one
-                    elements.append(docelem)        # appended
-
-                    # If the element is different than 'empty' or 'code', shrink
-                    # the previous 'empty' element (if any) to a single one.
-                    if docelem.type not in ('empty', 'code'):
-                        prev = elements[-3] # previous to the 'empty'
-                        while prev.type == 'empty':
-                            # Extend the doclist of the previous by doclines
-                            # from the last 'empty' element (not to loose
-                            # the source lines representation). Then delete
-                            # the absorbed empty element.
-                            prev.extend_lines_from(elements[-2])
-                            del elements[-2]
-
-                            # There may be more 'empty' elements because
-                            # we did not know they are not part of
-                            # the code snippet.
-                            prev = elements[-3]
-
-                    # Now decide the next status based on the last
-                    # element type.
-                    if docelem.type == 'code':
-                        status = 2
-                    elif docelem.type == 'empty':
-                        status = 3  # i.e. stay here
-                    elif docelem.type in ('para', 'uli', 'li'):
-                        status = 1
-                    else:
-                        status = 0
-
-                elif status == 4:   # after 'empty'
-                    # The earlier 'empty' is not part of the code snippet.
-                    # Do not append the element if it is 'empty' again.
-                    # Absorb the lines instead.
-                    docelem = doc.Element(docline)  # new one
-                    if docelem.type == 'empty':
-                        elements[-1].extend_lines_from(docelem) # absorbed
-                    else:
-                        elements.append(docelem)    # appended
-
-                    # Now decide the next status based on the last
-                    # appended element type.
-                    e = elements[-1]
-                    if e.type == 'code':
                         status = 2
-                    elif e.type == 'empty':
-                        status = 4  # i.e. stay here
-                    elif e.type in ('para', 'uli', 'li'):
-                        status = 1
                     else:
                         status = 0
 
+            elif status == 2:   # after 'code'
+                docelem = doc.Element(docline)  # new one
+                elements.append(docelem)        # appended
+                if docelem.type in ('para', 'uli', 'li'):
+                    status = 1
+                elif docelem.type == 'code':
+                    status = 2      # i.e. stay here
+                elif docelem.type == 'empty':
+                    status = 3
                 else:
-                    raise NotImplementedError('status = {}'.format(status))
-
-            # Add sha to the elements, fill the reverse lookup table,
-            # and report their content.
-            with open(fname, 'w', encoding='utf-8') as f:
-                for e in elements:
-                    # Calculate the SHA-1 for the original line(s)
-                    # encoded in UTF-8 (including newlines, no rstrips).
-                    e.sha = hashlib.sha1(e.value(False).encode('utf-8')).hexdigest()
-
-                    # Insert the record to the reverse lookup table.
-                    # There may be repeated items: empty elements are
-                    # all the same elsewhere, the code elements, may
-                    # often repeat as the same lines may appear easily
-                    # in more snippets, the titles like "Summary" also
-                    # repeat. Ignore the cases. The last known repeated
-                    # element with the same value will be captured
-                    # in the reverse lookup table.
-                    sha_to_elem[e.sha] = e
-
-                    # Report the content of the element.
-                    f.write('{}/{} {} {}: {!r}\n'.format(
-                            e.fname[:2], e.lineno(),
-                            e.sha[:6], e.type, e.value()))
-            self.log_info.append(self.short_name(fname))
+                    status = 0
+
+            elif status == 3:   # was 'empty' after 'code'
+                # The earlier 'empty' may actually be part
+                # of the code snippet.
+                docelem = doc.Element(docline)  # new one
+                elements.append(docelem)        # appended
+
+                # If the element is different than 'empty' or 'code', shrink
+                # the previous 'empty' element (if any) to a single one.
+                if docelem.type not in ('empty', 'code'):
+                    prev = elements[-3] # previous to the 'empty'
+                    while prev.type == 'empty':
+                        # Extend the doclist of the previous by doclines
+                        # from the last 'empty' element (not to loose
+                        # the source lines representation). Then delete
+                        # the absorbed empty element.
+                        prev.extend_lines_from(elements[-2])
+                        del elements[-2]
+
+                        # There may be more 'empty' elements because
+                        # we did not know they are not part of
+                        # the code snippet.
+                        prev = elements[-3]
+
+                # Now decide the next status based on the last
+                # element type.
+                if docelem.type == 'code':
+                    status = 2
+                elif docelem.type == 'empty':
+                    status = 3  # i.e. stay here
+                elif docelem.type in ('para', 'uli', 'li'):
+                    status = 1
+                else:
+                    status = 0
+
+            elif status == 4:   # after 'empty'
+                # The earlier 'empty' is not part of the code snippet.
+                # Do not append the element if it is 'empty' again.
+                # Absorb the lines instead.
+                docelem = doc.Element(docline)  # new one
+                if docelem.type == 'empty':
+                    elements[-1].extend_lines_from(docelem) # absorbed
+                else:
+                    elements.append(docelem)    # appended
+
+                # Now decide the next status based on the last
+                # appended element type.
+                e = elements[-1]
+                if e.type == 'code':
+                    status = 2
+                elif e.type == 'empty':
+                    status = 4  # i.e. stay here
+                elif e.type in ('para', 'uli', 'li'):
+                    status = 1
+                else:
+                    status = 0
+
+            else:
+                raise NotImplementedError('status = {}'.format(status))
+
+        return elements
+
+
+    @staticmethod
+    def elementDigests(elements, digest_name):
+        '''Returns the list of raw digests of the elements content.
+
+           The digest is computed from the original line(s) encoded in UTF-8
+           (including newlines, no rstrips). The lines are fed to the hash
+           one by one; this way, the content of multi-line elements is not
+           joined into a new string. The hex form is produced only when
+           written to a report.'''
+        new = contentsha.digestConstructor(digest_name)
+        digests = []
+        append = digests.append
+        for e in elements:
+            doclines = e.doclines
+            h = new(doclines[0].line.encode('utf-8'))
+            for dl in doclines[1:]:
+                h.update(dl.line.encode('utf-8'))
+            append(h.digest())
+        return digests
+
+
+    def elementShards(self, doclines):
+        '''Returns the list of (start, stop) ranges of the doclines of the chapters.
+
+           The elements of the ranges can be built independently. The range
+           starts by the first line of the chapter -- after the empty separator
+           of the previous file, the automaton of buildElements() is in
+           the initial state. The chapter that starts by the empty line
+           is joined with the previous range.'''
+        shards = []
+        start = 0
+        for i in range(1, len(doclines)):
+            if doclines[i].fname[:2] != doclines[i - 1].fname[:2] \
+               and doclines[i - 1].type == 'empty' and doclines[i].type != 'empty':
+                shards.append((start, i))
+                start = i
+        if start < len(doclines):
+            shards.append((start, len(doclines)))
+        return shards
+
+
+    def buildElementsParallel(self, doclines):
+        '''Returns the elements, their digests, and the report lines.
+
+           Each worker builds the elements of one range of the doclines
+           (see elementShards()) and returns only the numbers of lines
+           of the elements, their digests, and the lines for the report
+           (see elementLine()). The elements are constructed again from
+           the doclines here, in the order of the ranges. (The report lines
+           are None when the doclines are not split.)'''
+        shards = self.elementShards(doclines)
+        if len(shards) < 2:
+            elements = self.buildElements(doclines)
+            return elements, self.elementDigests(elements, self.digest_name), None
+
+        elements = []
+        digests = []
+        report_lines = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = []
+            for start, stop in shards:
+                shard = doclines[start:stop]
+                futures.append(executor.submit(_buildShard,
+                                               [dl.fname for dl in shard],
+                                               [dl.lineno for dl in shard],
+                                               [dl.line for dl in shard],
+                                               [dl.type for dl in shard],
+                                               self.digest_name))
+            for (start, stop), future in zip(shards, futures):
+                counts, shard_digests, shard_lines = future.result()
+
+                # In the whole sequence, the empty elements before the first
+                # element of the range are glued to one element -- unless
+                # it is the code or the empty element (see buildElements(),
+                # status 3).
+                if doclines[start].type not in ('empty', 'code'):
+                    glued = False
+                    while len(elements) > 1 and elements[-1].type == 'empty' \
+                          and elements[-2].type == 'empty':
+                        elements[-2].extend_lines_from(elements.pop())
+                        digests.pop()
+                        report_lines.pop()
+                        glued = True
+                    if glued:
+                        e = elements[-1]
+                        e.sha = digests[-1] = self.elementDigests([e], self.digest_name)[0]
+                        report_lines[-1] = self.elementLine(e)
+
+                # The element consists of the count doclines.
+                i = start
+                for count in counts:
+                    docelem = doc.Element(doclines[i])
+                    if count > 1:
+                        docelem.doclines = doclines[i:i + count]
+                    elements.append(docelem)
+                    i += count
+                digests.extend(shard_digests)
+                report_lines.extend(shard_lines)
+        return elements, digests, report_lines
 
-            # Return the collected result list, and the reverse table.
-            return elements, sha_to_elem
 
-        # The target language.
-        self.xx_elements, self.xx_sha_to_elem = aux_convert(self,
-                                                            self.xx_aux_dir,
-                                                            self.xx_doclines)
+    def convertDoclinesToElements(self):
+        '''Some elements glue more doclines together.'''
 
-        # English original.
-        self.en_elements, self.en_sha_to_elem = aux_convert(self,
-                                                            self.en_aux_dir,
-                                                            self.en_doclines)
+        # The target language.
+        self.xx_elements, self.xx_sha_to_elem = self.convertToElements(
+                                                    self.xx_aux_dir,
+                                                    self.xx_doclines)
+
+        # English original (unless shared from another parser).
+        if self.en_elements is None:
+            self.en_elements, self.en_sha_to_elem = self.convertToElements(
+                                                        self.en_aux_dir,
+                                                        self.en_doclines)
+
+
+    def structKey(self, elem):
+        '''Returns the key of the element for the structure alignment.
+
+           The more benevolent comparison requires only types of the elements
+           to be equal. If the element is a code snippet, it must have exactly
+           the same content (the digest is part of the key), and the image
+           insertions must refer to the same image (pass 2 compares only
+           the captions, see pass2.ImagesCheck). The code snippets and images
+           also serve as stable anchors of the alignment.'''
+        if elem.type == 'code':
+            return ('code', elem.sha)
+        elif elem.type == 'img':
+            return ('img', elem.attrib)
+        return elem.type
+
+
+    # The parts of the text that are kept by the translation -- backticked
+    # sequences, URLs, and numbers.
+    rexKept = re.compile(r'`[^`]+`|https?://\S+|\d+')
+
+    def keptParts(self, elem):
+        '''Returns the set of the parts of the element kept by the translation.
+
+           The elements of the same type in the run (say paragraphs) cannot
+           be told apart by the structure keys. When an element is inserted
+           or deleted in the run, the counterparts with more common kept parts
+           decide where (see align.opcodes()).'''
+        return set(self.rexKept.findall(elem.value()))
+
+
+    def alignmentItems(self, elements, definitions, side):
+        '''Returns the list of items of the elements for the alignment.
+
+           The item is (key, index, snippet) where index points to the
+           elements list. Sequences of elements that form a translated
+           snippet (the side 0 of the definition for English, 1 for the target
+           language) are represented by one item with the ('snippet', key) key,
+           and the snippet is the definition key. Otherwise, the snippet
+           is None and the item represents one element.
+
+           All occurrences of the snippets are found in one pass through
+           the first lines of the elements (see multimatch.py). When more
+           snippets start at the same element, the one defined first is used.'''
+        translated_snippets = definitions.translated_snippets
+        order = definitions.snippets_order
+        starts = {}         # index of the first element -> snippet key
+        matcher = definitions.snippets_matchers[side]
+        for index, key in matcher.finditer(e._line() for e in elements):
+            other = starts.get(index)
+            if other is None or order[key] < order[other]:
+                starts[index] = key
+
+        items = []
+        i = 0
+        while i < len(elements):
+            key = starts.get(i)
+            if key is not None:
+                items.append((('snippet', key), i, key))
+                i += len(translated_snippets[key][side])
+            else:
+                items.append((self.structKey(elements[i]), i, None))
+                i += 1
+        return items
+
+
+    def elementRange(self, items, i1, i2, length):
+        '''Converts the range of items to the range of element indexes.'''
+        start = items[i1][1] if i1 < len(items) else length
+        stop = items[i2][1] if i2 < len(items) else length
+        return start, stop
+
+
+    def position(self, elements, i1, i2):
+        '''Returns the readable position of the range of elements.'''
+        if i1 < i2:
+            e = elements[i1]
+            return '{}/{}'.format(e.fname[:2], e.lineno())
+        elif i1 < len(elements):
+            e = elements[i1]
+            return 'before {}/{}'.format(e.fname[:2], e.lineno())
+        else:
+            return 'at the end'
 
 
     def checkStructDiffs(self):
@@ -393,146 +754,168 @@ class Parser:
 
         # When comparing code snippets, the exact content is required.
         # The exception is when the comments in the examples were translated.
-        # Load the structure for the exceptions from the language dependent
-        # file.
+        # The definitions come from the language dependent file.
         #
         # The key is the first line of the original, the value is a couple
         # with lists of related line sequences from the original and from
         # the translated sources.
-        translated_snippets_fname = os.path.join(self.lang_definitions_dir,
-                                                 'translated_snippets.txt')
-
-        # Create the empty file if it does not exist.
-        if not os.path.isfile(translated_snippets_fname):
-            f = open(translated_snippets_fname, 'w')
-            f.close()
-
-        # Load the snippet definitions.
-        translated_snippets = {}
-        status = 0
-        en_lines = None
-        xx_lines = None
-        with open(translated_snippets_fname, encoding='utf-8') as f:
-            for line in f:
-                if status == 0:
-                    # First line is the key.
-                    en_lines, xx_lines = translated_snippets.setdefault(line, ([], []))
-                    assert len(en_lines) == 0 # duplicities not allowed, split
-                    assert len(xx_lines) == 0 # the definitions if necessary
-                    en_lines.append(line)     # first line of the original
-                    status = 1
-
-                elif status == 1:
-                    # Lines of the original until the separator.
-                    if line.startswith('-----'):    # at least 5 from beginning
-                        en_lines = None             # collected, done
-                        status = 2
-                    else:
-                        en_lines.append(line)       # another line of the original
-
-                elif status == 2:
-                    # Lines of the translated sources until the separator.
-                    if line.startswith('====='):    # at least 5 from first pos
-                        xx_lines = None             # collected, done
-                        status = 0
-                    else:
-                        xx_lines.append(line)       # another line of the translation
-
-                else:
-                    raise NotImplementedError('status = {}\n'.format(status))
+        definitions = self.loadDefinitions()
+        translated_snippets = definitions.translated_snippets
 
         # Capture the info about the file with definitions.
-        self.log_info.append(self.short_name(translated_snippets_fname))
-
-        # Compare the document structures.
+        self.log_info.append(self.short_name(definitions.snippets_fname))
+
+        # The translated snippets are found in both sequences of elements
+        # and each occurrence is represented by a single item. This way
+        # the translated snippet can be aligned with its original.
+        en_items = self.alignmentItems(self.en_elements, definitions, 0)
+        xx_items = self.alignmentItems(self.xx_elements, definitions, 1)
+
+        # The score of the counterparts is computed only for the elements
+        # around the inserted or deleted runs. The kept parts are remembered.
+        kept = {}       # id(element) -> set of kept parts
+        def score(en_elem, xx_elem):
+            for e in (en_elem, xx_elem):
+                if id(e) not in kept:
+                    kept[id(e)] = self.keptParts(e)
+            return len(kept[id(en_elem)] & kept[id(xx_elem)])
+
+        # Align the sequences of items. The equal snippet items are
+        # the translated snippets. The other differences are collected
+        # as (tag, en_i1, en_i2, xx_i1, xx_i2) with indexes to elements.
+        # When a different part contains a snippet item (say the translator
+        # kept the original snippet), it is aligned again element by element.
+        en_snippets = bytearray(len(self.en_elements))  # 1 -- element of the translated snippet
+        xx_snippets = bytearray(len(self.xx_elements))
+        snippet_pairs = []      # (en item, xx item)
+        diffs = []
+        for tag, i1, i2, j1, j2 in align.opcodes(
+                [it[0] for it in en_items], [it[0] for it in xx_items],
+                lambda i, j: score(self.en_elements[en_items[i][1]],
+                                   self.xx_elements[xx_items[j][1]])):
+            if tag == 'equal':
+                for en_item, xx_item in zip(en_items[i1:i2], xx_items[j1:j2]):
+                    if en_item[2] is not None:     # snippet item
+                        enlst, xxlst = translated_snippets[en_item[2]]
+                        snippet_pairs.append((en_item, xx_item))
+                        en_snippets[en_item[1]:en_item[1] + len(enlst)] = b'\1' * len(enlst)
+                        xx_snippets[xx_item[1]:xx_item[1] + len(xxlst)] = b'\1' * len(xxlst)
+                continue
+
+            # Element indexes of the different part.
+            en_i1, en_i2 = self.elementRange(en_items, i1, i2, len(self.en_elements))
+            xx_i1, xx_i2 = self.elementRange(xx_items, j1, j2, len(self.xx_elements))
+            has_snippet = any(it[2] is not None
+                              for it in en_items[i1:i2] + xx_items[j1:j2])
+            if not has_snippet:
+                diffs.append((tag, en_i1, en_i2, xx_i1, xx_i2))
+                continue
+
+            en_keys = [self.structKey(e) for e in self.en_elements[en_i1:en_i2]]
+            xx_keys = [self.structKey(e) for e in self.xx_elements[xx_i1:xx_i2]]
+            for tag2, k1, k2, l1, l2 in align.opcodes(
+                    en_keys, xx_keys,
+                    lambda k, l: score(self.en_elements[en_i1 + k],
+                                       self.xx_elements[xx_i1 + l])):
+                if tag2 != 'equal':
+                    diffs.append((tag2, en_i1 + k1, en_i1 + k2,
+                                  xx_i1 + l1, xx_i1 + l2))
+
+        # Code snippets and images that appear in some different part
+        # of both sequences were probably moved. Their positions are
+        # collected to be reported.
+        en_moved = {}   # key -> element from English in a different part
+        xx_moved = {}   # key -> element from the translation in a different part
+        for tag, en_i1, en_i2, xx_i1, xx_i2 in diffs:
+            for e in self.en_elements[en_i1:en_i2]:
+                if e.type in ('code', 'img'):
+                    en_moved.setdefault(self.structKey(e), e)
+            for e in self.xx_elements[xx_i1:xx_i2]:
+                if e.type in ('code', 'img'):
+                    xx_moved.setdefault(self.structKey(e), e)
+
+        # Report the translated snippets and the differences.
         struct_diff_fname = os.path.join(self.xx_aux_dir, 'pass1struct_diff.txt')
         translated_snippets_fname = os.path.join(self.xx_aux_dir,
                                                  'pass1translated_snippets.txt')
-        with open(struct_diff_fname, 'w', encoding='utf-8') as f, \
-             open(translated_snippets_fname, 'w', encoding='utf-8') as ftransl:
-
-            # Jumping around, we need the while loop and indexes.
-            en_i = 0
-            xx_i = 0
-            while en_i < len(self.en_elements) and xx_i < len(self.xx_elements):
-
-                # Shortcut to element on indexes.
-                en_elem = self.en_elements[en_i]
-                xx_elem = self.xx_elements[xx_i]
-
-                if en_elem._line() in translated_snippets:
-                    # It could be the translated sequence. Get the definition lists.
-                    # The line from the original is the key.
-                    enlst, xxlst = translated_snippets[en_elem._line()]
-
-                    # Lengths of both sequences.
-                    enlen = len(enlst)
-                    xxlen = len(xxlst)
-
-                    # Compare the definitions with the sources.
-                    is_enseq = [e._line() for e in self.en_elements[en_i:en_i+enlen]] == enlst
-                    is_xxseq = [e._line() for e in self.xx_elements[xx_i:xx_i+xxlen]] == xxlst
-
-                    # If both flags are set then the translated sequence was found.
-                    # Report it and delete the elements from both original and translation.
-                    if is_enseq and is_xxseq:
-                        # Report the differences. The lines below tildas has the form
-                        # to be possibly copy/pasted to the translated snippets file later.
-                        ftransl.write('en/{}/{}:\n'.format(en_elem.fname, en_elem.lineno()))
-                        ftransl.write('{}/{}/{}:\n'.format(
-                            self.lang, xx_elem.fname, xx_elem.lineno()))
-                        ftransl.write('~~~~~~~~~~~~~~~\n')
-                        ftransl.write(''.join(enlst))
-                        ftransl.write('-----\n')
-                        ftransl.write(''.join(xxlst))
-                        ftransl.write('========================== ch.{}\n\n'.format(en_elem.fname[:2]))
-
-                        # Delete the elements from the member lists.
-                        del self.en_elements[en_i:en_i+enlen]
-                        del self.xx_elements[xx_i:xx_i+xxlen]
-
-                        # Corrections of the indexes as they will be incremented later.
-                        en_i -= 1
-                        xx_i -= 1
-
-                else:
-                    # This is not the case of the translated snippet. Compare the structure.
-                    # The more benevolent comparison requires only types of the elements
-                    # to be equal. If the element is a code snippet, it must have exactly
-                    # the same content.
-                    if en_elem.type != xx_elem.type \
-                       or (en_elem.type == 'code'
-                           and en_elem.value() != xx_elem.value()):
-                        # Not in sync -- reset the optimistic value of the flag.
-                        sync_flag = False
-
-                        # Report the difference: heading contains
-                        # chapter no., lineno, type, and the value.
-                        # English...
-                        f.write('\nen {}/{} [{}] {}:\n\t{}\n'.format(
-                                en_elem.fname[:2],
-                                en_elem.lineno(),
-                                en_elem.sha[:6],
-                                en_elem.type,
-                                en_elem.value()))
-
-                        # The target language...
-                        f.write('{} {}/{} [{}] {}:\n\t{}\n'.format(
-                                self.lang,
-                                xx_elem.fname[:2],
-                                xx_elem.lineno(),
-                                xx_elem.sha[:6],
-                                xx_elem.type,
-                                xx_elem.value()))
-
-                # Jump to the next elements.
-                en_i += 1
-                xx_i += 1
+        with self.reports.open(struct_diff_fname) as f, \
+             self.reports.open(translated_snippets_fname) as ftransl, \
+             self.openFindings() as findings:
+
+            for en_item, xx_item in snippet_pairs:
+                # The lines below tildas has the form to be possibly
+                # copy/pasted to the translated snippets file later.
+                en_elem = self.en_elements[en_item[1]]
+                xx_elem = self.xx_elements[xx_item[1]]
+                enlst, xxlst = translated_snippets[en_item[2]]
+                ftransl.write('en/{}/{}:\n'.format(en_elem.fname, en_elem.lineno()))
+                ftransl.write('{}/{}/{}:\n'.format(
+                    self.lang, xx_elem.fname, xx_elem.lineno()))
+                ftransl.write('~~~~~~~~~~~~~~~\n')
+                ftransl.write(''.join(enlst))
+                ftransl.write('-----\n')
+                ftransl.write(''.join(xxlst))
+                ftransl.write('========================== ch.{}\n\n'.format(en_elem.fname[:2]))
+
+            for tag, en_i1, en_i2, xx_i1, xx_i2 in diffs:
+                # Not in sync -- reset the optimistic value of the flag.
+                sync_flag = False
+
+                # The finding for the tools.
+                kind = {'delete': 'missing', 'insert': 'extra',
+                        'replace': 'different'}[tag]
+                findings.write('struct_diff', self.en_elements[en_i1:en_i2],
+                               self.xx_elements[xx_i1:xx_i2], kind=kind)
+
+                # The heading describes the kind of the difference
+                # and the positions in both sources.
+                f.write('\n{} -- en {}, {} {}:\n'.format(
+                        {'missing': 'missing in ' + self.lang,
+                         'extra': 'extra in ' + self.lang,
+                         'different': 'different'}[kind],
+                        self.position(self.en_elements, en_i1, en_i2),
+                        self.lang,
+                        self.position(self.xx_elements, xx_i1, xx_i2)))
+
+                # English elements: chapter no., lineno, type, and the value.
+                for en_elem in self.en_elements[en_i1:en_i2]:
+                    f.write('en {}/{} [{}] {}:\n\t{}\n'.format(
+                            en_elem.fname[:2],
+                            en_elem.lineno(),
+                            en_elem.sha[:3].hex(),
+                            en_elem.type,
+                            en_elem.value()))
+                    moved = xx_moved.get(self.structKey(en_elem))
+                    if moved is not None:
+                        f.write('\t(moved -- {} {}/{})\n'.format(
+                                self.lang, moved.fname[:2], moved.lineno()))
+
+                # The target language elements.
+                for xx_elem in self.xx_elements[xx_i1:xx_i2]:
+                    f.write('{} {}/{} [{}] {}:\n\t{}\n'.format(
+                            self.lang,
+                            xx_elem.fname[:2],
+                            xx_elem.lineno(),
+                            xx_elem.sha[:3].hex(),
+                            xx_elem.type,
+                            xx_elem.value()))
+                    moved = en_moved.get(self.structKey(xx_elem))
+                    if moved is not None:
+                        f.write('\t(moved -- en {}/{})\n'.format(
+                                moved.fname[:2], moved.lineno()))
+
+        # The elements of the translated snippets are left out of the member
+        # lists. The new lists are built (by the masks); the original lists
+        # are not modified (they may be kept by the caller, see watch.py).
+        self.en_elements = [e for e, masked in zip(self.en_elements, en_snippets)
+                            if not masked]
+        self.xx_elements = [e for e, masked in zip(self.xx_elements, xx_snippets)
+                            if not masked]
 
         # Capture the info about the report files. (The translated_snippets_fname
         # identifier is reused -- here for the output file.)
-        self.log_info.append(self.short_name(translated_snippets_fname))
-        self.log_info.append(self.short_name(struct_diff_fname))
+        self.logReport(translated_snippets_fname)
+        self.logReport(struct_diff_fname)
 
         # The information about the result of the check.
         self.log_info.append(('-'*30) + ' structure of the book is ' +
@@ -546,37 +929,49 @@ class Parser:
 
 
     def checkContentChanges(self):
-        '''Compares content with the last known -- based on SHA-1.
-
-        '''
-        # Load the last known content definitions. If the file does not exist,
-        # create the empty one.
-        fname = os.path.join(self.lang_definitions_dir, 'content_sha.txt')
-        if not os.path.isfile(fname):
-            f = open(fname, 'w', encoding='utf-8')
-            f.close()
-
-        en_chl_to_shas = {}
-        en_chl_to_shas = {}
-        with open(fname, encoding='utf-8') as f:
-            for line in f:
-                en_ch_lineno, xx_ch_lineno, en_sha, xx_sha = line.split()
-                en_chl_to_shas[en_ch_lineno] = (en_sha, xx_sha)
+        '''Compares content with the last known -- based on the digests.
+
+           The records of the last known content are looked up by the position
+           of the English element. If the element only moved (say a paragraph
+           was inserted above it), the record is found by the digest of the
+           original. When also the translation is the same, the element
+           is considered already checked.'''
+        # The last known content definitions (content_sha.bin when it exists,
+        # content_sha.txt otherwise). If neither file exists, the empty
+        # text file is created.
+        #
+        # The records are indexed by the position of the English element,
+        # and by the English digest (the reverse index). Several elements may
+        # have the same English content (empty lines, repeated code lines),
+        # so the reverse index gives the set of translation digests.
+        definitions = self.loadDefinitions()
+        fname = definitions.content_fname
+        last_known = definitions.lastKnown()
 
         # Capture the definition file to the log.
         self.log_info.append(self.short_name(fname))
 
+        # The records computed by another digest algorithm cannot match.
+        digest_size = contentsha.digestConstructor(self.digest_name)().digest_size
+        if last_known.digest_size not in (None, digest_size):
+            self.log_info.append(
+                "The digests in '{}' do not fit the {} digest. See the migrate"
+                " command of contentsha.py.".format(fname, self.digest_name))
+
         # Loop through all elements in both languages. It is assumed that
-        # the structures were already synchronized. Generate the `content_sha.txt`
-        # in the *auxiliary* directory -- it can be later moved to `definitions`
-        # directory. Report the differences to the file.
-        fname_new_sha = os.path.join(self.xx_aux_dir, 'content_sha.txt')
+        # the structures were already synchronized. Generate the new version
+        # of the definition file (of the same format) in the *auxiliary*
+        # directory -- it can be later moved to `definitions` directory.
+        # Report the differences to the file.
+        fname_new_sha = os.path.join(self.xx_aux_dir, os.path.basename(fname))
         fname_diff = os.path.join(self.xx_aux_dir, 'pass1content_diff.txt')
         cnt_en_changed = 0      # init -- number of changes in original
         cnt_xx_changed = 0      # init -- number of changes in target
         cnt_unchecked = 0       # init -- number of unchecked translations
-        with open(fname_new_sha, 'w', encoding='utf-8') as fsha, \
-             open(fname_diff, 'w', encoding='utf-8') as fdiff:
+        cnt_moved = 0           # init -- number of moved, but checked elements
+        with self.contentShaWriter(fname_new_sha) as fsha, \
+             self.reports.open(fname_diff) as fdiff, \
+             self.openFindings() as findings:
 
             for en_el, xx_el in zip(self.en_elements, self.xx_elements):
 
@@ -585,7 +980,7 @@ class Parser:
                 if en_el.lineno() == '0':
                     continue
 
-                # Get the SHA-1 for the original and for the translated.
+                # Get the digests for the original and for the translated.
                 en_sha = en_el.sha
                 xx_sha = xx_el.sha
 
@@ -599,19 +994,24 @@ class Parser:
                 # of the element is detected. It also helps to copy/paste
                 # the sha lines to the definition file when manually
                 # checking parts of the book.
-                fsha.write('{} {} {} {}\n'.format(
-                    en_ch_lineno, xx_ch_lineno, en_sha, xx_sha))
+                fsha.write(en_ch_lineno, xx_ch_lineno, en_sha, xx_sha)
 
                 # Get the last SHA's from the definition. If the record
-                # was not defined, the empty strings are returned.
-                en_last_sha, xx_last_sha = en_chl_to_shas.get(en_ch_lineno, ('', ''))
+                # was not defined, the empty digests are returned.
+                en_last_sha, xx_last_sha = \
+                    last_known.lookup(en_ch_lineno) or (b'', b'')
 
                 # The element contents are reported as changed only if at least one
-                # of the SHA's differ from the definition.
+                # of the SHA's differ from the definition -- unless the same couple
+                # of the SHA's is known from another position (the element moved).
                 if en_sha != en_last_sha or xx_sha != xx_last_sha:
 
+                    if xx_sha in last_known.xxDigests(en_sha):
+                        cnt_moved += 1
+                        continue
+
                     # English.
-                    if en_last_sha == '':
+                    if en_last_sha == b'':
                         note = ' unchecked'
                         cnt_unchecked += 1
                     elif en_sha != en_last_sha:
@@ -619,12 +1019,13 @@ class Parser:
                         cnt_en_changed += 1
                     else:
                         note = ''
+                    en_note = note
                     fdiff.write('en {}/{}{}\n'.format(
                                 en_el.fname[:2], en_el.lineno(), note))
                     fdiff.write('\t{}\n'.format(en_el.value()))
 
                     # The target language.
-                    if xx_last_sha == '':
+                    if xx_last_sha == b'':
                         note = ' unchecked'
                     elif xx_sha != xx_last_sha:
                         note = ' changed'
@@ -636,10 +1037,18 @@ class Parser:
                     fdiff.write('\t{}\n'.format(xx_el.value()))
                     fdiff.write('\n')
 
+                    # The finding for the tools: the state is 'unchecked',
+                    # 'changed', or 'same' (the other side changed).
+                    findings.write('content_change', [en_el], [xx_el],
+                                   en_state=en_note.strip() or 'same',
+                                   xx_state=note.strip() or 'same')
+
+        last_known.close()
+
         # Capture the new definition file to the log, the report file,
         # and the result.
         self.log_info.append(self.short_name(fname_new_sha))
-        self.log_info.append(self.short_name(fname_diff))
+        self.logReport(fname_diff)
 
         if cnt_en_changed > 0:
             note = ' [en] content changed: {}'.format(cnt_en_changed)
@@ -653,19 +1062,100 @@ class Parser:
             note = ' content unchecked: {}'.format(cnt_unchecked)
             self.log_info.append(('-'*30) + note)
 
+        if cnt_moved > 0:
+            note = ' moved, already checked: {}'.format(cnt_moved)
+            self.log_info.append(('-'*30) + note)
+
         if (cnt_en_changed + cnt_xx_changed + cnt_unchecked) > 0:
             self.log_info.append(
                 "Have a look at the following report file:\n\t'{}'\n"
                 .format(fname_diff))
 
 
-    def run(self):
-        '''Launcher of the parser phases.'''
+    def contentShaWriter(self, fname):
+        '''Returns the writer of the new last known content records.
+
+           The format is given by the extension (see contentsha.writer()).'''
+        return contentsha.writer(fname)
+
 
-        self.writePass1txtFiles()
+    def migrateContentSha(self, digest_name):
+        '''Converts the last known content records to another digest.
+
+           The digests cannot be converted without the content. This way,
+           the sources are loaded and the elements are digested by both
+           the current and the new algorithm. The record is converted
+           when its couple of digests matches some element of the current
+           sources (at any position). The other records (the content changed
+           since it was checked) are dropped and counted. The result is written
+           to the aux directory as content_sha_migrated.txt (or .bin). Move it
+           to the definitions as content_sha.txt (.bin) and write the digest_name
+           to the content_digest.txt there.'''
         self.loadDoclineLists()
         self.convertDoclinesToElements()
-        sync_flag = self.checkStructDiffs()
-        self.checkContentChanges()
+        self.checkStructDiffs()
+
+        # Current digests -> new digests of the element couples.
+        en_new = self.elementDigests(self.en_elements, digest_name)
+        xx_new = self.elementDigests(self.xx_elements, digest_name)
+        converted = {}
+        for en_el, xx_el, en_digest, xx_digest in zip(
+                self.en_elements, self.xx_elements, en_new, xx_new):
+            converted[(en_el.sha, xx_el.sha)] = (en_digest, xx_digest)
+
+        definitions = self.loadDefinitions()
+        fname = definitions.content_fname
+        root, ext = os.path.splitext(os.path.basename(fname))
+        fname_migrated = os.path.join(self.xx_aux_dir, root + '_migrated' + ext)
+        cnt_migrated = 0
+        cnt_dropped = 0
+        last_known = definitions.lastKnown()
+        with contentsha.writer(fname_migrated) as fsha:
+            for en_ch_lineno, xx_ch_lineno, en_sha, xx_sha in last_known:
+                new = converted.get((en_sha, xx_sha))
+                if new is None:
+                    cnt_dropped += 1
+                else:
+                    fsha.write(en_ch_lineno, xx_ch_lineno, *new)
+                    cnt_migrated += 1
+        last_known.close()
 
+        self.log_info.append(self.short_name(fname_migrated))
+        self.log_info.append(('-'*30) + ' {} records migrated to {}, {} dropped'
+                             .format(cnt_migrated, digest_name, cnt_dropped))
         return '\n\t'.join(self.log_info)
+
+
+    def run(self):
+        '''Launcher of the parser phases.'''
+
+        with self.stats.phase('loadDoclineLists'):
+            self.loadDoclineLists()
+        with self.stats.phase('convertDoclinesToElements'):
+            self.convertDoclinesToElements()
+        with self.stats.phase('checkStructDiffs'):
+            sync_flag = self.checkStructDiffs()
+        with self.stats.phase('checkContentChanges'):
+            self.checkContentChanges()
+        self.logReport(self.findings_fname)
+
+        # The values are also available as the self.stats.asDict().
+        self.stats.dump(self.stats_fname)
+        self.logReport(self.stats_fname)
+
+        return '\n\t'.join(self.log_info)
+
+
+def _buildShard(fnames, linenos, lines, types, digest_name):
+    '''Builds the elements of the range of lines in the worker process.
+
+       Returns the list of the numbers of lines of the elements,
+       the list of their digests, and the list of their report lines.'''
+    doclines = [doc.Line.classified(fname, lineno, line, linetype, None)
+                for fname, lineno, line, linetype in zip(fnames, linenos, lines, types)]
+    elements = Parser.buildElements(doclines)
+    digests = Parser.elementDigests(elements, digest_name)
+    for e, digest in zip(elements, digests):
+        e.sha = digest
+    return ([len(e.doclines) for e in elements], digests,
+            [Parser.elementLine(e) for e in elements])
@@ -1,89 +1,206 @@
 #!python3
 # -*- coding: utf-8 -*-
 
+import concurrent.futures
+import functools
 import os
 import re
+import report
+import stats
+
+
+class Check:
+    '''Base class of the pass2 checks.
+
+       The checks are run by the Parser in one traversal of the aligned
+       element pairs (see Parser.runChecks()). The check declares the element
+       types it is interested in -- en_types for the original, xx_types
+       for the translation (None means any type). The check() method is called
+       only for the pairs of the types. Each check writes its own report
+       files and collects its own lines for the log.
+
+       When the pairs are checked in parallel (see Parser.jobs), the check
+       in the worker process writes the report fragments to memory. Its state
+       -- the counters, the flags, and the fragments -- is then merged
+       into the check of the main process. The attributes named
+       in the counters are summed, the attributes named in the flags
+       must be true in all fragments.
+
+       The findings of the check (see report.Findings) are written
+       with the check_id.'''
+
+    check_id = None     # identification of the check in the findings
+    en_types = None     # types of the English elements to be checked
+    xx_types = None     # types of the translated elements to be checked
+    counters = ('regex_calls',) # names of the attributes summed over the fragments
+    flags = ()          # names of the attributes and-ed over the fragments
+
+    def __init__(self, parser, fragments=False):
+        self.parser = parser
+        self.lang = parser.lang
+        self.xx_aux_dir = parser.xx_aux_dir
+        self.log_info = []      # lines for logging (in the order of the checks)
+        self.fragments = fragments  # reports to memory (in the worker process)
+        self.reports = []       # opened report files in the order of opening
+        self.regex_calls = 0    # number of regex calls (see stats.py)
+
+
+    def openReport(self, fname, newline=None):
+        '''Opens the report file (or the memory fragment) for writing.'''
+        if self.fragments:
+            f = report.Fragment()
+        else:
+            f = self.parser.reports.open(fname, newline)
+        self.reports.append(f)
+        return f
 
 
-class Parser:
-    '''Pass 2 parser for markup checking.
+    def logReport(self, fname):
+        '''Captures the report file to the log (unless turned off).'''
+        if self.parser.reports.enabled(fname):
+            self.log_info.append(self.parser.short_name(fname))
 
-       Consumes the result of the pass1 parser.'''
 
-    # Regular expression for detecting sequences in backticks.
-    rexBackticked = re.compile(r'`(\S.*?\S?)`')
+    def finding(self, en_e, xx_e, **fields):
+        '''Writes the finding for the pair of elements.'''
+        self.parser.findings.write(self.check_id, [en_e], [xx_e], **fields)
 
-    def __init__(self, pass1):
-        self.lang = pass1.lang
 
-        # Important directories.
-        self.en_src_dir = pass1.en_src_dir
-        self.xx_src_dir = pass1.xx_src_dir
-        self.en_aux_dir = pass1.en_aux_dir
-        self.xx_aux_dir = pass1.xx_aux_dir
-        self.root_definitions_dir = pass1.root_definitions_dir
-        self.lang_definitions_dir = pass1.lang_definitions_dir
+    def state(self):
+        '''Returns the picklable state of the closed check in the worker.'''
+        return ([getattr(self, name) for name in self.counters],
+                [getattr(self, name) for name in self.flags],
+                [f.text for f in self.reports])
 
-        # Lists of elements (some elements were
-        # processed and deleted in the pass1).
-        self.en_elements = pass1.en_elements
-        self.xx_elements = pass1.xx_elements
 
-        self.log_info = []                # lines for logging
-        self.backticked_set = set()
+    def mergeState(self, state):
+        '''Merges the state of the check from the worker (see state()).
 
+           The fragments are appended to the reports; this way, merging
+           the states in the order of the element pairs gives the same
+           reports as the serial traversal.'''
+        counts, flags, texts = state
+        for name, value in zip(self.counters, counts):
+            setattr(self, name, getattr(self, name) + value)
+        for name, value in zip(self.flags, flags):
+            setattr(self, name, getattr(self, name) and value)
+        for f, text in zip(self.reports, texts):
+            f.write(text)
 
-    def short_name(self, fname):
-        '''Returns tail of the fname -- for log info.'''
-        lst = fname.split(os.sep)
-        if lst[-2] == self.lang:
-            return '/'.join(lst[-3:])
-        else:
-            return '/'.join(lst[-2:])
 
+    def open(self):
+        '''Opens the report files -- called before the traversal.'''
 
-    def checkImages(self):
-        '''Checks if the documents use the same images.'''
 
-        sync_flag = True  # Optimistic initialization
-        images_fname = os.path.join(self.xx_aux_dir, 'pass2img_diff.txt')
-        with open(images_fname, 'w', encoding='utf-8') as f:
-            for en_e, xx_e in zip(self.en_elements, self.xx_elements):
-                if en_e.type == 'img' and en_e.attrib != xx_e.attrib \
-                   or en_e.type == 'imgcaption' \
-                      and en_e.attrib[0] != xx_e.attrib[0]:
+    def check(self, en_e, xx_e):
+        '''Checks the pair of aligned elements.'''
+        raise NotImplementedError
 
-                    # Out of sync, reset the flag...
-                    sync_flag = False
 
-                    # ... and report to the file.
-                    f.write('\n{} {}/{} -- en {}/{}:\n'.format(
-                            self.lang,
-                            xx_e.fname,
-                            xx_e.lineno(),
-                            en_e.fname,
-                            en_e.lineno()))
+    def close(self):
+        '''Closes the report files and captures the result to the log_info.'''
+
 
-                    # Type and value of the translated element.
-                    f.write('\t{}:\t{}\n'.format(xx_e.type,
-                                                 xx_e.value()))
+class ImagesCheck(Check):
+    '''Checks if the captions of the images have the same figure numbers.
 
-                    # Type and value of the English element.
-                    f.write('\t{}:\t{}\n'.format(en_e.type,
-                                                 en_e.value()))
+       The names of the inserted images are compared in pass 1 -- they
+       are a part of the structure (see pass1.Parser.structKey()).'''
+
+    check_id = 'img_diff'
+    en_types = {'imgcaption'}
+    flags = ('sync_flag',)
+
+    def open(self):
+        self.sync_flag = True  # Optimistic initialization
+        self.images_fname = os.path.join(self.xx_aux_dir, 'pass2img_diff.txt')
+        self.f = self.openReport(self.images_fname)
+
+
+    def check(self, en_e, xx_e):
+        if en_e.attrib[0] != xx_e.attrib[0]:
+
+            # Out of sync, reset the flag...
+            self.sync_flag = False
+            self.finding(en_e, xx_e)
+
+            # ... and report to the file.
+            f = self.f
+            f.write('\n{} {}/{} -- en {}/{}:\n'.format(
+                    self.lang,
+                    xx_e.fname,
+                    xx_e.lineno(),
+                    en_e.fname,
+                    en_e.lineno()))
+
+            # Type and value of the translated element.
+            f.write('\t{}:\t{}\n'.format(xx_e.type,
+                                         xx_e.value()))
+
+            # Type and value of the English element.
+            f.write('\t{}:\t{}\n'.format(en_e.type,
+                                         en_e.value()))
+
+
+    def close(self):
+        self.f.close()
 
         # Capture the info about the report file.
-        self.log_info.append(self.short_name(images_fname))
+        self.logReport(self.images_fname)
         self.log_info.append(('-'*30) + ' image info is ' +
-                               ('the same' if sync_flag else 'DIFFERENT'))
+                               ('the same' if self.sync_flag else 'DIFFERENT'))
+
+
+class BackticksCheck(Check):
+    '''Checks the bakctick markup in paragraphs, list items...
+
+       The results reported to pass2backticks.txt.'''
+
+    check_id = 'backticks'
+    en_types = {'para', 'uli', 'li'}
+    counters = Check.counters + ('async_cnt', 'anomaly_cnt')
+
+    # Regular expression for detecting sequences in backticks.
+    rexBackticked = re.compile(r'`(\S.*?\S?)`')
+
+    def open(self):
+        self.async_cnt = 0     # init -- "not synchronous lines" counter
+        self.anomaly_cnt = 0   # init -- anomaly counter (with respect to the markup in both cases)
+        self.btfname = os.path.join(self.xx_aux_dir, 'pass2backticks.txt')
+        self.btfname_skipped = os.path.join(self.xx_aux_dir, 'pass2backticks_skiped.txt')
+        self.btfname_anomaly = os.path.join(self.xx_aux_dir, 'pass2backticks_anomaly.txt')
+
+        # Some backtick markup (difference, missing, extra) may be intentional
+        # by the translator (human) and as such is captured in the file with
+        # exceptions. The original line is the key, the translated form
+        # is the value (loaded with the other definitions, see langdefs.py).
+        self.backtick_exceptions = self.parser.backtick_exceptions
+
+        # Capture the info about the definition file.
+        self.log_info.append(self.parser.short_name(self.parser.exceptions_fname))
+
+        self.fout = self.openReport(self.btfname)
+        self.fskip = self.openReport(self.btfname_skipped)
+        self.fa = self.openReport(self.btfname_anomaly)
 
 
     def buildRex(self, lst):
-        '''Build a regular expression matching substrings from the lst.'''
+        '''Build a regular expression matching substrings from the lst.
 
-        # Build a list of escaped unique substrings from the input list.
+           Many paragraphs miss the same terms (`git commit`, `HEAD`...).
+           The regular expression depends only on the set of the substrings;
+           this way, it is built once for the set and then reused.'''
+        return self._buildRex(frozenset(lst))
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _buildRex(terms):
+        '''Build the regular expression for the frozenset of substrings.'''
+
+        # Build a list of escaped unique substrings from the input set.
         # The order is not important now as it must be corrected later.
-        lst2 = [re.escape(s) for s in set(lst)]
+        lst2 = [re.escape(s) for s in terms]
 
         # Join the escaped substrings to form the regular expression
         # pattern, build the regular expression, and return it. There could
@@ -95,384 +212,568 @@ class Parser:
         return rex
 
 
-    def fixParaBackticks(self):
-        '''Checks the bakctick markup in paragraphs, list items...
+    def check(self, en_e, xx_e):
+        # Process only the text from paragraphs and list items (see en_types).
+        # The content is expected to be already synchronized.
+        fout = self.fout
+        fskip = self.fskip
+        fa = self.fa
+
+        # If in exceptions, set the flag, but examine anyway.
+        skipped = xx_e._line() == self.backtick_exceptions.get(en_e._line(), '!@#$%^&*')
+
+        # Find all symbols in backticks.
+        enlst = self.rexBackticked.findall(en_e._line())
+        xxlst = self.rexBackticked.findall(xx_e._line())
+        self.regex_calls += 2
+
+        # The marked items may appear in different order
+        # in the translated text. This way, sets of the marked
+        # items should be compared. But also, some list may be longer
+        # because of repetitions of the same marked items.
+        # There may be also other situations, but consider them
+        # less probable.
+        if set(enlst) != set(xxlst) or len(enlst) != len(xxlst):
+
+            # Create the list of differences that contains only
+            # the strings that are in en, but not in xx. That is,
+            # remove the elements used in the translated language
+            # from the English list.
+            dlst = enlst[:]   # copy
+            for s in xxlst:
+                if s in dlst:
+                    dlst.remove(s)
+
+            # Report the skipped lines. Report separately the
+            # lines that are not captured as exceptions, and
+            # increase the counter of problems in the later case.
+            if skipped:
+                fskip.write('\n{} {}/{} -- en {}/{}:\n'.format(
+                    self.lang,
+                    xx_e.fname,
+                    xx_e.lineno(),
+                    en_e.fname,
+                    en_e.lineno()))
+            else:
+                self.async_cnt += 1
+                fout.write('\n{} {}/{} -- en {}/{}:\n'.format(
+                    self.lang,
+                    xx_e.fname,
+                    xx_e.lineno(),
+                    en_e.fname,
+                    en_e.lineno()))
+
+            # Translated value before the suggested fix.
+            xxpara1 = xx_e.value()
+
+            # If the list of differences is empty, we do not want
+            # to fix anything. Actually we cannot fix anything
+            # as it would lead to construction of the bad regular
+            # expression that would lead to markup of unwanted pieces.
+            # But we still consider this anomaly, report it
+            # to the separate log file, and count it separately.
+            #
+            # If the list of differences is not empty, the translated
+            # source does not follow the original markup. Then build
+            # the regular expression and suggest the markup. Get
+            # also the number of replacements.
+            n = 0            # init -- number of replacements
+            xx_suggested_value = xx_e.value()
+            if len(dlst) != 0:
+                rex = self.buildRex(dlst)
+                xx_suggested_value, n = rex.subn(r'`\g<0>`', xx_e.value())
+                self.regex_calls += 1
+
+            # Now we have the list of differences, the original line,
+            # the translated line before the replacements (xxpara1)
+            # the replaced line in the self.xx_elements.
+            # Report the information differently
+            if skipped:
+                fskip.write('{}\n'.format(repr(dlst)))
+                fskip.write('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n')
+                fskip.write('{}\n'.format(en_e.value()))
+                fskip.write('---------------\n')
+                fskip.write('{}\n'.format(xxpara1)) # from translated sources
+                fskip.write('====================================== {}\n'.format(en_e.fname))
+            else:
+                fout.write('{}\n'.format(repr(dlst)))
+                fout.write('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n')
+                fout.write('{}\n'.format(en_e.value()))
+                fout.write('---------------\n')
+                fout.write('{}\n'.format(xxpara1))  # from translated sources
+                fout.write('====================================== {}\n'.format(en_e.fname))
+                fout.write('Suggested markup:\n')
+                fout.write('{}\n'.format(xx_suggested_value)) # suggested markup
+
+            # The suggested markup may be wrong because of non-human processing
+            # implementation that is not perfect. Calculate the difference list
+            # again based on the suggested markup of the translated value.
+            xxlst2 = self.rexBackticked.findall(xx_suggested_value)
+            self.regex_calls += 1
+            dlst2 = enlst[:]   # copy
+            for s in xxlst2:
+                if s in dlst2:
+                    dlst2.remove(s)
+
+            # The anomaly happens when at least one of the cases happens:
+            # - the sets of substrings in original and in the translation differ,
+            # - the difference list is not empty (that is missing markup
+            #   in the translation),
+            # - the length of lists differs for the original and for
+            #   the translation (that is, the translation marks up different
+            #   number of substrings),
+            # - the number of replacements differ from the length of
+            #   the first difference list (that is too much markups
+            #   were suggested).
+            anomaly = set(enlst) != set(xxlst2) or len(dlst2) > 0 \
+                      or len(enlst) != len(xxlst2) or len(dlst) != n
+            self.finding(en_e, xx_e, skipped=skipped, anomaly=anomaly,
+                         en_markup=enlst, xx_markup=xxlst, missing=dlst,
+                         suggested=xx_suggested_value if n > 0 else None)
+            if anomaly:
+
+                # It is an anomaly only if it not an explicit exception.
+                if not skipped:
+                    self.anomaly_cnt += 1
+
+                # Report to the log file with anomalies.
+                fa.write('\n{} {} -- en {}/{}:\n'.format(
+                    self.lang,
+                    xx_e.lineno(),
+                    en_e.fname[:2],
+                    en_e.lineno()))
+
+                # To the report of anomalies insert all values that can
+                # help to spot the problem.
+                fa.write('\t[en] markup               = {} {}\n'.format(len(enlst), repr(enlst)))
+                fa.write('\t[{}] markup               = {} {}\n'.format(self.lang, len(xxlst), repr(xxlst)))
+                fa.write('\tmissing in [{}]           = {} {}\n'.format(self.lang, len(dlst), repr(dlst)))
+                fa.write('\tsuggested [{}] markup     = {} {}\n'.format(self.lang, len(xxlst2), repr(xxlst2)))
+                fa.write('\tmissing in suggested [{}] = {} {}\n'.format(self.lang, len(dlst2), repr(dlst2)))
+                fa.write('\tnumber of suggested replacement in [{}] = {}\n'.format(self.lang, n))
+                fa.write('Original [en]:\n\t{}\n'.format(en_e.value()))
+                fa.write('Translation [{}]:\n\t{}\n'.format(self.lang, xxpara1))
+                if n > 0:
+                    fa.write('Suggested translation [{}]:\n\t{}\n'.format(self.lang, xx_suggested_value))
+                fa.write('-'*50 + '\n')
+
+
+    def close(self):
+        self.fout.close()
+        self.fskip.close()
+        self.fa.close()
 
-           The results reported to pass2backticks.txt.'''
+        # Capture the info about the report log files and about the result.
+        self.logReport(self.btfname)
+        self.logReport(self.btfname_skipped)
+        self.log_info.append(('-'*30) + \
+                         ' asynchronous backticks: {}'.format(self.async_cnt))
+        self.logReport(self.btfname_anomaly)
+        self.log_info.append(('-'*30) + \
+                         ' backtick anomalies: {}'.format(self.anomaly_cnt))
 
-        async_cnt = 0     # init -- "not synchronous lines" counter
-        anomaly_cnt = 0   # init -- anomaly counter (with respect to the markup in both cases)
-        btfname = os.path.join(self.xx_aux_dir, 'pass2backticks.txt')
-        btfname_skipped = os.path.join(self.xx_aux_dir, 'pass2backticks_skiped.txt')
-        btfname_anomaly = os.path.join(self.xx_aux_dir, 'pass2backticks_anomaly.txt')
 
-        # Some backtick markup (difference, missing, extra) may be intentional
-        # by the translator (human) and as such is captured in the file with
-        # exceptions. The original line is the key, the translated form
-        # is the value. In the exception file, the values are separated by
-        # at least five dashes, and the records by at least five equal signs
-        # -- as in previous cases. See the `definitions/cs` examples if in doubt.
-        backtick_exceptions_fname = os.path.join(self.lang_definitions_dir,
-                                                 'backtick_exceptions.txt')
-
-        # Create the empty file if it does not exist.
-        if not os.path.isfile(backtick_exceptions_fname):
-            f = open(backtick_exceptions_fname, 'w')
-            f.close()
-
-        # Load the exceptions.
-        backtick_exceptions = {}
-        status = 0
-        original = None
-        with open(backtick_exceptions_fname, encoding='utf-8') as f:
-            for line in f:
-                if status == 0:
-                    original = line     # will be the key later
-                    status = 1
-
-                elif status == 1:
-                    assert line.startswith('-----')
-                    status = 2
-
-                elif status == 2:
-                    backtick_exceptions[original] = line    # translation
-                    original = None
-                    status = 3
-
-                elif status == 3:
-                    assert line.startswith('=====')
-                    status = 0
-
-                else:
-                    raise NotImplementedError('status = {}\n'.format(status))
+class DoubleQuotesCheck(Check):
+    '''Checks usage of the correct version of double quotes.
 
-        # Capture the info about the definition file.
-        self.log_info.append(self.short_name(backtick_exceptions_fname))
-
-        with open(btfname, 'w', encoding='utf-8') as fout, \
-             open(btfname_skipped, 'w', encoding='utf-8') as fskip, \
-             open(btfname_anomaly, 'w', encoding='utf-8') as fa:
-
-            # The content is expected to be already synchronized; therefore,
-            # looping using the for-loop.
-            for en_e, xx_e in zip(self.en_elements, self.xx_elements):
-                # Process only the text from paragraphs and list items.
-                if en_e.type in ['para', 'uli', 'li']:
-                    # If in exceptions, set the flag, but examine anyway.
-                    skipped = xx_e._line() == backtick_exceptions.get(en_e._line(), '!@#$%^&*')
-
-                    # Find all symbols in backticks.
-                    enlst = self.rexBackticked.findall(en_e._line())
-                    xxlst = self.rexBackticked.findall(xx_e._line())
-
-                    # The marked items may appear in different order
-                    # in the translated text. This way, sets of the marked
-                    # items should be compared. But also, some list may be longer
-                    # because of repetitions of the same marked items.
-                    # There may be also other situations, but consider them
-                    # less probable.
-                    if set(enlst) != set(xxlst) or len(enlst) != len(xxlst):
-
-                        # Create the list of differences that contains only
-                        # the strings that are in en, but not in xx. That is,
-                        # remove the elements used in the translated language
-                        # from the English list.
-                        dlst = enlst[:]   # copy
-                        for s in xxlst:
-                            if s in dlst:
-                                dlst.remove(s)
-
-                        # Report the skipped lines. Report separately the
-                        # lines that are not captured as exceptions, and
-                        # increase the counter of problems in the later case.
-                        if skipped:
-                            fskip.write('\n{} {}/{} -- en {}/{}:\n'.format(
-                                self.lang,
-                                xx_e.fname,
-                                xx_e.lineno(),
-                                en_e.fname,
-                                en_e.lineno()))
-                        else:
-                            async_cnt += 1
-                            fout.write('\n{} {}/{} -- en {}/{}:\n'.format(
-                                self.lang,
-                                xx_e.fname,
-                                xx_e.lineno(),
-                                en_e.fname,
-                                en_e.lineno()))
-
-                        # Translated value before the suggested fix.
-                        xxpara1 = xx_e.value()
-
-                        # If the list of differences is empty, we do not want
-                        # to fix anything. Actually we cannot fix anything
-                        # as it would lead to construction of the bad regular
-                        # expression that would lead to markup of unwanted pieces.
-                        # But we still consider this anomaly, report it
-                        # to the separate log file, and count it separately.
-                        #
-                        # If the list of differences is not empty, the translated
-                        # source does not follow the original markup. Then build
-                        # the regular expression and suggest the markup. Get
-                        # also the number of replacements.
-                        n = 0            # init -- number of replacements
-                        xx_suggested_value = xx_e.value()
-                        if len(dlst) != 0:
-                            rex = self.buildRex(dlst)
-                            xx_suggested_value, n = rex.subn(r'`\g<0>`', xx_e.value())
-
-                        # Now we have the list of differences, the original line,
-                        # the translated line before the replacements (xxpara1)
-                        # the replaced line in the self.xx_elements.
-                        # Report the information differently
-                        if skipped:
-                            fskip.write('{}\n'.format(repr(dlst)))
-                            fskip.write('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n')
-                            fskip.write('{}\n'.format(en_e.value()))
-                            fskip.write('---------------\n')
-                            fskip.write('{}\n'.format(xxpara1)) # from translated sources
-                            fskip.write('====================================== {}\n'.format(en_e.fname))
-                        else:
-                            fout.write('{}\n'.format(repr(dlst)))
-                            fout.write('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n')
-                            fout.write('{}\n'.format(en_e.value()))
-                            fout.write('---------------\n')
-                            fout.write('{}\n'.format(xxpara1))  # from translated sources
-                            fout.write('====================================== {}\n'.format(en_e.fname))
-                            fout.write('Suggested markup:\n')
-                            fout.write('{}\n'.format(xx_suggested_value)) # suggested markup
-
-                        # The suggested markup may be wrong because of non-human processing
-                        # implementation that is not perfect. Calculate the difference list
-                        # again based on the suggested markup of the translated value.
-                        xxlst2 = self.rexBackticked.findall(xx_suggested_value)
-                        dlst2 = enlst[:]   # copy
-                        for s in xxlst2:
-                            if s in dlst2:
-                                dlst2.remove(s)
-
-                        # The anomaly happens when at least one of the cases happens:
-                        # - the sets of substrings in original and in the translation differ,
-                        # - the difference list is not empty (that is missing markup
-                        #   in the translation),
-                        # - the length of lists differs for the original and for
-                        #   the translation (that is, the translation marks up different
-                        #   number of substrings),
-                        # - the number of replacements differ from the length of
-                        #   the first difference list (that is too much markups
-                        #   were suggested).
-                        if set(enlst) != set(xxlst2) or len(dlst2) > 0 \
-                           or len(enlst) != len(xxlst2) or len(dlst) != n:
-
-                            # It is an anomaly only if it not an explicit exception.
-                            if not skipped:
-                                anomaly_cnt += 1
-
-                            # Report to the log file with anomalies.
-                            fa.write('\n{} {} -- en {}/{}:\n'.format(
-                                self.lang,
-                                xx_e.lineno(),
-                                en_e.fname[:2],
-                                en_e.lineno()))
-
-                            # To the report of anomalies insert all values that can
-                            # help to spot the problem.
-                            fa.write('\t[en] markup               = {} {}\n'.format(len(enlst), repr(enlst)))
-                            fa.write('\t[{}] markup               = {} {}\n'.format(self.lang, len(xxlst), repr(xxlst)))
-                            fa.write('\tmissing in [{}]           = {} {}\n'.format(self.lang, len(dlst), repr(dlst)))
-                            fa.write('\tsuggested [{}] markup     = {} {}\n'.format(self.lang, len(xxlst2), repr(xxlst2)))
-                            fa.write('\tmissing in suggested [{}] = {} {}\n'.format(self.lang, len(dlst2), repr(dlst2)))
-                            fa.write('\tnumber of suggested replacement in [{}] = {}\n'.format(self.lang, n))
-                            fa.write('Original [en]:\n\t{}\n'.format(en_e.value()))
-                            fa.write('Translation [{}]:\n\t{}\n'.format(self.lang, xxpara1))
-                            if n > 0:
-                                fa.write('Suggested translation [{}]:\n\t{}\n'.format(self.lang, xx_suggested_value))
-                            fa.write('-'*50 + '\n')
+       There should be “these” in the text to be typeset
+       as paragraph or list item. And there should be "these"
+       in the code snippets.
 
-        # Capture the info about the report log files and about the result.
-        self.log_info.append(self.short_name(btfname))
-        self.log_info.append(self.short_name(btfname_skipped))
+       Results are reported to pass2dquotes.txt.'''
+
+    check_id = 'dquotes'
+    counters = Check.counters + ('cnt',)
+
+    # Only plain ASCII double quotes are allowed in code snippets.
+    rexBadCodeQuotes = re.compile(r'[„“”]')
+
+    def open(self):
+        self.cnt = 0         # init -- counter of improper usage
+        self.fname = os.path.join(self.xx_aux_dir, 'pass2dquotes.txt')
+        self.f = self.openReport(self.fname, newline='\n')
+
+        # The paragraphs should contain the typesetting-ready
+        # double quotes that are language dependent.
+        if self.lang == 'cs':
+            self.rexBadParaQuotes = re.compile(r'["”]')  # Czech ones must be „this way“
+        elif self.lang == 'fr':
+            self.rexBadParaQuotes = re.compile(r'["”]')  # I do not know for French
+        else:   # as in 'en'
+            self.rexBadParaQuotes = re.compile(r'["„]')  # English uses “these”
+
+
+    def check(self, en_e, xx_e):
+        # Depending on the element type...
+        if xx_e.type in ('para', 'li', 'uli', 'imgcaption', 'title'):
+            # The elements that should use *nice* double quotes.
+            self.regex_calls += 1
+            if self.rexBadParaQuotes.search(xx_e.value()) is None:
+                return
+
+        elif xx_e.type == 'code':
+            # Code should use the ASCII double quotes.
+            self.regex_calls += 1
+            if self.rexBadCodeQuotes.search(xx_e.value()) is None:
+                return
+
+        elif xx_e.type in ('empty', 'img'):
+            return
+
+        # Improper double quote found (or no double quotes should be
+        # in that type of element). Count it and report it.
+        self.cnt += 1
+        self.finding(en_e, xx_e)
+
+        f = self.f
+        f.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
+                self.lang,
+                xx_e.fname,
+                xx_e.lineno(),
+                en_e.fname,
+                en_e.lineno(),
+                repr(xx_e.type)))
+
+        f.write('\t{}\n'.format(en_e.value()))
+        f.write('\t{}\n'.format(xx_e.value()))
+
+
+    def close(self):
+        self.f.close()
+
+        # Capture the info about the log file and the result message.
+        self.logReport(self.fname)
         self.log_info.append(('-'*30) + \
-                         ' asynchronous backticks: {}'.format(async_cnt))
-        self.log_info.append(self.short_name(btfname_anomaly))
+               ' elements with bad double quotes: {}'.format(self.cnt))
+
+
+class EmStrongCheck(Check):
+    '''Compares the usage of *emphasize* and **strong** markup.
+
+       The comparison is based on the same number of usage of
+       the markup in the English original and in the translated
+       source. From the point of checking, there is no difference
+       between *em* and **strong** as some human languages
+       may tend to use it differently than the English original.
+       All elements with markups are reported to pass2em_strong.txt,
+       if the number of marked substrings differ, the report
+       goes also to pass2em_strong_diff.txt.'''
+
+    # Only for elements with a typeset text (that is not
+    # inside code snippets)...
+    check_id = 'em_strong'
+    xx_types = {'para', 'li', 'uli', 'imgcaption', 'title'}
+    counters = Check.counters + ('cnt',)
+
+    # Regular expression for single or double stars around
+    # a text. The underscore can also be used instead of
+    # the star..
+    rexEmStrong = re.compile(r'([*_]{1,2})([^*_]+?)\1')
+
+    def open(self):
+        self.cnt = 0         # init -- počet odhalených chyb
+        self.fname = os.path.join(self.xx_aux_dir, 'pass2em_strong.txt')
+        self.fname_diff = os.path.join(self.xx_aux_dir, 'pass2em_strong_diff.txt')
+        self.f = self.openReport(self.fname, newline='\n')
+        self.fdiff = self.openReport(self.fname_diff, newline='\n')
+
+
+    def check(self, en_e, xx_e):
+        # Build the lists of marked substrings.
+        enlst = self.rexEmStrong.findall(en_e.value())
+        xxlst = self.rexEmStrong.findall(xx_e.value())
+        self.regex_calls += 2
+
+        # If any markup was found, show the original and
+        # the translation in the log. If lengths of the lists
+        # differ, report to the difference log.
+        if enlst or xxlst:
+            f = self.f
+            f.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
+                    self.lang,
+                    xx_e.fname,
+                    xx_e.lineno(),
+                    en_e.fname,
+                    en_e.lineno(),
+                    repr(xx_e.type)))
+
+            # Numbers of marked substrings.
+            f.write('\t{} : {}\n'.format(len(enlst), len(xxlst)))
+
+            # The lines.
+            f.write('\t{}\n'.format(en_e.value()))
+            f.write('\t{}\n'.format(xx_e.value()))
+
+            # If the number of marked substrings differ,
+            # report also to the difference log.
+            if len(enlst) != len(xxlst):
+                self.cnt += 1
+                self.finding(en_e, xx_e, en_count=len(enlst),
+                             xx_count=len(xxlst))
+                fdiff = self.fdiff
+                fdiff.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
+                            self.lang,
+                            xx_e.fname,
+                            xx_e.lineno(),
+                            en_e.fname,
+                            en_e.lineno(),
+                            repr(xx_e.type)))
+
+                # Numbers of marked substrings.
+                fdiff.write('\t{} : {}\n'.format(len(enlst), len(xxlst)))
+
+                # The lines.
+                fdiff.write('\t{}\n'.format(en_e.value()))
+                fdiff.write('\t{}\n'.format(xx_e.value()))
+
+
+    def close(self):
+        self.f.close()
+        self.fdiff.close()
+
+        # Capture the info about the logs and the result.
+        self.logReport(self.fname)
+        self.logReport(self.fname_diff)
         self.log_info.append(('-'*30) + \
-                         ' backtick anomalies: {}'.format(anomaly_cnt))
+               ' differences in *em* and **strong**: {}'.format(self.cnt))
 
 
-    def reportBadDoubleQuotes(self):
-        '''Checks usage of the correct version of double quotes.
+class Parser:
+    '''Pass 2 parser for markup checking.
 
-           There should be “these” in the text to be typeset
-           as paragraph or list item. And there should be "these"
-           in the code snippets.
+       Consumes the result of the pass1 parser.'''
 
-           Results are reported to pass2dquotes.txt.'''
+    # The checks run by run(). Another check can be plugged in by appending
+    # a Check subclass (in a Parser subclass, or to the instance list).
+    checkers = [ImagesCheck, BackticksCheck, DoubleQuotesCheck, EmStrongCheck]
 
-        cnt = 0         # init -- counter of improper usage
-        fname = os.path.join(self.xx_aux_dir, 'pass2dquotes.txt')
+    # The attributes used by the checks that are passed to the worker
+    # processes (see ShardParser). A plugged-in check that needs more
+    # of the parser adds the names.
+    shard_attributes = ('lang', 'xx_aux_dir', 'findings_fname',
+                        'backtick_exceptions', 'exceptions_fname')
 
-        with open(fname, 'w', encoding='utf-8', newline='\n') as f:
+    def __init__(self, pass1, jobs=1):
+        self.lang = pass1.lang
+
+        # Important directories.
+        self.en_src_dir = pass1.en_src_dir
+        self.xx_src_dir = pass1.xx_src_dir
+        self.en_aux_dir = pass1.en_aux_dir
+        self.xx_aux_dir = pass1.xx_aux_dir
+        self.root_definitions_dir = pass1.root_definitions_dir
+        self.lang_definitions_dir = pass1.lang_definitions_dir
 
-            # Only plain ASCII double quotes are allowed in code snippets.
-            rexBadCodeQuotes = re.compile(r'[„“”]')
+        # Definitions of the language (already loaded by pass1). The backtick
+        # exceptions are also the attributes -- to be passed to the workers.
+        self.definitions = pass1.loadDefinitions()
+        self.backtick_exceptions = self.definitions.backtick_exceptions
+        self.exceptions_fname = self.definitions.exceptions_fname
 
-            # The paragraphs should contain the typesetting-ready
-            # double quotes that are language dependent.
-            if self.lang == 'cs':
-                rexBadParaQuotes = re.compile(r'["”]')  # Czech ones must be „this way“
-            elif self.lang == 'fr':
-                rexBadParaQuotes = re.compile(r'["”]')  # I do not know for French
-            else:   # as in 'en'
-                rexBadParaQuotes = re.compile(r'["„]')  # English uses “these”
+        # Report files (some may be turned off -- as in pass1).
+        self.reports = pass1.reports
 
-            for en_e, xx_e in zip(self.en_elements, self.xx_elements):
+        # The findings for the tools (JSON Lines, see report.Findings).
+        self.findings_fname = os.path.join(self.xx_aux_dir, 'pass2findings.jsonl')
+        self.findings_opened = False
+        self.findings = None
+        self.collected_findings = pass1.collected_findings  # see api.py
 
-                # Depending on the element type...
-                if xx_e.type in ('para', 'li', 'uli', 'imgcaption', 'title'):
-                    # The elements that should use *nice* double quotes.
+        # Time and counters of the phases (see stats.py), dumped by run().
+        self.stats = stats.Stats(self.reports)
+        self.stats_fname = os.path.join(self.xx_aux_dir, 'pass2stats.json')
 
-                    if rexBadParaQuotes.search(xx_e.value()) is not None:
-                        # Improper double quote found. Count it and report it.
-                        cnt += 1
+        # Lists of elements (some elements were
+        # processed and deleted in the pass1).
+        self.en_elements = pass1.en_elements
+        self.xx_elements = pass1.xx_elements
 
-                        f.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
-                                self.lang,
-                                xx_e.fname,
-                                xx_e.lineno(),
-                                en_e.fname,
-                                en_e.lineno(),
-                                repr(xx_e.type)))
+        # Number of worker processes checking the chapters in parallel
+        # (None -- number of CPUs, 1 -- no workers, checked serially).
+        self.jobs = jobs
 
-                        f.write('\t{}\n'.format(en_e.value()))
-                        f.write('\t{}\n'.format(xx_e.value()))
+        self.checkers = list(self.checkers)
+        self.log_info = []                # lines for logging
+        self.backticked_set = set()
 
-                elif xx_e.type == 'code':
-                    # Code should use the ASCII double quotes.
 
-                    if rexBadCodeQuotes.search(xx_e.value()) is not None:
+    def short_name(self, fname):
+        '''Returns tail of the fname -- for log info.'''
+        lst = fname.split(os.sep)
+        if lst[-2] == self.lang:
+            return '/'.join(lst[-3:])
+        else:
+            return '/'.join(lst[-2:])
 
-                        # Unwanted double quote found.
-                        cnt += 1
 
-                        f.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
-                                self.lang,
-                                xx_e.fname,
-                                xx_e.lineno(),
-                                en_e.fname,
-                                en_e.lineno(),
-                                repr(xx_e.type)))
+    def logReport(self, fname):
+        '''Captures the report file to the log (unless turned off).'''
+        if self.reports.enabled(fname):
+            self.log_info.append(self.short_name(fname))
+
+
+    def openFindings(self):
+        '''Opens the findings -- the file is truncated when opened first.'''
+        f = self.reports.open(self.findings_fname, newline='\n',
+                              append=self.findings_opened)
+        self.findings_opened = True
+        return report.Findings(f, self.lang, self.collected_findings)
+
+
+    def traverse(self, checks):
+        '''Passes the element pairs to the interested checks.
+
+           The checks interested in the pair are found by the types of both
+           elements. The list is built when the pair of types appears for
+           the first time; then it is only looked up. This way, adding
+           a check costs the work for the elements it is interested in,
+           not another pass through all elements.'''
+        dispatch = {}       # (en type, xx type) -> list of the checks
+        for en_e, xx_e in zip(self.en_elements, self.xx_elements):
+            types = (en_e.type, xx_e.type)
+            interested = dispatch.get(types)
+            if interested is None:
+                interested = dispatch[types] = [
+                    check for check in checks
+                    if (check.en_types is None or en_e.type in check.en_types)
+                    and (check.xx_types is None or xx_e.type in check.xx_types)]
+            for check in interested:
+                check.check(en_e, xx_e)
+
+
+    def chapterShards(self):
+        '''Returns the list of (start, stop) ranges of the element pairs.
+
+           One range for each chapter of the original (the element pairs
+           are split where the chapter of the English element changes).'''
+        shards = []
+        start = 0
+        count = min(len(self.en_elements), len(self.xx_elements))
+        for i in range(1, count):
+            if self.en_elements[i].fname[:2] != self.en_elements[i - 1].fname[:2]:
+                shards.append((start, i))
+                start = i
+        if start < count:
+            shards.append((start, count))
+        return shards
+
+
+    def shardParser(self, start, stop):
+        '''Returns the parser for the range of the element pairs (see ShardParser).'''
+        return ShardParser(self, start, stop)
+
+
+    def traverseParallel(self, checks):
+        '''Checks the chapters in the worker processes.
+
+           The workers return the states of their checks (see Check.state()).
+           They are merged in the order of the chapters, so the reports
+           are the same as from the serial traversal.'''
+        checkers = [type(check) for check in checks]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(_checkShard, self.shardParser(start, stop),
+                                       checkers)
+                       for start, stop in self.chapterShards()]
+            for future in futures:
+                states, findings = future.result()
+                for check, state in zip(checks, states):
+                    check.mergeState(state)
+                self.findings.f.write(findings)
+
+
+    def runChecks(self, checkers):
+        '''Runs the checks in one traversal of the element pairs.
+
+           The traversal is split to the worker processes by chapters
+           unless the jobs is 1.'''
+        checks = [cls(self) for cls in checkers]
+        for check in checks:
+            check.open()
+
+        self.findings = self.openFindings()
+        try:
+            if self.jobs == 1:
+                self.traverse(checks)
+            else:
+                self.traverseParallel(checks)
+        finally:
+            for check in checks:
+                check.close()
+            self.findings.close()
+
+        self.stats.count('elements', 2 * min(len(self.en_elements),
+                                             len(self.xx_elements)))
+        self.stats.count('regex_calls', sum(check.regex_calls for check in checks))
+
+        # Capture the log lines in the order of the checks.
+        for check in checks:
+            self.log_info.extend(check.log_info)
 
-                        f.write('\t{}\n'.format(en_e.value()))
-                        f.write('\t{}\n'.format(xx_e.value()))
 
-                elif xx_e.type not in ('empty', 'img'):
-                        # No double quotes should be in that type of element.
-                        cnt += 1
+    def checkImages(self):
+        '''Checks the figure numbers in the captions of the images.'''
+        self.runChecks([ImagesCheck])
 
-                        f.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
-                                self.lang,
-                                xx_e.fname,
-                                xx_e.lineno(),
-                                en_e.fname,
-                                en_e.lineno(),
-                                repr(xx_e.type)))
 
-                        f.write('\t{}\n'.format(en_e.value()))
-                        f.write('\t{}\n'.format(xx_e.value()))
+    def fixParaBackticks(self):
+        '''Checks the bakctick markup in paragraphs, list items...'''
+        self.runChecks([BackticksCheck])
 
 
-        # Capture the info about the log file and the result message.
-        self.log_info.append(self.short_name(fname))
-        self.log_info.append(('-'*30) + \
-               ' elements with bad double quotes: {}'.format(cnt))
+    def reportBadDoubleQuotes(self):
+        '''Checks usage of the correct version of double quotes.'''
+        self.runChecks([DoubleQuotesCheck])
 
 
     def reportEmAndStrong(self):
-        '''Compares the usage of *emphasize* and **strong** markup.
-
-           The comparison is based on the same number of usage of
-           the markup in the English original and in the translated
-           source. From the point of checking, there is no difference
-           between *em* and **strong** as some human languages
-           may tend to use it differently than the English original.
-           All elements with markups are reported to pass2em_strong.txt,
-           if the number of marked substrings differ, the report
-           goes also to pass2em_strong_diff.txt.'''
-
-        cnt = 0         # init -- počet odhalených chyb
-        fname = os.path.join(self.xx_aux_dir, 'pass2em_strong.txt')
-        fname_diff = os.path.join(self.xx_aux_dir, 'pass2em_strong_diff.txt')
-
-        with open(fname, 'w', encoding='utf-8', newline='\n') as f,\
-             open(fname_diff, 'w', encoding='utf-8', newline='\n') as fdiff:
-
-            # Regular expression for single or double stars around
-            # a text. The underscore can also be used instead of
-            # the star..
-            rexEmStrong = re.compile(r'([*_]{1,2})([^*_]+?)\1')
-
-            for en_e, xx_e in zip(self.en_elements, self.xx_elements):
-
-                # Only for elements with a typeset text (that is not
-                # inside code snippets)...
-                if xx_e.type in ('para', 'li', 'uli', 'imgcaption', 'title'):
-
-                    # Build the lists of marked substrings.
-                    enlst = rexEmStrong.findall(en_e.value())
-                    xxlst = rexEmStrong.findall(xx_e.value())
-
-                    # If any markup was found, show the original and
-                    # the translation in the log. If lengths of the lists
-                    # differ, report to the difference log.
-                    if enlst or xxlst:
-                        f.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
-                                self.lang,
-                                xx_e.fname,
-                                xx_e.lineno(),
-                                en_e.fname,
-                                en_e.lineno(),
-                                repr(xx_e.type)))
-
-                        # Numbers of marked substrings.
-                        f.write('\t{} : {}\n'.format(len(enlst), len(xxlst)))
-
-                        # The lines.
-                        f.write('\t{}\n'.format(en_e.value()))
-                        f.write('\t{}\n'.format(xx_e.value()))
-
-                        # If the number of marked substrings differ,
-                        # report also to the difference log.
-                        if len(enlst) != len(xxlst):
-                            cnt += 1
-                            fdiff.write('\n{} {}/{} -- en {}/{}, {}:\n'.format(
-                                        self.lang,
-                                        xx_e.fname,
-                                        xx_e.lineno(),
-                                        en_e.fname,
-                                        en_e.lineno(),
-                                        repr(xx_e.type)))
-
-                            # Numbers of marked substrings.
-                            fdiff.write('\t{} : {}\n'.format(len(enlst), len(xxlst)))
-
-                            # The lines.
-                            fdiff.write('\t{}\n'.format(en_e.value()))
-                            fdiff.write('\t{}\n'.format(xx_e.value()))
-
-        # Capture the info about the logs and the result.
-        self.log_info.append(self.short_name(fname))
-        self.log_info.append(self.short_name(fname_diff))
-        self.log_info.append(('-'*30) + \
-               ' differences in *em* and **strong**: {}'.format(cnt))
+        '''Compares the usage of *emphasize* and **strong** markup.'''
+        self.runChecks([EmStrongCheck])
 
 
     def run(self):
-        '''Launcher of the parser phases.'''
+        '''Launcher of the parser phases -- all checks in one traversal.'''
 
-        self.checkImages()
-        self.fixParaBackticks()
-        self.reportBadDoubleQuotes()
-        self.reportEmAndStrong()
+        with self.stats.phase('checks'):
+            self.runChecks(self.checkers)
+        self.logReport(self.findings_fname)
+
+        # The values are also available as the self.stats.asDict().
+        self.stats.dump(self.stats_fname)
+        self.logReport(self.stats_fname)
 
         return '\n\t'.join(self.log_info)
 
+
+class ShardParser(Parser):
+    '''The part of the parser the checks need in the worker process.
+
+       Only the element pairs of the shard, the names of the disabled
+       reports, and the shard_attributes are pickled for the worker -- not
+       the definitions, the other elements, or the findings of pass 1.'''
+
+    def __init__(self, parser, start, stop):
+        for name in parser.shard_attributes:
+            setattr(self, name, getattr(parser, name))
+        self.reports = report.Reports(parser.reports.disabled)
+        self.en_elements = parser.en_elements[start:stop]
+        self.xx_elements = parser.xx_elements[start:stop]
+        self.log_info = []
+        self.findings = None
+
+
+def _checkShard(parser, checkers):
+    '''Runs the checks for the shard parser in the worker process.
+
+       Returns the list of the check states (see Check.state()),
+       and the text of the findings.'''
+    checks = [cls(parser, fragments=True) for cls in checkers]
+    for check in checks:
+        check.open()
+    fragment = report.Fragment()
+    parser.findings = report.Findings(fragment, parser.lang)
+    parser.findings.enabled = parser.reports.enabled(parser.findings_fname)
+    parser.traverse(checks)
+    for check in checks:
+        check.close()
+    parser.findings.close()
+    return [check.state() for check in checks], fragment.text
@@ -0,0 +1,214 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Writing of the report files to the aux directories.'''
+
+import io
+import json
+import os
+
+
+# Size of the write buffer of the report files. The reports are written
+# by many small writes (a few per element); the large buffer turns them
+# into a few system calls while keeping the memory bounded.
+BUFFER_SIZE = 1024 * 1024
+
+# Reports that are mostly for debugging, not consumed later. They can be
+# turned off for the production runs (see Reports).
+DEBUG_REPORTS = frozenset(['pass1.txt', 'pass1doclines.txt'])
+
+
+class NullReport:
+    '''Report that is turned off -- nothing is written.'''
+
+    def write(self, s):
+        return len(s)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Fragment(io.StringIO):
+    '''Report written to memory.
+
+       The text is kept when the file is closed (the StringIO discards it).'''
+
+    def close(self):
+        if not self.closed:
+            self.text = self.getvalue()
+        super().close()
+
+
+class Reports:
+    '''Opens the report files; some of them may be turned off.
+
+       The disabled reports are given by their base names (like 'pass1.txt').
+       When the report is turned off, its file from the earlier run
+       is removed so that the obsolete content is not mistaken
+       for the current one.'''
+
+    def __init__(self, disabled=()):
+        self.disabled = frozenset(disabled)
+        self.sizes = {}     # fname -> size when opened (to count the written bytes)
+        self.written = 0    # bytes written to the files opened again later
+
+
+    def enabled(self, fname):
+        '''Returns True if the report file is to be written.'''
+        return os.path.basename(fname) not in self.disabled
+
+
+    def open(self, fname, newline=None, append=False):
+        '''Returns the buffered report file opened for writing (UTF-8).'''
+        if not self.enabled(fname):
+            if os.path.isfile(fname):
+                os.remove(fname)
+            return NullReport()
+        if fname in self.sizes:
+            self.written += self.size(fname) - self.sizes[fname]
+        self.sizes[fname] = self.size(fname) if append else 0
+        return open(fname, 'a' if append else 'w', encoding='utf-8',
+                    newline=newline, buffering=BUFFER_SIZE)
+
+
+    def size(self, fname):
+        '''Returns the size of the file (0 if it does not exist).'''
+        try:
+            return os.path.getsize(fname)
+        except OSError:
+            return 0
+
+
+    def bytesWritten(self):
+        '''Returns the number of bytes written to the reports so far.
+
+           The bytes in the write buffers of the open files are not
+           counted until they are flushed.'''
+        return self.written + sum(self.size(fname) - size
+                                  for fname, size in self.sizes.items())
+
+
+class MemoryReports(Reports):
+    '''Reports written to memory instead of the files.
+
+       Used when the report files are assembled from parts produced
+       separately (see watch.py). The texts of the closed fragments
+       are returned by texts(), the newline arguments of open()
+       are remembered to write the files later the same way.'''
+
+    def __init__(self, disabled=()):
+        super().__init__(disabled)
+        self.fragments = {}     # fname -> Fragment (the last one opened)
+        self.newlines = {}      # fname -> newline argument of open()
+
+
+    def open(self, fname, newline=None, append=False):
+        '''Returns the memory fragment for the report (or NullReport).'''
+        if not self.enabled(fname):
+            return NullReport()
+        f = Fragment()
+        if append and fname in self.fragments:
+            f.write(self.fragments[fname].text)
+        self.fragments[fname] = f
+        self.newlines[fname] = newline
+        return f
+
+
+    def texts(self):
+        '''Returns the dict fname -> text of the closed fragments.'''
+        return {fname: f.text for fname, f in self.fragments.items()}
+
+
+def elementInfo(e):
+    '''Returns the description of the element for the findings.'''
+    return {'file': e.fname,
+            'lines': [e.doclines[0].lineno, e.doclines[-1].lineno],
+            'type': e.type,
+            'sha': e.sha.hex() if e.sha is not None else None}
+
+
+class Finding:
+    '''One finding of a check -- the object form of the JSON record.
+
+       The en and xx are the lists of the involved doc.Element objects,
+       the fields are the check-dependent values (like the kind
+       of the structure difference).'''
+
+    __slots__ = ('check', 'lang', 'en', 'xx', 'fields')
+
+    def __init__(self, check, lang, en, xx, fields):
+        self.check = check
+        self.lang = lang
+        self.en = en
+        self.xx = xx
+        self.fields = fields
+
+
+    def asDict(self):
+        '''Returns the record as written to the JSON Lines file.'''
+        record = {'check': self.check, 'lang': self.lang,
+                  'en': [elementInfo(e) for e in self.en],
+                  'xx': [elementInfo(e) for e in self.xx]}
+        record.update(self.fields)
+        return record
+
+
+    def __repr__(self):
+        return 'Finding({!r}, en={}, xx={}, {!r})'.format(
+            self.check, [e.fname + '/' + e.lineno() for e in self.en],
+            [e.fname + '/' + e.lineno() for e in self.xx], self.fields)
+
+
+class Findings:
+    '''Writes the findings of the checks as JSON Lines.
+
+       One finding is one JSON object on one line -- written as soon
+       as it is found. The text reports are designed to be read (and copied
+       from) by a human; the findings are for the tools. The record has
+       the form
+
+           {"check": "dquotes", "lang": "cs",
+            "en": [{"file": ..., "lines": [first, last], "type": ..., "sha": ...}],
+            "xx": [...], ...}
+
+       where "en" and "xx" are lists of the involved English and translated
+       elements (one element for the checks of the element pairs),
+       and the other keys depend on the check.
+
+       When the collected list is given, the Finding objects are also
+       appended to it (even when the file is turned off).'''
+
+    def __init__(self, f, lang, collected=None):
+        self.f = f
+        self.lang = lang
+        self.enabled = not isinstance(f, NullReport)
+        self.collected = collected
+
+
+    def write(self, check, en_elements, xx_elements, **fields):
+        '''Writes the finding of the check for the elements.'''
+        if not self.enabled and self.collected is None:
+            return
+        finding = Finding(check, self.lang, list(en_elements),
+                          list(xx_elements), fields)
+        if self.collected is not None:
+            self.collected.append(finding)
+        if self.enabled:
+            self.f.write(json.dumps(finding.asDict(), ensure_ascii=False))
+            self.f.write('\n')
+
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,313 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Changes of the English original between two git revisions.
+
+Usage: revdiff.py [--xx-rev REV] repo rev_a rev_b root_aux_dir lang
+
+Example (the progit clone next to this repository, see plan.txt):
+
+    revdiff.py ../../progit/ 71619c4f 0cdd7e8a ../ cs
+
+The `en` sources are read directly from the local git repository (one
+`git cat-file --batch` process, no checkout, no network). Only the files
+whose blobs differ between the revisions are read. Their elements are built
+and digested as in pass1, and the element sequences are aligned by the digests.
+The changed, added, deleted, and moved elements are reported.
+
+Then pass1 and pass2 (see api.py) check only the affected chapters
+of the translation from the working tree of the repo (or from the --xx-rev
+revision) -- against the English at rev_a (the translation is expected
+to be synchronized with it) and at rev_b. For each touched English element,
+the report shows its translated counterpart.
+The structure differences of the English at rev_b and the translation
+are listed at the end. The report is written
+to root_aux_dir/xx_aux/pass1rev_changes.txt.
+'''
+
+import align
+import api
+import argparse
+import doc
+import gen
+import os
+import report
+import subprocess
+
+
+class GitObjects:
+    '''Reads the trees and the blobs of the local git repository.
+
+       The blobs are read by one `git cat-file --batch` process
+       that is started when first needed.'''
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.proc = None
+
+
+    def git(self, *args):
+        '''Runs the git command in the repo. Returns the output (bytes).'''
+        return subprocess.run(('git', '-C', self.repo) + args, check=True,
+                              stdout=subprocess.PIPE).stdout
+
+
+    def revision(self, rev):
+        '''Returns the commit id for the revision.'''
+        return self.git('rev-parse', '--verify', rev + '^{commit}').decode('ascii').strip()
+
+
+    def tree(self, rev, text_dir):
+        '''Returns the dict relname -> blob id of the sources in the text_dir.
+
+           The relname has the form subdir/source_file.markdown (the files
+           one subdirectory level below, as gen.sourceFiles() yields).'''
+        result = {}
+        out = self.git('ls-tree', '-r', '-z', rev, '--', text_dir + '/')
+        for entry in out.split(b'\0'):
+            if not entry:
+                continue
+            meta, path = entry.split(b'\t', 1)
+            mode, objtype, objid = meta.split()
+            parts = path.decode('utf-8').split('/')
+            if objtype == b'blob' and len(parts) == 3 and parts[0] == text_dir:
+                result['/'.join(parts[1:])] = objid.decode('ascii')
+        return result
+
+
+    def blob(self, objid):
+        '''Returns the content of the blob (bytes).'''
+        if self.proc is None:
+            self.proc = subprocess.Popen(
+                ['git', '-C', self.repo, 'cat-file', '--batch'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.proc.stdin.write(objid.encode('ascii') + b'\n')
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().split()
+        if len(header) != 3 or header[1] != b'blob':
+            raise ValueError('{}: not a blob in {}'.format(objid, self.repo))
+        data = self.proc.stdout.read(int(header[2]))
+        self.proc.stdout.read(1)    # the newline after the content
+        return data
+
+
+    def sources(self, tree, chapters):
+        '''Returns the dict relname -> content of the files of the chapters.'''
+        return {relname: self.blob(objid) for relname, objid in tree.items()
+                if chapterOf(relname) in chapters}
+
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.stdout.close()
+            self.proc.wait()
+            self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def chapterOf(relname):
+    '''Returns the chapter (the subdirectory) of the source file.'''
+    return relname.split('/')[0]
+
+
+def changedChapters(tree_a, tree_b):
+    '''Returns the set of chapters with a changed, added, or removed file.'''
+    return {chapterOf(relname) for relname in set(tree_a) | set(tree_b)
+            if tree_a.get(relname) != tree_b.get(relname)}
+
+
+def workingTreeSources(text_dir, chapters):
+    '''Returns the dict relname -> content of the files of the chapters.'''
+    sources = {}
+    for chapter in chapters:
+        subdir = os.path.join(text_dir, chapter)
+        if os.path.isdir(subdir):
+            for name in os.listdir(subdir):
+                fname = os.path.join(subdir, name)
+                if os.path.isfile(fname):
+                    with open(fname, 'rb') as f:
+                        sources[chapter + '/' + name] = f.read()
+    return sources
+
+
+class Change:
+    '''Change of one English element between the revisions.
+
+       The kind is 'changed', 'added', 'deleted', or 'moved'. The old
+       is the element at rev_a (None when added), the new is the element
+       at rev_b (None when deleted).'''
+
+    __slots__ = ('kind', 'old', 'new')
+
+    def __init__(self, kind, old, new):
+        self.kind = kind
+        self.old = old
+        self.new = new
+
+
+def digestedElements(parser, sources):
+    '''Returns the elements of the sources with the digests (as in pass1).'''
+    doclines = [doc.Line(relname, lineno, line)
+                for relname, lineno, line in gen.mappingLines(sources)]
+    elements = parser.buildElements(doclines)
+    for e, digest in zip(elements, parser.elementDigests(elements, parser.digest_name)):
+        e.sha = digest
+    return elements
+
+
+def elementChanges(old_elements, new_elements):
+    '''Returns the list of Change objects for the element sequences.
+
+       The sequences are aligned by the digests. In the replaced part,
+       the elements are paired in the order as changed; the rest is added
+       or deleted. The deleted element whose content appears as added
+       elsewhere was moved. (The element whose content appears on the other
+       side is not paired as changed -- it is the candidate for moving.)
+       The empty elements are not reported.'''
+    opcodes = [op for op in align.opcodes([e.sha for e in old_elements],
+                                          [e.sha for e in new_elements])
+               if op[0] != 'equal']
+    old_shas = {e.sha for tag, i1, i2, j1, j2 in opcodes for e in old_elements[i1:i2]}
+    new_shas = {e.sha for tag, i1, i2, j1, j2 in opcodes for e in new_elements[j1:j2]}
+
+    changes = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        old = old_elements[i1:i2]
+        new = new_elements[j1:j2]
+        paired_old = [o for o in old if o.sha not in new_shas]
+        paired_new = [e for e in new if e.sha not in old_shas]
+        n = min(len(paired_old), len(paired_new))
+        counterpart = {id(o): e for o, e in zip(paired_old[:n], paired_new[:n])}
+        for o in old:
+            e = counterpart.get(id(o))
+            changes.append(Change('deleted', o, None) if e is None
+                           else Change('changed', o, e))
+        paired = {id(e) for e in paired_new[:n]}
+        changes.extend(Change('added', None, e) for e in new if id(e) not in paired)
+
+    # The same content deleted at one place and added at another one.
+    added = {}
+    for change in changes:
+        if change.kind == 'added':
+            added.setdefault(change.new.sha, []).append(change)
+    result = []
+    for change in changes:
+        if change.kind == 'deleted' and added.get(change.old.sha):
+            moved = added[change.old.sha].pop(0)
+            moved.kind = 'moved'
+            moved.old = change.old
+        else:
+            result.append(change)
+    return [change for change in result
+            if (change.new or change.old).type != 'empty']
+
+
+def position(e):
+    '''Returns the readable position of the element.'''
+    return '{}/{}'.format(e.fname[:2], e.lineno())
+
+
+def run(repo, rev_a, rev_b, lang, root_aux_dir, xx_rev=None,
+        root_definitions_dir=None):
+    '''Reports the changes between the revisions and checks the chapters.
+
+       Returns the lines for displaying.'''
+    with GitObjects(repo) as git:
+        commit_a = git.revision(rev_a)
+        commit_b = git.revision(rev_b)
+        tree_a = git.tree(commit_a, 'en')
+        tree_b = git.tree(commit_b, 'en')
+        chapters = changedChapters(tree_a, tree_b)
+        old_sources = git.sources(tree_a, chapters)
+        new_sources = git.sources(tree_b, chapters)
+        if xx_rev is not None:
+            xx_sources = git.sources(git.tree(git.revision(xx_rev), lang), chapters)
+        else:
+            xx_sources = workingTreeSources(os.path.join(repo, lang), chapters)
+
+    # The translation was synchronized with the older English (presumably).
+    # Its elements aligned with the older ones are the counterparts
+    # of the changed elements (meaningful only when in sync). The newer
+    # English is checked against the translation -- the differences
+    # show what is to be translated.
+    old_result = api.check(lang, old_sources, xx_sources, root_definitions_dir)
+    result = api.check(lang, new_sources, xx_sources, root_definitions_dir)
+    counterparts = {}
+    if old_result.sync:
+        counterparts = {position(en_e): xx_e for en_e, xx_e in old_result.pairs()}
+
+    # The elements of both revisions digested as for the language.
+    parser = api.SourceParser(lang, {}, {}, root_definitions_dir)
+    changes = elementChanges(digestedElements(parser, old_sources),
+                             digestedElements(parser, new_sources))
+
+    counts = {}
+    xx_aux_dir = os.path.join(os.path.realpath(root_aux_dir), lang + '_aux')
+    if not os.path.isdir(xx_aux_dir):
+        os.makedirs(xx_aux_dir)
+    fname = os.path.join(xx_aux_dir, 'pass1rev_changes.txt')
+    with report.Reports().open(fname) as f:
+        f.write('en {} -> {}, chapters: {}\n'.format(
+                commit_a[:8], commit_b[:8], ', '.join(sorted(chapters))))
+        if not old_result.sync:
+            f.write('structure of {} is DIFFERENT from en {}'
+                    ' -- the counterparts are not shown\n'.format(lang, commit_a[:8]))
+
+        for change in changes:
+            counts[change.kind] = counts.get(change.kind, 0) + 1
+            if change.new is not None:
+                f.write('\n{} -- en {}{}:\n'.format(
+                        change.kind, position(change.new),
+                        '' if change.old is None
+                        else ' (was {})'.format(position(change.old))))
+            else:
+                f.write('\n{} -- en {} (at {}):\n'.format(
+                        change.kind, position(change.old), commit_a[:8]))
+            if change.old is not None and change.kind != 'moved':
+                f.write('\told:\t{}\n'.format(change.old.value()))
+            if change.new is not None:
+                f.write('\tnew:\t{}\n'.format(change.new.value()))
+            if change.old is not None:
+                xx_e = counterparts.get(position(change.old))
+                if xx_e is not None:
+                    f.write('\t{} {}:\t{}\n'.format(lang, position(xx_e),
+                                                    xx_e.value()))
+
+        # Where the newer English and the translation differ now.
+        for finding in result.structDiffs():
+            f.write('\n{} -- en {}, {} {}\n'.format(
+                    {'missing': 'missing in ' + lang,
+                     'extra': 'extra in ' + lang,
+                     'different': 'different'}[finding.fields['kind']],
+                    ', '.join(position(e) for e in finding.en) or '-', lang,
+                    ', '.join(position(e) for e in finding.xx) or '-'))
+
+    lines = [parser.short_name(fname)]
+    lines.append(('-'*30) + ' en {} -> {}: {} chapters changed'.format(
+                 commit_a[:8], commit_b[:8], len(chapters)))
+    for kind in ('changed', 'added', 'deleted', 'moved'):
+        if counts.get(kind):
+            lines.append(('-'*30) + ' elements {}: {}'.format(kind, counts[kind]))
+    lines.extend(line for line in result.log_info if line.startswith('-'*30))
+    return lines
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('repo', help='local clone of the progit repository')
+    ap.add_argument('rev_a', help='older revision of the English original')
+    ap.add_argument('rev_b', help='newer revision of the English original')
+    ap.add_argument('root_aux_dir', help='root of the auxiliary directories with reports')
+    ap.add_argument('lang', help='target language (cs, fr, ...)')
+    ap.add_argument('--xx-rev', help='revision of the translation '
+                                     '(default: the working tree of the repo)')
+    args = ap.parse_args()
+
+    print('\n\t'.join(run(args.repo, args.rev_a, args.rev_b, args.lang,
+                          args.root_aux_dir, args.xx_rev)))
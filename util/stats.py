@@ -0,0 +1,93 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Instrumentation of the parser phases (time, counters, memory).'''
+
+import contextlib
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+
+def peakMemory():
+    '''Returns the peak resident memory of the process in bytes.
+
+       None is returned when it cannot be found out (on Windows).'''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # kB on Linux
+
+
+class Stats:
+    '''Collects the wall and CPU time and the counters of the phases.
+
+       The phase is measured by the `with stats.phase(name):` block.
+       The code of the phase adds to the counters by count() -- say
+       the processed 'lines' and 'elements', 'bytes_read', 'regex_calls'.
+       Each quantity is counted only by the phase that produces it (say
+       the lines when read, the elements when built); this way, the totals
+       are not multiplied.
+       The bytes written to the reports and the peak memory are captured
+       when the phase ends.'''
+
+    def __init__(self, reports):
+        self.reports = reports  # report.Reports of the parser (bytes written)
+        self.phases = []        # dicts of the finished phases (in the order)
+        self.current = None     # dict of the running phase
+
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Measures the phase of the name (context manager).'''
+        record = {'phase': name}
+        outer = self.current
+        self.current = record
+        written = self.reports.bytesWritten()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['bytes_written'] = self.reports.bytesWritten() - written
+            record['peak_memory'] = peakMemory()
+            self.phases.append(record)
+            self.current = outer
+
+
+    def count(self, name, n=1):
+        '''Adds n to the counter of the running phase (if any).'''
+        if self.current is not None:
+            self.current[name] = self.current.get(name, 0) + n
+
+
+    def asDict(self):
+        '''Returns the collected values as a structure of dicts and lists.
+
+           The 'total' sums the times and the counters of all phases,
+           the peak memory is the maximum.'''
+        total = {}
+        for record in self.phases:
+            for name, value in record.items():
+                if name == 'phase' or value is None:
+                    continue
+                if name == 'peak_memory':
+                    total[name] = max(total.get(name, 0), value)
+                else:
+                    total[name] = total.get(name, 0) + value
+        return {'phases': [dict(record) for record in self.phases],
+                'total': total}
+
+
+    def dump(self, fname):
+        '''Writes the values to the JSON file (through the reports).'''
+        with self.reports.open(fname) as f:
+            f.write(json.dumps(self.asDict(), indent=2))
+            f.write('\n')
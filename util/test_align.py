@@ -0,0 +1,188 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of align.py (run: python -m unittest test_align).'''
+
+import align
+import random
+import unittest
+import unittest.mock
+
+
+class OpcodesTest(unittest.TestCase):
+
+    def checkOpcodes(self, a, b, score=None):
+        '''Checks that the opcodes cover both sequences exactly once.
+
+           The ranges follow each other without gaps, the equal blocks
+           have the same keys, and the tags fit the ranges.
+           Returns the opcodes.'''
+        ops = align.opcodes(a, b, score)
+        i = j = 0
+        for tag, i1, i2, j1, j2 in ops:
+            self.assertEqual((i1, j1), (i, j), ops)
+            if tag == 'equal':
+                self.assertEqual(i2 - i1, j2 - j1)
+                self.assertEqual(a[i1:i2], b[j1:j2])
+            elif tag == 'replace':
+                self.assertTrue(i1 < i2 and j1 < j2)
+            elif tag == 'delete':
+                self.assertTrue(i1 < i2 and j1 == j2)
+            else:
+                self.assertEqual(tag, 'insert')
+                self.assertTrue(i1 == i2 and j1 < j2)
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(a), len(b)), ops)
+
+        # The neighbouring equal blocks are joined.
+        for op1, op2 in zip(ops, ops[1:]):
+            self.assertFalse(op1[0] == op2[0] == 'equal', ops)
+        return ops
+
+
+    def test_empty(self):
+        self.assertEqual(self.checkOpcodes([], []), [])
+        self.assertEqual(self.checkOpcodes([], ['a', 'b']),
+                         [('insert', 0, 0, 0, 2)])
+        self.assertEqual(self.checkOpcodes(['a', 'b'], []),
+                         [('delete', 0, 2, 0, 0)])
+
+
+    def test_identical(self):
+        a = ['title', 'para', 'empty', 'code', 'code', 'empty', 'para']
+        self.assertEqual(self.checkOpcodes(a, list(a)),
+                         [('equal', 0, len(a), 0, len(a))])
+
+
+    def test_insertion(self):
+        a = ['h1', 'p1', 'p2', 'p3']
+        b = ['h1', 'p1', 'x1', 'x2', 'p2', 'p3']
+        self.assertEqual(self.checkOpcodes(a, b),
+                         [('equal', 0, 2, 0, 2), ('insert', 2, 2, 2, 4),
+                          ('equal', 2, 4, 4, 6)])
+
+
+    def test_deletion(self):
+        a = ['h1', 'p1', 'x1', 'x2', 'p2', 'p3']
+        b = ['h1', 'p1', 'p2', 'p3']
+        self.assertEqual(self.checkOpcodes(a, b),
+                         [('equal', 0, 2, 0, 2), ('delete', 2, 4, 2, 2),
+                          ('equal', 4, 6, 2, 4)])
+
+
+    def test_replacement(self):
+        a = ['h1', 'p1', 'p2', 'p3']
+        b = ['h1', 'x1', 'p3']
+        self.assertEqual(self.checkOpcodes(a, b),
+                         [('equal', 0, 1, 0, 1), ('replace', 1, 3, 1, 2),
+                          ('equal', 3, 4, 2, 3)])
+
+
+    def test_moved_block(self):
+        # The longer block stays aligned, the moved one is deleted
+        # at one place and inserted at the other.
+        a = ['m1', 'm2', 'p1', 'p2', 'p3', 'p4']
+        b = ['p1', 'p2', 'p3', 'p4', 'm1', 'm2']
+        self.assertEqual(self.checkOpcodes(a, b),
+                         [('delete', 0, 2, 0, 0), ('equal', 2, 6, 0, 4),
+                          ('insert', 6, 6, 4, 6)])
+
+
+    def test_repeated_keys(self):
+        # The code and empty elements repeat -- no unique anchors among them.
+        a = ['code', 'empty', 'code', 'empty', 'code', 'empty']
+        b = ['code', 'empty', 'empty', 'code', 'empty']
+        ops = self.checkOpcodes(a, b)
+        matched = sum(i2 - i1 for tag, i1, i2, j1, j2 in ops if tag == 'equal')
+        self.assertEqual(matched, 5)       # the shortest edit script
+
+        # The unique keys anchor the repeated ones between them.
+        a = ['h1', 'empty', 'code', 'empty', 'h2', 'empty', 'code', 'empty']
+        b = ['h1', 'empty', 'code', 'code', 'empty', 'h2', 'empty', 'empty']
+        self.checkOpcodes(a, b)
+        pairs = align.matchingPairs(a, b)
+        self.assertIn((0, 0), pairs)
+        self.assertIn((4, 5), pairs)
+
+
+    def test_score(self):
+        # The paragraph inserted in the run of paragraphs can be placed
+        # anywhere in the run with the same cost. The score of the pairs
+        # (here the equal words) decides.
+        a = ['h1', 'p:a', 'p:b', 'p:c', 'p:d', 'h2']
+        b = ['h1', 'p:a', 'p:new', 'p:b', 'p:c', 'p:d', 'h2']
+        key = lambda s: s.split(':')[0]
+        a_keys = [key(s) for s in a]
+        b_keys = [key(s) for s in b]
+        score = lambda i, j: int(a[i] == b[j])
+        ops = self.checkOpcodes(a_keys, b_keys, score)
+        self.assertEqual(ops, [('equal', 0, 2, 0, 2), ('insert', 2, 2, 2, 3),
+                               ('equal', 2, 6, 3, 7)])
+
+        # The same for the deletion (the sides swapped), and without
+        # the score the cost is the same.
+        ops = self.checkOpcodes(b_keys, a_keys, lambda i, j: score(j, i))
+        self.assertEqual(ops, [('equal', 0, 2, 0, 2), ('delete', 2, 3, 2, 2),
+                               ('equal', 3, 7, 2, 6)])
+        self.assertEqual(len(self.checkOpcodes(a_keys, b_keys)), 3)
+
+        # On a tie, the gap stays where it was found.
+        self.assertEqual(align.opcodes(a_keys, b_keys, lambda i, j: 0),
+                         align.opcodes(a_keys, b_keys))
+
+        # The random keys with the score -- still a valid and minimal alignment.
+        rnd = random.Random(5)
+        for n in range(200):
+            a = [rnd.choice('ppe') + rnd.choice('xyz') for i in range(rnd.randrange(30))]
+            b = list(a)
+            pos = rnd.randrange(len(b) + 1)
+            b[pos:pos] = [rnd.choice('ppe') + rnd.choice('xyz')
+                          for i in range(rnd.randrange(1, 4))]
+            a_keys = [s[0] for s in a]
+            b_keys = [s[0] for s in b]
+            ops = self.checkOpcodes(a_keys, b_keys, lambda i, j: int(a[i] == b[j]))
+            self.assertEqual(len(align.matchingPairs(a_keys, b_keys)),
+                             sum(i2 - i1 for tag, i1, i2, j1, j2 in ops if tag == 'equal'))
+
+
+    def test_cutoff(self):
+        # With the cost limit of one edit, the middle snake search gives up
+        # at once; the alignment is still valid (though not minimal).
+        rnd = random.Random(7)
+        with unittest.mock.patch.object(align, '_costLimit', lambda n, m: 1):
+            for n in range(50):
+                a = [rnd.choice('abc') for i in range(rnd.randrange(30))]
+                b = [rnd.choice('abc') for i in range(rnd.randrange(30))]
+                self.checkOpcodes(a, b)
+
+        # Heavily diverging sequences hit the real limit.
+        a = [rnd.choice('ab') for i in range(3000)]
+        b = [rnd.choice('ab') for i in range(3000)]
+        self.checkOpcodes(a, b)
+
+
+    def test_random(self):
+        rnd = random.Random(1)
+        for n in range(300):
+            a = [rnd.choice('abcdefgh') for i in range(rnd.randrange(40))]
+            b = list(a)
+            for k in range(rnd.randrange(6)):
+                pos = rnd.randrange(len(b) + 1)
+                if rnd.random() < 0.5 and pos < len(b):
+                    del b[pos:pos + rnd.randrange(1, 4)]
+                else:
+                    b[pos:pos] = [rnd.choice('abcxyz') for i in range(rnd.randrange(1, 4))]
+            self.checkOpcodes(a, b)
+
+
+    def test_long(self):
+        # No recursion limit is hit for the long sequences.
+        a = ['empty', 'para', 'code'] * 35000
+        b = list(a)
+        for pos in range(100, len(b), 997):
+            b[pos] = 'changed'
+        self.checkOpcodes(a, b)
+
+
+if __name__ == '__main__':
+    unittest.main()
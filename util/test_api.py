@@ -0,0 +1,106 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of api.py (run: python -m unittest test_api).'''
+
+import api
+import bench
+import json
+import os
+import pass1
+import pass2
+import shutil
+import tempfile
+import unittest
+
+
+EN = '''## Chapter 1 ##
+
+The `git commit` command records the snapshot.
+
+	$ git commit -m "first"
+
+Insert 18333fig0101.png
+
+Figure 1-1. The snapshot.
+'''
+
+XX = '''## Kapitola 1 ##
+
+Příkaz git commit zaznamená snímek.
+
+	$ git commit -m "first"
+
+Insert 18333fig0101.png
+
+Obrázek 1-1. Snímek.
+'''
+
+
+class CheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.defs = os.path.join(self.dir, 'definitions')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def test_mapping(self):
+        cwd = sorted(os.listdir('.'))
+        result = api.check('xx', {'01-chapter1/01-chapter1.markdown': EN},
+                           {'01-chapter1/01-chapter1.markdown': XX.encode('utf-8')},
+                           self.defs)
+        self.assertEqual(sorted(os.listdir('.')), cwd)     # nothing written here
+        self.assertEqual(os.listdir(self.dir), ['definitions'])
+
+        self.assertTrue(result.sync)
+        self.assertEqual(result.structDiffs(), [])
+        self.assertEqual(len(result.pairs()), len(result.en_elements))
+        findings = result.byCheck('backticks')
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0].en[0].value(),
+                         'The `git commit` command records the snapshot.')
+        self.assertEqual(findings[0].xx[0].lineno(), '3')
+        self.assertIn(os.path.join('xx_aux', 'pass2backticks.txt'), result.reports)
+        self.assertTrue(result.content_records)
+
+        # The paragraph missing in the translation.
+        xx = XX.replace('Příkaz git commit zaznamená snímek.\n\n', '')
+        result = api.check('xx', {'01-chapter1/01-chapter1.markdown': EN},
+                           {'01-chapter1/01-chapter1.markdown': xx}, self.defs)
+        self.assertFalse(result.sync)
+        diffs = result.structDiffs()
+        self.assertEqual([finding.fields['kind'] for finding in diffs], ['missing'])
+        self.assertEqual(diffs[0].en[0].lineno(), '3')
+
+
+    def test_same_as_scripts(self):
+        # The reports and the findings are the same as written by the scripts.
+        src = os.path.join(self.dir, 'src')
+        defs = os.path.join(src, 'definitions')
+        bench.generateCorpus(src, chapters=3, sections=5, divergence=0.1)
+        aux = os.path.join(self.dir, 'aux')
+        parser1 = pass1.Parser('xx', src, aux, False, root_definitions_dir=defs)
+        parser1.run()
+        pass2.Parser(parser1).run()
+
+        result = api.check('xx', os.path.join(src, 'en'), os.path.join(src, 'xx'),
+                           defs, disabled_reports=())
+        for name, text in result.reports.items():
+            if not name.endswith('.json'):
+                with open(os.path.join(aux, name), encoding='utf-8', newline='') as f:
+                    self.assertEqual(f.read(), text, name)
+        lines = []
+        for name in ('pass1findings.jsonl', 'pass2findings.jsonl'):
+            with open(os.path.join(aux, 'xx_aux', name), encoding='utf-8') as f:
+                lines.extend(f.read().splitlines())
+        self.assertEqual([json.loads(line) for line in lines],
+                         [finding.asDict() for finding in result.findings])
+        self.assertTrue(result.structDiffs())
+
+
+if __name__ == '__main__':
+    unittest.main()
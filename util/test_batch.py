@@ -0,0 +1,91 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of batch.py (run: python -m unittest test_batch).'''
+
+import batch
+import bench
+import filecmp
+import os
+import pass1
+import pass2
+import shutil
+import tempfile
+import unittest
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'src')
+
+        # The same translation as xx and yy; yy uses another content digest.
+        for lang in ('xx', 'yy'):
+            bench.generateCorpus(self.src, lang, chapters=3, sections=4,
+                                 divergence=0.2, extras=2, snippets=2)
+        with open(os.path.join(self.src, 'definitions', 'yy', 'content_digest.txt'),
+                  'w') as f:
+            f.write('blake2b-8\n')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def definitions(self, name):
+        '''Returns the copy of the definitions (pass1 writes the content_sha there).'''
+        d = os.path.join(self.dir, name)
+        shutil.copytree(os.path.join(self.src, 'definitions'), d)
+        return d
+
+
+    def checkSameDirs(self, dir1, dir2):
+        cmp = filecmp.dircmp(dir1, dir2, ignore=['pass1stats.json', 'pass2stats.json'])
+        self.assertTrue(cmp.common_files, dir2)
+        self.assertEqual(cmp.left_only + cmp.right_only, [], dir2)
+        match, mismatch, errors = filecmp.cmpfiles(dir1, dir2, cmp.common_files,
+                                                   shallow=False)
+        self.assertEqual(mismatch + errors, [], dir2)
+
+
+    def test_same_as_serial(self):
+        serial_aux = os.path.join(self.dir, 'serial')
+        serial_defs = self.definitions('serial_defs')
+        for lang in ('xx', 'yy'):
+            parser1 = pass1.Parser(lang, self.src, serial_aux, False,
+                                   root_definitions_dir=serial_defs)
+            parser1.run()
+            pass2.Parser(parser1).run()
+
+        batch_aux = os.path.join(self.dir, 'batch')
+        batch_defs = self.definitions('batch_defs')
+        result = list(batch.run(['xx', 'yy'], self.src, batch_aux, 2, False,
+                                root_definitions_dir=batch_defs))
+        self.assertEqual([lang for lang, msg1, msg2 in result], ['en', 'xx', 'yy'])
+
+        # The English elements of yy were digested again in the parent;
+        # the reports of both languages are the same as from the separate runs.
+        for lang in ('xx', 'yy'):
+            self.checkSameDirs(os.path.join(serial_aux, lang + '_aux'),
+                               os.path.join(batch_aux, lang + '_aux'))
+            self.checkSameDirs(os.path.join(serial_defs, lang),
+                               os.path.join(batch_defs, lang))
+
+
+    def test_redigested_english(self):
+        parser = pass1.Parser('xx', self.src, os.path.join(self.dir, 'aux'), False,
+                              root_definitions_dir=self.definitions('defs'))
+        parser.loadEnglish()
+        elements, sha_to_elem = parser.redigestedEnglish('blake2b-8')
+        self.assertEqual([e.value() for e in elements],
+                         [e.value() for e in parser.en_elements])
+        self.assertTrue(all(len(e.sha) == 8 for e in elements))
+        self.assertTrue(all(sha_to_elem[e.sha].sha == e.sha for e in elements))
+
+        # The loaded elements keep their digests.
+        self.assertTrue(all(len(e.sha) == 20 for e in parser.en_elements))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of bench.py (run: python -m unittest test_bench).'''
+
+import argparse
+import bench
+import contextlib
+import io
+import json
+import os
+import pass1
+import shutil
+import tempfile
+import unittest
+
+
+class CorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def texts(self, root_dir):
+        '''Returns the dict relative name -> content of the generated files.'''
+        result = {}
+        for path, dirs, files in os.walk(root_dir):
+            for name in files:
+                fname = os.path.join(path, name)
+                with open(fname, 'rb') as f:
+                    result[os.path.relpath(fname, root_dir)] = f.read()
+        return result
+
+
+    def structureSame(self, root_dir):
+        '''Runs pass1 on the corpus, returns True if the structure is the same.'''
+        parser = pass1.Parser('xx', root_dir, os.path.join(self.dir, 'aux'), False,
+                              root_definitions_dir=os.path.join(root_dir, 'definitions'))
+        parser.run()
+        return 'structure of the book is the same' in '\n'.join(parser.log_info)
+
+
+    def test_reproducible(self):
+        a = os.path.join(self.dir, 'a')
+        summary = bench.generateCorpus(a, chapters=2, sections=5, seed=3)
+        self.assertEqual(bench.generateCorpus(os.path.join(self.dir, 'b'),
+                                              chapters=2, sections=5, seed=3),
+                         summary)
+        self.assertEqual(self.texts(os.path.join(self.dir, 'b')), self.texts(a))
+        bench.generateCorpus(os.path.join(self.dir, 'c'), chapters=2, sections=5, seed=4)
+        self.assertNotEqual(self.texts(os.path.join(self.dir, 'c')), self.texts(a))
+
+        # The summary fits the files.
+        texts = self.texts(a)
+        en_lines = sum(text.count(b'\n') for name, text in texts.items()
+                       if name.startswith('en' + os.sep))
+        self.assertEqual(summary['en_lines'], en_lines)
+        self.assertEqual(summary['bytes'], sum(len(text) for name, text in texts.items()
+                                               if not name.startswith('definitions')))
+
+
+    def test_divergence(self):
+        # The translator notes and the translated snippets are defined,
+        # so only the divergence makes the structures different.
+        root_dir = os.path.join(self.dir, 'same')
+        summary = bench.generateCorpus(root_dir, chapters=2, sections=8,
+                                       divergence=0.0, extras=3, snippets=3)
+        self.assertEqual((summary['extras'], summary['snippets']), (3, 3))
+        self.assertTrue(self.structureSame(root_dir))
+
+        root_dir = os.path.join(self.dir, 'different')
+        summary = bench.generateCorpus(root_dir, chapters=2, sections=8, divergence=0.5)
+        self.assertGreater(summary['divergences'], 0)
+        self.assertFalse(self.structureSame(root_dir))
+
+
+    def test_pipeline(self):
+        fname = os.path.join(self.dir, 'result.json')
+        args = argparse.Namespace(src=None, chapters=2, sections=3, seed=1,
+                                  mix='60,15,10,15', divergence=0.02, extras=2,
+                                  snippets=2, repeat=1, jobs=1, cache=True,
+                                  json=fname)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            bench.benchPipeline(args)
+            bench.benchCompare(fname, fname)
+        self.assertIn('end-to-end', out.getvalue())
+
+        with open(fname, encoding='utf-8') as f:
+            result = json.load(f)
+        self.assertEqual(result['corpus']['chapters'], 2)
+        self.assertTrue(result['cache'])
+        self.assertGreater(result['lines'], 0)
+        phases = [record['phase'] for record in result['phases']]
+        self.assertIn('pass1.loadDoclineLists', phases)
+        self.assertIn('pass2.checks', phases)
+
+
+if __name__ == '__main__':
+    unittest.main()
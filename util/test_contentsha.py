@@ -0,0 +1,201 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of contentsha.py (run: python -m unittest test_contentsha).'''
+
+import contentsha
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+
+def sampleRecords(count, digest_size=20, seed=9):
+    '''Returns the list of records with repeated positions and digests.'''
+    rnd = random.Random(seed)
+    digests = [rnd.randbytes(digest_size) for i in range(count // 3 + 1)]
+    records = []
+    for i in range(count):
+        ch = '{:02}'.format(rnd.randrange(1, 10))
+        first = rnd.randrange(1, 2000)
+        last = first + rnd.choice((0, 0, 0, 2))
+        en = '{}/{}'.format(ch, first) if first == last \
+             else '{}/{}-{}'.format(ch, first, last)
+        xx = '{}/{}'.format(ch, first + rnd.randrange(5))
+        records.append((en, xx, rnd.choice(digests), rnd.choice(digests)))
+    return records
+
+
+class ContentShaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def fname(self, name):
+        return os.path.join(self.dir, name)
+
+
+    def writeRecords(self, fname, records):
+        with contentsha.writer(fname) as w:
+            for rec in records:
+                w.write(*rec)
+
+
+    def checkSame(self, records, store):
+        '''Checks the store gives the same answers as the records.'''
+        by_position = {}
+        by_digest = {}
+        for en, xx, en_digest, xx_digest in records:
+            by_position[en] = (en_digest, xx_digest)    # the last wins
+            by_digest.setdefault(en_digest, set()).add(xx_digest)
+        self.assertEqual(list(store), records)
+        for en, digests in by_position.items():
+            self.assertEqual(store.lookup(en), digests)
+        for en_digest, xx_digests in by_digest.items():
+            self.assertEqual(set(store.xxDigests(en_digest)), xx_digests)
+
+
+    def test_roundtrip(self):
+        records = sampleRecords(3000)
+        txt = self.fname('content_sha.txt')
+        self.writeRecords(txt, records)
+        contentsha.convert(txt, self.fname('content_sha.bin'))
+        contentsha.convert(self.fname('content_sha.bin'), self.fname('back.txt'))
+        with open(txt, 'rb') as f1, open(self.fname('back.txt'), 'rb') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+        for name in ('content_sha.txt', 'content_sha.bin'):
+            store = contentsha.load(self.fname(name))
+            try:
+                self.assertEqual(store.digest_size, 20)
+                self.checkSame(records, store)
+            finally:
+                store.close()
+
+
+    def test_empty(self):
+        for name in ('empty.txt', 'empty.bin'):
+            self.writeRecords(self.fname(name), [])
+            store = contentsha.load(self.fname(name))
+            try:
+                self.assertEqual(list(store), [])
+                self.assertIsNone(store.digest_size)
+                self.assertIsNone(store.lookup('01/1'))
+                self.assertFalse(store.xxDigests(b'\0' * 20))
+            finally:
+                store.close()
+
+
+    def test_missing_keys(self):
+        records = sampleRecords(200)
+        for name in ('content_sha.txt', 'content_sha.bin'):
+            self.writeRecords(self.fname(name), records)
+            store = contentsha.load(self.fname(name))
+            try:
+                for en in ('99/1', '01/999999', '01/5-4', 'bad', '123/4'):
+                    self.assertIsNone(store.lookup(en))
+                self.assertFalse(store.xxDigests(b'\xff' * 20))
+                self.assertFalse(store.xxDigests(b'\xff' * 8))
+            finally:
+                store.close()
+
+
+    def test_digest_mismatch(self):
+        # The records of SHA-1 do not fit the blake2b-8 digest of the language
+        # (pass1 compares the sizes and suggests the migrate command).
+        records = sampleRecords(20)
+        for name in ('content_sha.txt', 'content_sha.bin'):
+            self.writeRecords(self.fname(name), records)
+            store = contentsha.load(self.fname(name))
+            try:
+                self.assertEqual(store.digest_size,
+                                 contentsha.digestConstructor('sha1')().digest_size)
+                self.assertNotEqual(store.digest_size,
+                                    contentsha.digestConstructor('blake2b-8')().digest_size)
+            finally:
+                store.close()
+
+        # The digests of different sizes cannot be mixed.
+        mixed = records[:5] + sampleRecords(5, digest_size=8)
+        with self.assertRaises(ValueError):
+            self.writeRecords(self.fname('mixed.bin'), mixed)
+        self.writeRecords(self.fname('mixed.txt'), mixed)
+        with self.assertRaises(ValueError):
+            contentsha.load(self.fname('mixed.txt'))
+
+
+    def test_digest_name(self):
+        self.assertEqual(contentsha.digestName(self.dir), 'sha1')
+        with open(self.fname('content_digest.txt'), 'w') as f:
+            f.write('blake2b-8\n')
+        self.assertEqual(contentsha.digestName(self.dir), 'blake2b-8')
+        self.assertEqual(contentsha.digestConstructor('blake2b-8')(b'x').digest(),
+                         hashlib.blake2b(b'x', digest_size=8).digest())
+
+        for name in ('md5', 'blake2b-0', 'blake2b-65', 'blake2b-'):
+            with self.assertRaises(ValueError):
+                contentsha.digestConstructor(name)
+        with open(self.fname('content_digest.txt'), 'w') as f:
+            f.write('md5\n')
+        with self.assertRaises(ValueError):
+            contentsha.digestName(self.dir)
+
+
+    def test_corrupted(self):
+        # The truncated binary file -- the error names the file.
+        bin_fname = self.fname('content_sha.bin')
+        self.writeRecords(bin_fname, sampleRecords(10))
+        with open(bin_fname, 'r+b') as f:
+            f.truncate(os.path.getsize(bin_fname) - 1)
+        with self.assertRaisesRegex(ValueError, 'content_sha.bin.*truncated'):
+            contentsha.load(bin_fname)
+
+        # Another version of the format.
+        self.writeRecords(bin_fname, sampleRecords(10))
+        with open(bin_fname, 'r+b') as f:
+            f.seek(4)
+            f.write(b'\x00\x63')
+        with self.assertRaisesRegex(ValueError, 'content_sha.bin.*version 99'):
+            contentsha.load(bin_fname)
+
+
+    def test_short(self):
+        # The files shorter than the header, or without the magic, are not
+        # binary at all: BinaryContentSha names the file, load() reads
+        # them as the text.
+        bin_fname = self.fname('content_sha.bin')
+        for content in (b'', b'CSHA', b'XXXX' + bytes(12)):
+            with open(bin_fname, 'wb') as f:
+                f.write(content)
+            with self.assertRaisesRegex(contentsha.NotBinaryError, 'content_sha.bin'):
+                contentsha.BinaryContentSha(bin_fname)
+
+        with open(bin_fname, 'wb') as f:
+            f.write(b'')
+        store = contentsha.load(bin_fname)
+        self.assertEqual(list(store), [])
+        self.assertIsNone(store.lookup('01/1'))
+
+        # The text records saved under the .bin name.
+        records = sampleRecords(30)
+        self.writeRecords(self.fname('content_sha.txt'), records)
+        shutil.copy(self.fname('content_sha.txt'), bin_fname)
+        store = contentsha.load(bin_fname)
+        self.checkSame(records, store)
+
+        # The garbage is not taken as the text either.
+        with open(bin_fname, 'wb') as f:
+            f.write(b'XXXX' + bytes(12))
+        with self.assertRaisesRegex(ValueError, 'content_sha.bin:1'):
+            contentsha.load(bin_fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
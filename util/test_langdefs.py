@@ -0,0 +1,124 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of langdefs.py (run: python -m unittest test_langdefs).'''
+
+import langdefs
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+
+EXTRAS = '''Translator note: first.
+=====
+Translator note: second.
+continued
+=====
+'''
+
+SNIPPETS = '''\t# the comment
+\t$ git status
+-----
+\t# komentář
+\t$ git status
+=====
+'''
+
+EXCEPTIONS = '''Use `git add` here.
+-----
+Použijte git add zde.
+=====
+'''
+
+
+class DefinitionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.defs = os.path.join(self.dir, 'xx')
+        os.makedirs(self.defs)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def write(self, name, text):
+        fname = os.path.join(self.defs, name)
+        with open(fname, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return fname
+
+
+    def test_load(self):
+        self.write('extra_lines.txt', EXTRAS)
+        self.write('translated_snippets.txt', SNIPPETS)
+        self.write('backtick_exceptions.txt', EXCEPTIONS)
+        d = langdefs.load(self.defs)
+        self.assertEqual(d.warnings, [])
+        self.assertTrue(os.path.isfile(os.path.join(self.defs, 'content_sha.txt')))
+
+        self.assertEqual(d.extras['Translator note: second.\n'],
+                         ['Translator note: second.\n', 'continued\n'])
+        lines = ['a\n', 'Translator note: second.\n', 'continued\n', 'b\n']
+        self.assertEqual(list(d.extras_matcher.finditer(lines)),
+                         [(1, 'Translator note: second.\n')])
+
+        key = '\t# the comment\n'
+        self.assertEqual(d.translated_snippets[key],
+                         ([key, '\t$ git status\n'], ['\t# komentář\n', '\t$ git status\n']))
+        self.assertEqual(list(d.snippets_matchers[1].finditer(
+                         ['\t# komentář\n', '\t$ git status\n'])), [(0, key)])
+        self.assertEqual(d.snippets_order, {key: 0})
+
+        self.assertEqual(d.backtick_exceptions,
+                         {'Use `git add` here.\n': 'Použijte git add zde.\n'})
+
+
+    def test_errors(self):
+        fname = self.write('extra_lines.txt', EXTRAS + 'Translator note: first.\n=====\n')
+        with self.assertRaisesRegex(langdefs.DefinitionError,
+                                    'extra_lines.txt:6: .* at line 1'):
+            langdefs.load(self.defs)
+        os.remove(fname)
+
+        self.write('backtick_exceptions.txt', 'Use `git add` here.\nPoužijte\n')
+        with self.assertRaises(langdefs.DefinitionError) as cm:
+            langdefs.load(self.defs)
+        self.assertEqual(cm.exception.lineno, 2)
+        self.assertTrue(cm.exception.fname.endswith('backtick_exceptions.txt'))
+
+
+    def test_warnings(self):
+        # The incomplete definition at the end is ignored with the warning.
+        self.write('extra_lines.txt', EXTRAS + 'Translator note: third.\n')
+        self.write('translated_snippets.txt', SNIPPETS + '\t# another\n')
+        d = langdefs.load(self.defs)
+        self.assertEqual(len(d.warnings), 2)
+        self.assertIn('extra_lines.txt:6: ', d.warnings[0])
+        self.assertIn('translated_snippets.txt:7: ', d.warnings[1])
+
+
+    def test_snapshot(self):
+        self.write('extra_lines.txt', EXTRAS)
+        snapshot = os.path.join(self.dir, 'definitions.pickle')
+        d = langdefs.load(self.defs, snapshot)
+        self.assertTrue(os.path.isfile(snapshot))
+
+        # No definition file changed -- the files are not read again.
+        with unittest.mock.patch.object(langdefs.Definitions, 'loadExtras',
+                                        side_effect=AssertionError('read again')):
+            self.assertEqual(langdefs.load(self.defs, snapshot).extras, d.extras)
+
+        # The changed file is read again.
+        fname = self.write('extra_lines.txt', EXTRAS + 'Translator note: third.\n=====\n')
+        st = os.stat(fname)
+        os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        d = langdefs.load(self.defs, snapshot)
+        self.assertIn('Translator note: third.\n', d.extras)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of multimatch.py (run: python -m unittest test_multimatch).'''
+
+import multimatch
+import random
+import unittest
+
+
+def naiveFind(patterns, seq):
+    '''Returns the sorted list of (start index, key) found by brute force.'''
+    result = []
+    for key, pattern in patterns:
+        for start in range(len(seq) - len(pattern) + 1):
+            if list(seq[start:start + len(pattern)]) == list(pattern):
+                result.append((start, key))
+    return sorted(result)
+
+
+# (patterns, searched sequence) -- the strings stand for the sequences
+# of lines (each character is one item).
+CASES = [
+    ([], ''),
+    ([], 'abc'),
+    ([('a', 'a')], ''),
+    ([('ab', 'ab')], 'xxabxab'),
+    ([('aa', 'aa')], 'aaaa'),                                # overlapping
+    ([('aba', 'aba')], 'ababababa'),                         # self-overlapping
+    ([('ab', 'ab'), ('abc', 'abc'), ('abcd', 'abcd')], 'abcdabcab'),  # prefixes
+    ([('bcd', 'bcd'), ('cd', 'cd'), ('d', 'd')], 'abcdcd'),  # suffixes
+    ([('he', 'he'), ('she', 'she'), ('his', 'his'), ('hers', 'hers')],
+     'ushershishe'),
+    ([('ab', 'ab'), ('bc', 'bc'), ('abc', 'abc')], 'abcabc'),   # overlapping
+    ([('x', 'xyz')], 'xyxyxyzxyz'),
+    ([('k1', 'abab'), ('k2', 'bab')], 'abababab'),
+]
+
+
+class MatcherTest(unittest.TestCase):
+
+    def checkMatcher(self, patterns, seq):
+        '''Compares the matcher with the naive scan (also the order).'''
+        matcher = multimatch.Matcher(patterns)
+        found = list(matcher.finditer(seq))
+        self.assertEqual(sorted(found), naiveFind(patterns, seq),
+                         (patterns, seq))
+
+        # The occurrences are yielded in the order of their end index.
+        lengths = dict(patterns)
+        ends = [start + len(lengths[key]) for start, key in found]
+        self.assertEqual(ends, sorted(ends), (patterns, seq))
+
+
+    def test_table(self):
+        for patterns, seq in CASES:
+            self.checkMatcher(patterns, seq)
+
+
+    def test_lines(self):
+        # The items are lines -- not characters.
+        patterns = [('one', ['a\n', 'b\n']), ('two', ['b\n', 'a\n', 'b\n'])]
+        self.checkMatcher(patterns, ['a\n', 'b\n', 'a\n', 'b\n', 'ab\n'])
+        self.assertEqual(list(multimatch.Matcher(patterns).finditer(['ab\n'])), [])
+
+
+    def test_random(self):
+        rnd = random.Random(3)
+        for n in range(500):
+            patterns = {}
+            for k in range(rnd.randrange(6)):
+                pattern = ''.join(rnd.choice('abc') for i in range(rnd.randint(1, 4)))
+                patterns[pattern] = pattern
+            seq = ''.join(rnd.choice('abc') for i in range(rnd.randrange(30)))
+            self.checkMatcher(list(patterns.items()), seq)
+
+
+if __name__ == '__main__':
+    unittest.main()
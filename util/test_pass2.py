@@ -0,0 +1,92 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of pass2.py (run: python -m unittest test_pass2).'''
+
+import bench
+import os
+import pass1
+import pass2
+import pickle
+import shutil
+import tempfile
+import unittest
+
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'src')
+        bench.generateCorpus(self.src, chapters=4, sections=5, divergence=0.0)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def parsers(self, aux, jobs):
+        '''Returns pass1 and pass2 parsers (pass1 already run).'''
+        parser1 = pass1.Parser('xx', self.src, os.path.join(self.dir, aux), False,
+                               root_definitions_dir=os.path.join(self.src, 'definitions'))
+        parser1.run()
+        return parser1, pass2.Parser(parser1, jobs)
+
+
+    def reports(self, aux):
+        '''Returns the dict name -> content of the pass2 reports.'''
+        d = os.path.join(self.dir, aux, 'xx_aux')
+        result = {}
+        for name in os.listdir(d):
+            if name.startswith('pass2') and name != 'pass2stats.json':
+                with open(os.path.join(d, name), 'rb') as f:
+                    result[name] = f.read()
+        return result
+
+
+    def test_same_as_serial(self):
+        parser1, parser2 = self.parsers('serial', 1)
+        msg_serial = parser2.run().replace('serial', 'aux')
+        parser1, parser2 = self.parsers('parallel', 2)
+        self.assertEqual(len(parser2.chapterShards()), 4)
+        msg_parallel = parser2.run().replace('parallel', 'aux')
+
+        self.assertEqual(msg_parallel, msg_serial)
+        serial = self.reports('serial')
+        self.assertIn('pass2backticks.txt', serial)
+        self.assertEqual(self.reports('parallel'), serial)
+
+
+    def test_shard_parser(self):
+        parser1, parser2 = self.parsers('aux', 2)
+        start, stop = parser2.chapterShards()[1]
+        shard = pickle.loads(pickle.dumps(parser2.shardParser(start, stop)))
+        self.assertEqual([e.value() for e in shard.en_elements],
+                         [e.value() for e in parser2.en_elements[start:stop]])
+        self.assertEqual(shard.backtick_exceptions, parser2.backtick_exceptions)
+
+        # Only the settings of the checks are passed -- not the definitions
+        # or the findings of pass 1.
+        self.assertFalse(hasattr(shard, 'definitions'))
+        self.assertFalse(hasattr(shard, 'collected_findings'))
+
+
+class BuildRexTest(unittest.TestCase):
+
+    def test_cached(self):
+        build = pass2.BackticksCheck._buildRex
+        rex = build(frozenset(['git', 'git commit', 'a.b']))
+
+        # The same set of terms (in any order) gives the same compiled regex.
+        self.assertIs(build(frozenset(['a.b', 'git commit', 'git'])), rex)
+        hits = build.cache_info().hits
+        build(frozenset(['git commit', 'git', 'a.b']))
+        self.assertEqual(build.cache_info().hits, hits + 1)
+
+        # The longer terms are matched first, the terms are escaped.
+        self.assertEqual(rex.subn(r'`\g<0>`', 'git commit, git and a.b, not axb'),
+                         ('`git commit`, `git` and `a.b`, not axb', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
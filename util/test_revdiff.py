@@ -0,0 +1,119 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of revdiff.py (run: python -m unittest test_revdiff).'''
+
+import api
+import os
+import revdiff
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+OLD = '''## Chapter 1 ##
+
+First paragraph about `git init`.
+
+	$ git init
+
+Second paragraph.
+
+	$ git status
+
+Third paragraph.
+'''
+
+# The first paragraph changed, a paragraph added, and the status snippet
+# moved after the third paragraph.
+NEW = '''## Chapter 1 ##
+
+First paragraph about `git init` and more.
+
+	$ git init
+
+Second paragraph.
+
+A new paragraph.
+
+Third paragraph.
+
+	$ git status
+'''
+
+XX = '''## Kapitola 1 ##
+
+První odstavec o `git init`.
+
+	$ git init
+
+Druhý odstavec.
+
+	$ git status
+
+Třetí odstavec.
+'''
+
+
+class RevDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.defs = os.path.join(self.dir, 'definitions')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def test_element_changes(self):
+        parser = api.SourceParser('xx', {}, {}, self.defs)
+        old = revdiff.digestedElements(parser, {'01-chapter1/01-chapter1.markdown': OLD})
+        new = revdiff.digestedElements(parser, {'01-chapter1/01-chapter1.markdown': NEW})
+        changes = [(change.kind,
+                    change.old and revdiff.position(change.old),
+                    change.new and revdiff.position(change.new))
+                   for change in revdiff.elementChanges(old, new)]
+        self.assertEqual(sorted(changes),
+                         [('added', None, '01/9'),
+                          ('changed', '01/3', '01/3'),
+                          ('moved', '01/9', '01/13')])
+
+
+    @unittest.skipIf(shutil.which('git') is None, 'git is not installed')
+    def test_run(self):
+        repo = os.path.join(self.dir, 'repo')
+        chapter = os.path.join('01-chapter1', '01-chapter1.markdown')
+        for lang, text in (('en', OLD), ('xx', XX)):
+            os.makedirs(os.path.join(repo, lang, '01-chapter1'))
+            with open(os.path.join(repo, lang, chapter), 'w', encoding='utf-8') as f:
+                f.write(text)
+        git = ['git', '-C', repo, '-c', 'user.name=t', '-c', 'user.email=t@t']
+        subprocess.run(git[:3] + ['init', '-q'], check=True)
+        subprocess.run(git + ['add', '-A'], check=True)
+        subprocess.run(git + ['commit', '-qm', 'A'], check=True)
+        with open(os.path.join(repo, 'en', chapter), 'w', encoding='utf-8') as f:
+            f.write(NEW)
+        subprocess.run(git + ['commit', '-qam', 'B'], check=True)
+
+        aux = os.path.join(self.dir, 'aux')
+        lines = revdiff.run(repo, 'HEAD~1', 'HEAD', 'xx', aux,
+                            root_definitions_dir=self.defs)
+        self.assertIn('-'*30 + ' elements changed: 1', lines)
+        self.assertIn('-'*30 + ' elements added: 1', lines)
+        self.assertIn('-'*30 + ' elements moved: 1', lines)
+
+        # The translated counterpart of the changed element is shown.
+        with open(os.path.join(aux, 'xx_aux', 'pass1rev_changes.txt'),
+                  encoding='utf-8') as f:
+            text = f.read()
+        self.assertIn('changed -- en 01/3 (was 01/3):\n'
+                      '\told:\tFirst paragraph about `git init`.\n'
+                      '\tnew:\tFirst paragraph about `git init` and more.\n'
+                      '\txx 01/3:\tPrvní odstavec o `git init`.\n', text)
+        self.assertIn('added -- en 01/9:\n\tnew:\tA new paragraph.\n', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
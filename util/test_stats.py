@@ -0,0 +1,87 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of stats.py (run: python -m unittest test_stats).'''
+
+import bench
+import gen
+import os
+import pass1
+import report
+import shutil
+import stats
+import tempfile
+import unittest
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_phases(self):
+        st = stats.Stats(report.Reports())
+        st.count('lines', 5)        # no phase is running -- ignored
+        with st.phase('read'):
+            st.count('lines', 3)
+            st.count('lines')
+            st.count('regex_calls', 7)
+        with st.phase('build') as record:
+            st.count('elements', 2)
+        self.assertEqual(record['elements'], 2)
+
+        d = st.asDict()
+        self.assertEqual([r['phase'] for r in d['phases']], ['read', 'build'])
+        self.assertEqual(d['phases'][0]['lines'], 4)
+        total = d['total']
+        self.assertEqual((total['lines'], total['regex_calls'], total['elements']),
+                         (4, 7, 2))
+        self.assertAlmostEqual(total['wall'], sum(r['wall'] for r in d['phases']))
+
+
+class CountersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'src')
+        bench.generateCorpus(self.src, chapters=3, sections=4, snippets=0)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def total(self, use_cache, jobs):
+        '''Runs pass1, returns the total of the stats and the parser.'''
+        parser = pass1.Parser('xx', self.src, os.path.join(self.dir, 'aux'), use_cache,
+                              root_definitions_dir=os.path.join(self.src, 'definitions'),
+                              jobs=jobs)
+        parser.run()
+        return parser.stats.asDict()['total'], parser
+
+
+    def test_counted_once(self):
+        total, parser = self.total(False, 1)
+
+        # Each line and each element is counted once (whatever phases
+        # go through them).
+        lines = sum(1 for lang in ('en', 'xx')
+                    for item in gen.sourceFileLines(os.path.join(self.src, lang)))
+        self.assertEqual(total['lines'], lines)
+        self.assertEqual(total['elements'],
+                         len(parser.en_elements) + len(parser.xx_elements))
+        self.assertGreater(total['regex_calls'], 0)
+
+        # The same counts with the parse cache (cold, then warm -- nothing
+        # is parsed) and with the workers.
+        cold, parser = self.total(True, 1)
+        self.assertEqual((cold['lines'], cold['elements'], cold['regex_calls']),
+                         (total['lines'], total['elements'], total['regex_calls']))
+        warm, parser = self.total(True, 1)
+        self.assertEqual((warm['lines'], warm['elements']),
+                         (total['lines'], total['elements']))
+        self.assertEqual(warm.get('regex_calls', 0), 0)
+        parallel, parser = self.total(False, 2)
+        self.assertEqual((parallel['lines'], parallel['elements'], parallel['regex_calls']),
+                         (total['lines'], total['elements'], total['regex_calls']))
+
+
+if __name__ == '__main__':
+    unittest.main()
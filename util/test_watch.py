@@ -0,0 +1,114 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Tests of watch.py (run: python -m unittest test_watch).'''
+
+import bench
+import filecmp
+import os
+import pass1
+import pass2
+import shutil
+import tempfile
+import unittest
+import watch
+
+
+def dropBackticks(text):
+    '''Returns the text without the backticks in the first paragraph line with them.
+
+       The structure of the chapter stays the same (the translator notes
+       are left as they are defined).'''
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if line[:1].isalpha() and '`' in line and not line.startswith('Translator'):
+            lines[i] = line.replace('`', '')
+            break
+    return '\n'.join(lines)
+
+
+class WatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'src')
+        self.defs = os.path.join(self.src, 'definitions')
+        bench.generateCorpus(self.src, chapters=4, sections=4, divergence=0.0)
+        self.watcher = watch.Watcher('xx', self.src, os.path.join(self.dir, 'waux'),
+                                     root_definitions_dir=self.defs)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def checkSameAsFull(self):
+        '''Checks the reports of the watcher are the same as from the full run.'''
+        aux = os.path.join(self.dir, 'faux')
+        shutil.rmtree(aux, ignore_errors=True)
+        parser1 = pass1.Parser('xx', self.src, aux, False, root_definitions_dir=self.defs)
+        parser1.run()
+        pass2.Parser(parser1).run()
+        for sub in ('en_aux', 'xx_aux'):
+            d1 = os.path.join(aux, sub)
+            d2 = os.path.join(self.dir, 'waux', sub)
+            names = [name for name in os.listdir(d1)
+                     if not name.endswith(('.json', '.pickle'))]
+            self.assertTrue(names)
+            match, mismatch, errors = filecmp.cmpfiles(d1, d2, names, shallow=False)
+            self.assertEqual(mismatch + errors, [], sub)
+
+
+    def edit(self, lang, chapter, func):
+        '''Changes the text of the chapter source file by the func.'''
+        d = os.path.join(self.src, lang, chapter)
+        fname = os.path.join(d, os.listdir(d)[0])
+        with open(fname, encoding='utf-8') as f:
+            text = f.read()
+        st = os.stat(fname)
+        with open(fname, 'w', encoding='utf-8', newline='') as f:
+            f.write(func(text))
+        os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+    def test_refresh(self):
+        lines = self.watcher.poll()
+        self.assertTrue(lines)
+        self.checkSameAsFull()
+        self.assertEqual(self.watcher.poll(), [])   # nothing changed
+
+        # Only the edited chapter is checked again.
+        self.edit('xx', '03-chapter3', dropBackticks)
+        lines = self.watcher.poll()
+        self.assertTrue(lines[0].startswith('03-chapter3 checked'), lines)
+        self.assertNotIn(' 0 report files', lines[0])
+        self.checkSameAsFull()
+
+        # The English change is compared with the last known content.
+        self.edit('en', '02-chapter2', dropBackticks)
+        lines = self.watcher.poll()
+        self.assertTrue(lines[0].startswith('02-chapter2 checked'), lines)
+        self.assertNotIn(' 0 report files', lines[0])
+        self.checkSameAsFull()
+
+
+    def test_chapter_boundary(self):
+        # The chapter that starts with the code snippet (after the end
+        # of the previous chapter) changes the end of the previous chapter.
+        self.watcher.poll()
+        for lang in ('en', 'xx'):
+            self.edit(lang, '04-chapter4', lambda text: '    $ git log\n\n' + text)
+        lines = self.watcher.poll()
+        self.assertTrue(lines[0].startswith('03-chapter3, 04-chapter4 checked'), lines)
+        self.checkSameAsFull()
+
+        # The chapter starting with empty lines waits for the next change.
+        for lang in ('en', 'xx'):
+            self.edit(lang, '02-chapter2', lambda text: '\n' + text)
+        lines = self.watcher.poll()
+        self.assertTrue(any('waiting for the next change' in line for line in lines),
+                        lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,420 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+'''Watches the sources and checks again only the edited chapters.
+
+Usage: watch.py [-i SECONDS] [--no-debug-reports] root_src_dir root_aux_dir lang
+
+Example (the same locations as in the csSync.py and similar scripts):
+
+    watch.py ../../progit/ ../ cs
+
+All chapters are checked (pass1 and pass2) when started. Then the source
+files of both languages and the definitions of the language are polled
+for changes. When a source file changes, only its chapter is parsed
+and checked again; the parsed lines and the elements of the other chapters
+are kept in memory (the English elements of the chapter are reused when
+only the translation changed). The report files are assembled from the parts
+of the chapters -- only the files with a changed part are written. When
+the definitions change, all chapters are checked again. Stop it by Ctrl+C.
+
+The structures are aligned within each chapter. When the structure is
+synchronized, the reports are the same as from the csSync.py and similar
+scripts (the statistics are not written). An element moved to another
+chapter is reported as missing in one and extra in the other chapter.
+The chapter that starts with empty lines followed by text cannot be checked
+alone (the whole book glues the empty lines to the end of the previous
+chapter); the error is displayed instead.
+'''
+
+import argparse
+import contentsha
+import gen
+import os
+import pass1
+import pass2
+import report
+import stats
+import time
+
+
+class ChapterBoundaryError(ValueError):
+    '''The elements of the chapter cannot be built without its neighbour.'''
+
+
+def leadingLines(doclines):
+    '''Returns the first lines of the chapter up to its first non-empty line.'''
+    result = []
+    for docline in doclines:
+        result.append(docline)
+        if docline.type != 'empty':
+            break
+    return result
+
+
+def boundaryKind(leading):
+    '''Returns how the whole-book automaton treats the chapter start.
+
+       The leading are the first lines of the chapter (see leadingLines()).
+       The empty elements at the end of the previous chapter are glued
+       to one element when the chapter starts with the line that is neither
+       empty nor code ('glue'); otherwise, they stay separate ('separate').
+       When the chapter starts with the empty lines that are not followed
+       by code, they are glued together with the empty lines of the previous
+       chapter ('across') -- the chapters cannot be built separately then.'''
+    if not leading or leading[0].type == 'code':
+        return 'separate'
+    if leading[0].type != 'empty':
+        return 'glue'
+    if leading[-1].type == 'code':
+        return 'separate'
+    return 'across'
+
+
+class ChapterParser(pass1.Parser):
+    '''Pass1 parser of the source files of one chapter.
+
+       The chapter is the name of the subdirectory with the source files
+       (like '01-introduction'). The parse caches and the definitions
+       are shared with the main parser, the reports are written to memory
+       (report.MemoryReports), and the new last known content records
+       are collected to the content_records list. The first lines
+       of the next chapter decide how the empty lines at the end
+       of the chapter are glued (see buildElements()).'''
+
+    def __init__(self, main, chapter):
+        super().__init__(main.lang, main.root_src_dir, main.root_aux_dir, False,
+                         main.reports.disabled, main.root_definitions_dir)
+        self.chapter = chapter
+        self.preceded = {}      # text_dir -> True if a chapter precedes
+        self.leading = {}       # text_dir -> boundaryKind() of the chapter start
+        self.following = {}     # text_dir -> leadingLines() of the next chapter
+        self.text_dir = None    # of the elements being built
+        self.en_cache = main.en_cache
+        self.xx_cache = main.xx_cache
+        self.definitions = main.loadDefinitions()
+        self.reports = report.MemoryReports(main.reports.disabled)
+        self.stats = stats.Stats(self.reports)
+        self.content_fname = None   # name of the new content_sha file in aux
+        self.content_records = []   # (en_ch_lineno, xx_ch_lineno, en_digest, xx_digest)
+
+
+    def doclines(self, text_dir, parse_cache):
+        '''Generator of doc.Line objects of the chapter.
+
+           The preceding source files are only stat-ed by the cache,
+           the first lines of the next chapter are captured
+           to the self.following, and the rest is not read at all.'''
+        prefix = self.chapter + '/'
+        self.preceded[text_dir] = False
+        following = self.following[text_dir] = []
+        inside = False
+        for docline in parse_cache.doclines(text_dir):
+            if docline.fname.startswith(prefix):
+                inside = True
+                yield docline
+            elif not inside:
+                self.preceded[text_dir] = True
+            else:
+                following.append(docline)
+                if docline.type != 'empty':
+                    break
+
+
+    def convertToElements(self, aux_dir, doclines):
+        '''Remembers the text_dir of the doclines for buildElements().'''
+        self.text_dir = self.en_src_dir if aux_dir == self.en_aux_dir \
+                        else self.xx_src_dir
+        return super().convertToElements(aux_dir, doclines)
+
+
+    def buildElements(self, doclines):
+        '''Returns the list of elements built from the doclines.
+
+           In the whole book, the empty lines at the end of the chapter
+           are glued to one element when the next chapter starts with
+           the line that is neither empty nor code. The first line
+           of the next chapter is then appended, and its element is
+           removed. The ChapterBoundaryError is raised when the chapters
+           cannot be built separately (see boundaryKind()).'''
+        text_dir = self.text_dir
+        self.leading[text_dir] = boundaryKind(leadingLines(doclines))
+        if self.preceded[text_dir] and self.leading[text_dir] == 'across':
+            raise ChapterBoundaryError(
+                'the chapter starts with empty lines that are glued '
+                'to the end of the previous chapter')
+
+        following = self.following[text_dir]
+        kind = boundaryKind(following)
+        if kind == 'across':
+            raise ChapterBoundaryError(
+                'the next chapter {} starts with empty lines that are glued '
+                'to the end of the chapter'.format(following[0].fname.split('/')[0]))
+        if kind == 'separate':
+            return super().buildElements(doclines)
+
+        elements = super().buildElements(doclines + following[:1])
+        if elements[-1].doclines != following[:1]:
+            raise ChapterBoundaryError(
+                'the chapter does not end with an empty line -- its last element '
+                'continues by the first line of the next chapter')
+        return elements[:-1]
+
+
+    def saveCaches(self):
+        '''The shared caches are saved by the watcher when it stops.'''
+
+
+    def contentShaWriter(self, fname):
+        '''Returns the writer collecting the records to the content_records.'''
+        self.content_fname = fname
+        return contentsha.ListWriter(self.content_records)
+
+
+class Chapter:
+    '''Result of checking one chapter, kept in memory by the watcher.'''
+
+    def __init__(self, parser1, parser2, en_elements, en_sha_to_elem):
+        self.name = parser1.chapter
+        self.en_elements = en_elements          # all English elements of the chapter
+        self.en_sha_to_elem = en_sha_to_elem
+        self.texts = parser1.reports.texts()    # fname -> part of the report
+        self.newlines = dict(parser1.reports.newlines)
+        self.content_fname = parser1.content_fname
+        self.content_records = parser1.content_records
+        self.leading = dict(parser1.leading)    # text_dir -> boundaryKind()
+
+        # The result lines of the checks (without the file names).
+        self.log_info = [line for line in parser1.log_info + parser2.log_info
+                         if line.startswith('-'*30)]
+
+
+class Watcher:
+    '''Keeps the checked chapters in memory and refreshes the changed ones.'''
+
+    def __init__(self, lang, root_src_dir, root_aux_dir, disabled_reports=(),
+                 root_definitions_dir=None):
+        # The main parser gives the locations, the parse caches (loaded
+        # from the aux directories), and writes the assembled reports.
+        self.parser = pass1.Parser(lang, root_src_dir, root_aux_dir, True,
+                                   disabled_reports, root_definitions_dir)
+        self.chapters = {}      # chapter name -> Chapter
+        self.snapshot = {}      # fname -> (size, mtime) of the watched files
+
+
+    def watchedFiles(self):
+        '''Generator of the names of the source and definition files.'''
+        for text_dir in (self.parser.en_src_dir, self.parser.xx_src_dir):
+            if os.path.isdir(text_dir):
+                yield from gen.sourceFiles(text_dir)
+        defs_dir = self.parser.lang_definitions_dir
+        for name in sorted(os.listdir(defs_dir)):
+            yield os.path.join(defs_dir, name)
+
+
+    def takeSnapshot(self):
+        '''Returns the dict fname -> (size, mtime) of the watched files.'''
+        snapshot = {}
+        for fname in self.watchedFiles():
+            try:
+                st = os.stat(fname)
+            except OSError:     # removed in the meantime
+                continue
+            snapshot[fname] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+
+    def chapterName(self, fname):
+        '''Returns the chapter of the source file (None for definitions).'''
+        for text_dir in (self.parser.en_src_dir, self.parser.xx_src_dir):
+            if os.path.dirname(os.path.dirname(fname)) == text_dir:
+                return os.path.basename(os.path.dirname(fname))
+        return None
+
+
+    def changes(self, old, new):
+        '''Returns the chapters to refresh and the ones with changed English.
+
+           A change of the definitions means all chapters.'''
+        chapters = set()
+        en_chapters = set()
+        for fname in set(old) | set(new):
+            if old.get(fname) == new.get(fname):
+                continue
+            name = self.chapterName(fname)
+            if name is None:
+                self.parser.definitions = None      # loaded again
+                chapters.update(self.chapterNames(new))
+            else:
+                chapters.add(name)
+                if fname.startswith(self.parser.en_src_dir + os.sep):
+                    en_chapters.add(name)
+        return chapters, en_chapters
+
+
+    def chapterNames(self, snapshot):
+        '''Returns the set of the chapters of the source files.'''
+        return {name for name in map(self.chapterName, snapshot) if name is not None}
+
+
+    def checkChapter(self, name, en_changed):
+        '''Runs pass1 and pass2 for the chapter. Returns the Chapter.'''
+        parser1 = ChapterParser(self.parser, name)
+        old = self.chapters.get(name)
+        shared = not en_changed and old is not None and \
+            parser1.shareEnglish(old.en_elements, old.en_sha_to_elem,
+                                 parser1.digest_name)
+        parser1.loadDoclineLists()
+        parser1.convertDoclinesToElements()
+        en_elements = parser1.en_elements  # before the snippets are deleted
+        parser1.checkStructDiffs()
+        parser1.checkContentChanges()
+
+        parser2 = pass2.Parser(parser1)
+        parser2.runChecks(parser2.checkers)
+
+        chapter = Chapter(parser1, parser2, en_elements, parser1.en_sha_to_elem)
+        if shared:
+            # The English reports of the chapter were not written again.
+            prefix = self.parser.en_aux_dir + os.sep
+            for fname, text in old.texts.items():
+                if fname.startswith(prefix):
+                    chapter.texts[fname] = text
+                    chapter.newlines[fname] = old.newlines[fname]
+            chapter.leading[self.parser.en_src_dir] = \
+                old.leading[self.parser.en_src_dir]
+        return chapter
+
+
+    def writeReports(self, fnames):
+        '''Writes the report files assembled from the parts of the chapters.'''
+        chapters = [self.chapters[name] for name in sorted(self.chapters)]
+        for fname in sorted(fnames):
+            newline = None
+            for chapter in chapters:
+                newline = chapter.newlines.get(fname, newline)
+            with self.parser.reports.open(fname, newline) as f:
+                for chapter in chapters:
+                    f.write(chapter.texts.get(fname, ''))
+
+        # The new content records (in the format of the definitions).
+        content_fname = next((chapter.content_fname for chapter in chapters
+                              if chapter.content_fname is not None), None)
+        if content_fname is not None:
+            with contentsha.writer(content_fname) as fsha:
+                for chapter in chapters:
+                    for record in chapter.content_records:
+                        fsha.write(*record)
+
+
+    def checkChapters(self, names, en_names, fnames, errors):
+        '''Checks the chapters; collects the changed report files and the errors.
+
+           When the chapter cannot be read (say the file is just being
+           written), its previous result is kept. The end of the previous
+           chapter depends on the start of the chapter (see boundaryKind()).
+           Returns the set of the previous chapters whose next chapter starts
+           differently now, and the subset where it is the English one.'''
+        present = sorted(self.chapterNames(self.snapshot))
+        neighbours = set()
+        en_neighbours = set()
+        for name in sorted(names):
+            old = self.chapters.get(name)
+            if name in present:
+                try:
+                    chapter = self.checkChapter(name, name in en_names)
+                except (UnicodeDecodeError, ChapterBoundaryError) as e:
+                    errors.append('{}: {} -- waiting for the next change'.format(name, e))
+                    continue
+                self.chapters[name] = chapter
+                new_texts = chapter.texts
+                new_leading = chapter.leading
+            else:
+                self.chapters.pop(name, None)   # the chapter was removed
+                new_texts = {}
+                new_leading = {}
+            old_texts = old.texts if old is not None else {}
+            fnames.update(fname for fname in set(old_texts) | set(new_texts)
+                          if old_texts.get(fname) != new_texts.get(fname))
+
+            old_leading = old.leading if old is not None else {}
+            previous = [n for n in present if n < name]
+            for text_dir in set(old_leading) | set(new_leading):
+                if previous and old_leading.get(text_dir) != new_leading.get(text_dir):
+                    neighbours.add(previous[-1])
+                    if text_dir == self.parser.en_src_dir:
+                        en_neighbours.add(previous[-1])
+        return neighbours, en_neighbours
+
+
+    def refresh(self, names, en_names):
+        '''Checks the chapters again and writes the changed reports.
+
+           The previous chapter is checked too when the start of the chapter
+           changed (see checkChapters()). Returns the lines for displaying.'''
+        t = time.perf_counter()
+        fnames = set()
+        errors = []
+        neighbours, en_neighbours = self.checkChapters(names, en_names, fnames, errors)
+        neighbours -= set(names)
+        self.checkChapters(neighbours, en_neighbours, fnames, errors)
+        names = set(names) | neighbours
+        self.writeReports(fnames)
+        t = time.perf_counter() - t
+
+        lines = ['{} checked in {:.3f} s, {} report files written'.format(
+                 ', '.join(sorted(names)), t, len(fnames))]
+        for name in sorted(names):
+            if name in self.chapters:
+                lines.append(name + ':')
+                lines.extend('\t' + line for line in self.chapters[name].log_info)
+        return lines + errors
+
+
+    def poll(self):
+        '''Refreshes the chapters changed since the last poll.
+
+           Returns the lines for displaying (empty when nothing changed).'''
+        snapshot = self.takeSnapshot()
+        if snapshot == self.snapshot:
+            return []
+        names, en_names = self.changes(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        lines = self.refresh(names, en_names)
+
+        # The checks create the missing (empty) definition files.
+        for fname, st in self.takeSnapshot().items():
+            if self.chapterName(fname) is None:
+                self.snapshot.setdefault(fname, st)
+        return lines
+
+
+    def run(self, interval=0.5):
+        '''Polls the files and refreshes the chapters until interrupted.'''
+        try:
+            while True:
+                for line in self.poll():
+                    print(line)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.parser.saveCaches()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('root_src_dir', help='root of the source documents (progit/)')
+    ap.add_argument('root_aux_dir', help='root of the auxiliary directories with reports')
+    ap.add_argument('lang', help='target language (cs, fr, ...)')
+    ap.add_argument('-i', '--interval', type=float, default=0.5,
+                    help='seconds between the polls of the files (default: 0.5)')
+    ap.add_argument('--no-debug-reports', action='store_true',
+                    help='do not write the debugging reports (pass1.txt, pass1doclines.txt)')
+    args = ap.parse_args()
+
+    disabled_reports = report.DEBUG_REPORTS if args.no_debug_reports else ()
+    watcher = Watcher(args.lang, args.root_src_dir, args.root_aux_dir,
+                      disabled_reports)
+    print('watching {} (Ctrl+C to stop)'.format(watcher.parser.xx_src_dir))
+    watcher.run(args.interval)